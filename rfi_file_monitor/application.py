@@ -406,7 +406,7 @@ class Application(Gtk.Application):
                     force_all=True,
                 )
                 window.show_all()
-                window.load_from_yaml_dict(yaml_dict)
+                window.load_from_yaml_dict(yaml_dict, yaml_file)
         else:
             dialog.destroy()
 
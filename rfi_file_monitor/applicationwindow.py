@@ -15,6 +15,7 @@ from threading import Thread
 import inspect
 import collections.abc
 import traceback
+import os
 
 from .utils import (
     PATTERN_PLACEHOLDER_TEXT,
@@ -58,6 +59,9 @@ class ApplicationWindow(Gtk.ApplicationWindow):
         action_entries = (
             ("save", self.on_save),
             ("save-as", self.on_save_as),
+            ("export-traces", self.on_export_traces),
+            ("dump-profiles", self.on_dump_profiles),
+            ("compact-journal", self.on_compact_journal),
             ("close", self.on_close),
             ("minimize", self.on_minimize),
             ("play", self.on_play),
@@ -530,7 +534,8 @@ class ApplicationWindow(Gtk.ApplicationWindow):
             "Running",
             "Success",
             "Failure",
-            "Removed from list",
+            "Archived",
+            "On disk",
         )
         for _index, _status in enumerate(statuses):
             self._status_grid.attach(
@@ -872,7 +877,11 @@ class ApplicationWindow(Gtk.ApplicationWindow):
             active_engine=self._active_engine.NAME,
             queue_manager=self._queue_manager.exportable_params,
             operations=[
-                dict(name=op.NAME, params=op.exportable_params)
+                dict(
+                    name=op.NAME,
+                    params=op.exportable_params,
+                    profile=op.profile,
+                )
                 for op in self._operations_box
             ],
             engines=[
@@ -940,7 +949,202 @@ class ApplicationWindow(Gtk.ApplicationWindow):
         else:
             dialog.destroy()
 
-    def load_from_yaml_dict(self, yaml_dict: dict):
+    def on_export_traces(self, action, param):
+        tracer = self._queue_manager.tracer
+        if tracer is None or not tracer.traces:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text="No traces have been recorded",
+                secondary_text="Activate tracing in the Queue Manager and start the monitor to record traces.",
+            )
+            dialog.run()
+            dialog.destroy()
+            return
+
+        dialog = Gtk.FileChooserNative(
+            modal=True,
+            title="Export the traces of the files",
+            transient_for=self,
+            action=Gtk.FileChooserAction.SAVE,
+        )
+        filter = Gtk.FileFilter()
+        filter.add_pattern("*.json")
+        filter.set_name("Chrome trace event file")
+        dialog.add_filter(filter)
+        filter = Gtk.FileFilter()
+        filter.add_pattern("*.csv")
+        filter.set_name("CSV file")
+        dialog.add_filter(filter)
+
+        if dialog.run() != Gtk.ResponseType.ACCEPT:
+            dialog.destroy()
+            return
+        filename = dialog.get_filename()
+        csv_selected = dialog.get_filter().get_name() == "CSV file"
+        dialog.destroy()
+        # ensure filename ends in .json or .csv
+        if not filename.endswith(".json") and not filename.endswith(".csv"):
+            filename += ".csv" if csv_selected else ".json"
+        try:
+            with open(filename, "w", newline="") as f:
+                if filename.endswith(".csv"):
+                    tracer.write_csv(f)
+                else:
+                    tracer.write_chrome_trace(f)
+        except Exception as e:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.ERROR,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text=f"Could not write to {filename}",
+                secondary_text=str(e),
+            )
+            dialog.run()
+            dialog.destroy()
+
+    def on_dump_profiles(self, action, param):
+        profiler = self._queue_manager.profiler
+        if profiler is None:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text="No operations have been profiled",
+                secondary_text="Activate profiling in the frame of an operation and start the monitor to profile it.",
+            )
+            dialog.run()
+            dialog.destroy()
+            return
+
+        dialog = Gtk.FileChooserNative(
+            modal=True,
+            title="Select a folder to write the profiles to",
+            transient_for=self,
+            action=Gtk.FileChooserAction.SELECT_FOLDER,
+        )
+        if dialog.run() != Gtk.ResponseType.ACCEPT:
+            dialog.destroy()
+            return
+        directory = dialog.get_filename()
+        dialog.destroy()
+        try:
+            filenames = profiler.dump(directory)
+        except Exception as e:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.ERROR,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text=f"Could not write to {directory}",
+                secondary_text=str(e),
+            )
+        else:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text=f"{len(filenames)} files written to {directory}",
+                secondary_text="\n".join(
+                    os.path.basename(filename) for filename in filenames
+                ),
+            )
+        dialog.run()
+        dialog.destroy()
+
+    def on_compact_journal(self, action, param):
+        if self._queue_manager.running:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text="The journal cannot be compacted while the monitor is running",
+                secondary_text="Stop the monitor and try again.",
+            )
+            dialog.run()
+            dialog.destroy()
+            return
+
+        task_window = LongTaskWindow(self)
+        task_window.set_text("<b>Compacting the journal</b>")
+        task_window.show()
+        watch_cursor = Gdk.Cursor.new_for_display(
+            Gdk.Display.get_default(), Gdk.CursorType.WATCH
+        )
+        task_window.get_window().set_cursor(watch_cursor)
+
+        def compact():
+            try:
+                result = self._queue_manager.compact_journal()
+            except Exception as e:
+                logger.exception("Could not compact the journal")
+                result = e
+            GLib.idle_add(
+                self._compact_journal_cb,
+                task_window,
+                result,
+                priority=GLib.PRIORITY_DEFAULT_IDLE,
+            )
+
+        Thread(target=compact, daemon=True).start()
+
+    def _compact_journal_cb(self, task_window: LongTaskWindow, result):
+        task_window.get_window().set_cursor(None)
+        task_window.destroy()
+
+        if isinstance(result, Exception):
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.ERROR,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text="Could not compact the journal",
+                secondary_text=str(result),
+            )
+        elif result is None:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text="No journal has been recorded for these operations",
+                secondary_text="Activate the journal in the queue manager options and start the monitor to record one.",
+            )
+        else:
+            path, removed = result
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                modal=True,
+                destroy_with_parent=True,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text=f"Removed {removed} records of files that no longer exist",
+                secondary_text=path,
+            )
+        dialog.run()
+        dialog.destroy()
+        return GLib.SOURCE_REMOVE
+
+    def load_from_yaml_dict(
+        self, yaml_dict: dict, yaml_file: Optional[str] = None
+    ):
+
+        # remember where the configuration came from, so it can be saved again
+        self._yaml_file = yaml_file
 
         # active_engine
         active_engine = yaml_dict["active_engine"]
@@ -976,6 +1180,7 @@ class ApplicationWindow(Gtk.ApplicationWindow):
                         new_operation.index = len(self._operations_box)
                         self._operations_box.insert(new_operation, -1)
                         new_operation.update_from_dict(op["params"])
+                        new_operation.profile = op.get("profile", False)
                         new_operation.show_all()
                         break
                 else:
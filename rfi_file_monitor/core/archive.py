@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from typing import OrderedDict as OrderedDictType
+from typing import Optional, Tuple, Type
+from collections import OrderedDict
+from pathlib import PurePath
+import logging
+import sys
+
+from ..file import File, FileStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivedFile:
+    """
+    The minimal information that is needed to recreate a File object.
+    """
+
+    __slots__ = (
+        "file_class",
+        "relative_class",
+        "relative_filename",
+        "created",
+        "args",
+        "nbytes",
+    )
+
+    def __init__(self, file: File):
+        self.file_class: Type[File] = type(file)
+        self.relative_class: Type[PurePath] = type(file.relative_filename)
+        self.relative_filename: str = sys.intern(str(file.relative_filename))
+        self.created: float = file.created
+        self.args: Tuple = file._get_archive_args()
+        # rough estimate of the memory held by this record
+        self.nbytes: int = (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.relative_filename)
+            + sys.getsizeof(self.args)
+            + sum(sys.getsizeof(arg) for arg in self.args)
+        )
+
+    def restore(self, filename: str, status: FileStatus) -> File:
+        return self.file_class(
+            filename,
+            self.relative_class(self.relative_filename),
+            self.created,
+            status,
+            *self.args,
+        )
+
+
+class FileArchive:
+    """
+    Keeps track of files that have been removed from the queue manager,
+    so that it can still recognize them when they are saved again.
+    Files are stored as compact ArchivedFile records.
+    When the maximum number of records or the memory limit is exceeded,
+    the least recently archived files are forgotten.
+    """
+
+    # approximate overhead of a key in an OrderedDict
+    ENTRY_OVERHEAD: int = 100
+
+    def __init__(self, max_files: int, max_bytes: int):
+        self._records: OrderedDictType[str, ArchivedFile] = OrderedDict()
+        self._max_files = max_files
+        self._max_bytes = max_bytes
+        self._nbytes: int = 0
+
+    def add(self, file: File):
+        filename = sys.intern(file.filename)
+        self.pop(filename)
+        record = ArchivedFile(file)
+        self._records[filename] = record
+        self._nbytes += self._get_record_size(filename, record)
+
+        while self._records and (
+            len(self._records) > self._max_files
+            or self._nbytes > self._max_bytes
+        ):
+            evicted_filename, evicted_record = self._records.popitem(last=False)
+            self._nbytes -= self._get_record_size(
+                evicted_filename, evicted_record
+            )
+            logger.debug(f"{evicted_filename} evicted from archive")
+
+    def pop(self, filename: str) -> Optional[ArchivedFile]:
+        record = self._records.pop(filename, None)
+        if record is not None:
+            self._nbytes -= self._get_record_size(filename, record)
+        return record
+
+    def clear(self):
+        self._records.clear()
+        self._nbytes = 0
+
+    def _get_record_size(self, filename: str, record: ArchivedFile) -> int:
+        return sys.getsizeof(filename) + record.nbytes + self.ENTRY_OVERHEAD
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from collections import deque
+from enum import Enum
+import logging
+from time import time
+from typing import Deque, Final, Optional
+
+from ..file import File
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __str__(self):
+        return self.value
+
+
+class CircuitBreaker:
+    """
+    Keeps track of the connection failures of one operation.
+
+    After threshold consecutive failures, the breaker opens:
+    the files that reach the operation are held back instead of being run,
+    so the workers are not tied up by an endpoint that is down.
+    Once the timeout has expired, a single file is let through as a probe.
+    If it gets through, the breaker closes and the held files are released,
+    otherwise the breaker opens again.
+
+    This class is not thread-safe: the QueueCore calls it with its lock held.
+    """
+
+    def __init__(self, name: str, threshold: int, timeout: float):
+        self._name = name
+        self._threshold = threshold
+        self._timeout = timeout
+        self._state = BreakerState.CLOSED
+        self._failures: int = 0
+        self._opened: float = 0
+        # the filename of the file that is probing the endpoint
+        self._probe: Optional[str] = None
+        self._probe_started: float = 0
+        self._held: Final[Deque[File]] = deque()
+
+    @property
+    def state(self) -> BreakerState:
+        return self._state
+
+    @property
+    def failures(self) -> int:
+        """The number of consecutive connection failures"""
+        return self._failures
+
+    @property
+    def nheld(self) -> int:
+        return len(self._held)
+
+    @property
+    def probe_at(self) -> Optional[float]:
+        """When the next probe may be sent, if the breaker is open"""
+        if self._state != BreakerState.OPEN:
+            return None
+        return self._opened + self._timeout
+
+    def allow(self, file: File, now: Optional[float] = None) -> bool:
+        """
+        Returns True if the file may be sent to the operation.
+        When the breaker is half-open, only the probe is allowed.
+        A probe that has not reported back within the timeout,
+        for example because its file was saved again, is replaced.
+        """
+        if self._state == BreakerState.CLOSED:
+            return True
+        if now is None:
+            now = time()
+        if self._state == BreakerState.OPEN:
+            if now < self._opened + self._timeout:
+                return False
+            logger.info(f"{self._name}: probing the endpoint")
+            self._state = BreakerState.HALF_OPEN
+        if self._probe is None or now >= self._probe_started + self._timeout:
+            self._probe = file.filename
+            self._probe_started = now
+        return self._probe == file.filename
+
+    def record(
+        self, file: File, unavailable: bool, now: Optional[float] = None
+    ):
+        """Records the outcome of running the operation on a file"""
+        if file.filename == self._probe:
+            self._probe = None
+        if not unavailable:
+            if self._state != BreakerState.CLOSED:
+                logger.info(f"{self._name}: the endpoint is available again")
+            self._state = BreakerState.CLOSED
+            self._failures = 0
+            return
+        self._failures += 1
+        if self._state == BreakerState.HALF_OPEN or (
+            self._threshold and self._failures >= self._threshold
+        ):
+            if self._state == BreakerState.CLOSED:
+                logger.warning(
+                    f"{self._name}: {self._failures} connection failures in a row. Holding back files for {self._timeout} seconds"
+                )
+            self._state = BreakerState.OPEN
+            self._opened = time() if now is None else now
+
+    def hold(self, file: File):
+        self._held.append(file)
+
+    def unhold(self, file: File) -> bool:
+        try:
+            self._held.remove(file)
+        except ValueError:
+            return False
+        return True
+
+    def release(self, now: Optional[float] = None) -> Deque[File]:
+        """
+        Returns the held files that may be run now, which are all of them
+        when the breaker is closed, or a single probe once the timeout
+        has expired.
+        """
+        released: Deque[File] = deque()
+        while self._held and self.allow(self._held[0], now):
+            released.append(self._held.popleft())
+            if self._state != BreakerState.CLOSED:
+                break
+        return released
+
+    def clear(self):
+        self._held.clear()
+        self._probe = None
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+import re
+from typing import List, Sequence
+
+from .utils import PatternMatcher
+
+
+class CompletionMode(Enum):
+    """How the queue decides that a file has been written completely"""
+
+    # no further events for saved_status_promotion_delay seconds
+    DELAY = "delay"
+    # the writer closed the file, falling back to STABLE if the engine
+    # does not get to see that, as on network filesystems
+    CLOSE = "close"
+    # size and modification time unchanged for the stability interval
+    STABLE = "stable"
+
+    def __str__(self):
+        return self.value
+
+
+@dataclass(frozen=True)
+class CompletionRule:
+    pattern: str
+    mode: CompletionMode
+
+
+class CompletionRules:
+    """
+    Maps files to a CompletionMode, using the first rule
+    whose pattern matches the filename, case-insensitively.
+    Files that do not match any rule use DELAY.
+    """
+
+    def __init__(
+        self, rules: Sequence[CompletionRule], stability_interval: float = 2.0
+    ):
+        self._rules: List[CompletionRule] = list(rules)
+        self._stability_interval = stability_interval
+        # compiled once, as files are matched with the queue lock held
+        self._matchers: List[PatternMatcher] = [
+            PatternMatcher([rule.pattern.lower()], []) for rule in self._rules
+        ]
+
+    @classmethod
+    def parse(cls, text: str, stability_interval: float = 2.0):
+        """
+        Parses rules such as "*.tif: close, *.h5: stable",
+        separated by commas, semicolons or newlines.
+        """
+        rules: List[CompletionRule] = list()
+        for item in re.split(r"[,;\n]", text):
+            if not item.strip():
+                continue
+            pattern, sep, mode = item.rpartition(":")
+            try:
+                if not sep or not pattern.strip():
+                    raise ValueError(item)
+                rules.append(
+                    CompletionRule(
+                        pattern.strip(), CompletionMode(mode.strip().lower())
+                    )
+                )
+            except ValueError:
+                raise ValueError(
+                    f"Invalid completion rule {item.strip()}: use pattern: {'|'.join(str(mode) for mode in CompletionMode)}"
+                ) from None
+        return cls(rules, stability_interval)
+
+    @property
+    def rules(self) -> List[CompletionRule]:
+        return self._rules
+
+    @property
+    def stability_interval(self) -> float:
+        """How long a file must remain unchanged, in seconds"""
+        return self._stability_interval
+
+    def get_mode(self, filename: str) -> CompletionMode:
+        path = filename.lower()
+        for rule, matcher in zip(self._rules, self._matchers):
+            if matcher.match(path):
+                return rule.mode
+        return CompletionMode.DELAY
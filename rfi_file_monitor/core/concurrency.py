@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from threading import Event, Lock
+from time import time
+from typing import Deque, Dict, Final, List, Optional, Tuple
+
+from ..file import File, FileStatus
+from .events import QueueObserver
+from .job import WorkerPool
+from .scheduling import get_cached_file_size
+from .utils import ExitableThread
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConcurrencyDecision:
+    timestamp: float
+    size: int
+    reason: str
+    throughput: float  # bytes per second
+    latency_ratio: Optional[float]
+
+
+class AdaptiveConcurrency(QueueObserver):
+    """
+    Adjusts the number of workers of a pool while it is running,
+    using additive increase and multiplicative decrease (AIMD).
+
+    At the end of every interval, the throughput and the latency
+    of each operation are compared with what was observed before.
+    When files are waiting and the pool keeps up, a worker is added.
+    When the latency of an operation rises well above its baseline,
+    or the throughput drops after adding workers, the pool is shrunk.
+    The latency is normalized by the file size, to allow comparing
+    files of different sizes.
+    """
+
+    # added to the size of each file, to account for the overhead per file
+    FILE_COST: Final[int] = 64 * 1024
+    DECREASE_FACTOR: Final[float] = 0.75
+    LATENCY_TOLERANCE: Final[float] = 2.0
+    THROUGHPUT_TOLERANCE: Final[float] = 0.9
+    # how quickly the latency baseline follows latencies above it
+    BASELINE_DRIFT: Final[float] = 0.05
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        floor: int,
+        ceiling: int,
+        interval: float = 5.0,
+    ):
+        if floor < 1 or ceiling < floor:
+            raise ValueError(
+                f"invalid concurrency limits: floor {floor}, ceiling {ceiling}"
+            )
+        self._pool = pool
+        self._floor = floor
+        self._ceiling = ceiling
+        self._interval = interval
+        self._lock = Lock()
+        self._decisions: Final[Deque[ConcurrencyDecision]] = deque(maxlen=100)
+        self._thread: Optional[_ControllerThread] = None
+
+        # samples collected during the current interval
+        self._started: Dict[Tuple[str, int], float] = dict()
+        self._latencies: Dict[int, List[float]] = dict()
+        self._nbytes: int = 0
+        self._last_update: float = time()
+
+        self._baselines: Dict[int, float] = dict()
+        self._previous_throughput: Optional[float] = None
+        self._increased: bool = False
+
+        size = min(max(pool.size, floor), ceiling)
+        if size != pool.size:
+            pool.resize(size)
+
+    @property
+    def floor(self) -> int:
+        return self._floor
+
+    @property
+    def ceiling(self) -> int:
+        return self._ceiling
+
+    @property
+    def decisions(self) -> List[ConcurrencyDecision]:
+        """The most recent decisions, oldest first"""
+        with self._lock:
+            return list(self._decisions)
+
+    @property
+    def last_decision(self) -> Optional[ConcurrencyDecision]:
+        with self._lock:
+            return self._decisions[-1] if self._decisions else None
+
+    def operation_status_changed(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        if index < 0:
+            return
+        key = (file.filename, index)
+        # called with the lock of the queue held: never stat here,
+        # the size is recorded by the job before it starts
+        size = get_cached_file_size(file) or 0
+        with self._lock:
+            if status == FileStatus.RUNNING:
+                self._started[key] = time()
+                return
+            started = self._started.pop(key, None)
+            if started is None or status != FileStatus.SUCCESS:
+                return
+            self._latencies.setdefault(index, []).append(
+                (time() - started) / (size + self.FILE_COST)
+            )
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        if new_status != FileStatus.SUCCESS:
+            return
+        size = get_cached_file_size(file) or 0
+        with self._lock:
+            self._nbytes += size + self.FILE_COST
+
+    def _get_latency_ratio(self) -> Optional[float]:
+        """
+        Returns the largest ratio between the mean latency of an operation
+        and its baseline, and updates the baselines.
+        """
+        ratio: Optional[float] = None
+        for index, latencies in self._latencies.items():
+            latency = sum(latencies) / len(latencies)
+            baseline = self._baselines.get(index)
+            if baseline is None or latency < baseline:
+                self._baselines[index] = latency
+                continue
+            ratio = max(ratio or 0, latency / baseline if baseline else 0)
+            self._baselines[index] = baseline + self.BASELINE_DRIFT * (
+                latency - baseline
+            )
+        return ratio
+
+    def update(self, now: Optional[float] = None) -> ConcurrencyDecision:
+        """
+        Decides on the number of workers, based on what was observed
+        since the previous update, and resizes the pool if necessary.
+        """
+        if now is None:
+            now = time()
+        with self._lock:
+            elapsed = max(now - self._last_update, 1e-3)
+            throughput = self._nbytes / elapsed
+            latency_ratio = self._get_latency_ratio()
+            size = self._pool.size
+            backlog = len(self._pool.ready_queue)
+
+            if latency_ratio is not None and (
+                latency_ratio > self.LATENCY_TOLERANCE
+            ):
+                size = int(size * self.DECREASE_FACTOR)
+                reason = f"latency increased {latency_ratio:.1f} times"
+            elif (
+                self._increased
+                and self._previous_throughput
+                and throughput
+                < self._previous_throughput * self.THROUGHPUT_TOLERANCE
+            ):
+                size = int(size * self.DECREASE_FACTOR)
+                reason = "throughput dropped after adding workers"
+            elif backlog:
+                size += 1
+                reason = f"{backlog} files waiting"
+            else:
+                reason = "no files waiting"
+
+            size = min(max(size, self._floor), self._ceiling)
+            self._increased = size > self._pool.size
+
+            decision = ConcurrencyDecision(
+                timestamp=now,
+                size=size,
+                reason=reason,
+                throughput=throughput,
+                latency_ratio=latency_ratio,
+            )
+            if size != self._pool.size:
+                logger.info(
+                    f"Changing the number of workers from {self._pool.size} to {size}: {reason}"
+                )
+                self._pool.resize(size)
+            self._decisions.append(decision)
+
+            self._previous_throughput = throughput
+            self._latencies.clear()
+            self._nbytes = 0
+            self._last_update = now
+
+        return decision
+
+    def start(self):
+        self._last_update = time()
+        self._thread = _ControllerThread(self)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.should_exit = True
+            self._thread.wake_up.set()
+            self._thread = None
+
+
+class _ControllerThread(ExitableThread):
+    def __init__(self, controller: AdaptiveConcurrency):
+        super().__init__()
+        self.name = "rfi-file-monitor-concurrency"
+        self.daemon = True
+        self._controller = controller
+        self.wake_up = Event()
+
+    def run(self):
+        while not self.wake_up.wait(self._controller._interval):
+            try:
+                self._controller.update()
+            except Exception:
+                logger.exception("Could not update the number of workers")
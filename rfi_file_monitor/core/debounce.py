@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+from threading import Condition, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Callable, Dict, Final, List, Optional
+
+if TYPE_CHECKING:
+    from .metrics import QueueMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class EventDebouncer:
+    """
+    Folds the events that an engine receives for the same path
+    into a single notification per window.
+
+    The first event for a path starts its window, and all events for it
+    that arrive before the window has passed are dropped. Once it has,
+    the callback is invoked from a separate thread with all paths whose
+    window passed together. A file that is written continuously is
+    therefore still reported once per window, rather than never.
+    """
+
+    def __init__(
+        self, callback: Callable[[List[str]], None], window: float = 0.5
+    ):
+        self._callback = callback
+        self._window = window
+        self._cond = Condition()
+        # insertion ordered, and therefore ordered by deadline as well
+        self._pending: Final[Dict[str, float]] = dict()
+        self._received: int = 0
+        self._dropped: int = 0
+        self._should_exit: bool = False
+        self._thread: Optional[Thread] = None
+
+    @property
+    def received(self) -> int:
+        """The number of events that were added"""
+        return self._received
+
+    @property
+    def dropped(self) -> int:
+        """The number of events that were folded into an earlier one"""
+        return self._dropped
+
+    def add_gauges(self, metrics: QueueMetrics):
+        metrics.add_gauge(
+            "engine_events_received",
+            "The number of events the engine received",
+            lambda: self._received,
+        )
+        metrics.add_gauge(
+            "engine_events_coalesced",
+            "The number of events folded into an earlier event for the same path",
+            lambda: self._dropped,
+        )
+
+    def add(self, path: str):
+        with self._cond:
+            self._received += 1
+            if path in self._pending:
+                self._dropped += 1
+                return
+            self._pending[path] = monotonic() + self._window
+            if len(self._pending) == 1:
+                self._cond.notify()
+
+    def discard(self, path: str):
+        """
+        Forgets the pending events of a path, for example because
+        it was deleted, or because it was reported through another channel.
+        """
+        with self._cond:
+            self._pending.pop(path, None)
+
+    def _pop_due(self) -> List[str]:
+        # must be called with the condition acquired
+        now = monotonic()
+        paths: List[str] = list()
+        for path, deadline in self._pending.items():
+            if deadline > now:
+                break
+            paths.append(path)
+        for path in paths:
+            del self._pending[path]
+        return paths
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._should_exit:
+                    if self._pending:
+                        timeout = (
+                            next(iter(self._pending.values())) - monotonic()
+                        )
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if self._should_exit:
+                    paths = list(self._pending)
+                    self._pending.clear()
+                else:
+                    paths = self._pop_due()
+            if paths:
+                try:
+                    self._callback(paths)
+                except Exception:
+                    logger.exception("Could not report debounced events")
+            if self._should_exit:
+                return
+
+    def start(self):
+        self._should_exit = False
+        self._thread = Thread(
+            target=self._run, name="rfi-file-monitor-debouncer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Reports the pending events right away, and stops the thread"""
+        with self._cond:
+            self._should_exit = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._received:
+            logger.info(f"Coalesced {self._dropped} of {self._received} events")
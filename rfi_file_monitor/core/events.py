@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from ..file import File, FileStatus
+
+
+class QueueObserver:
+    """
+    Base class for objects that want to follow what happens to the files
+    in a QueueCore. Subclasses only need to override the methods
+    for the events they are interested in.
+
+    The methods are invoked from whichever thread caused the event:
+    often this will be one of the workers. Status changes are reported
+    while the queue lock is held. Implementations should therefore return
+    quickly and must not block. GUI toolkits should forward the events
+    to their main loop, as the GTK QueueManager does.
+    """
+
+    def file_added(self, file: File):
+        """A new file has been added to the queue"""
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        """
+        The status of a file has changed. A file that has been
+        removed from the list will get REMOVED_FROM_LIST as status.
+        """
+
+    def file_requeued(self, file: File):
+        """
+        A file has been saved again after it was processed,
+        and will run through the pipeline once more.
+        The outcome of the previous run has been discarded.
+        """
+
+    def operation_status_changed(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        """
+        An operation has started or finished processing a file.
+        An index of -1 refers to the pipeline as a whole.
+        """
+
+    def operation_progress_changed(self, file: File, index: int, value: float):
+        """An operation reports progress, as a percentage"""
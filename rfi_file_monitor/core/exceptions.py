@@ -0,0 +1,19 @@
+class SkippedOperation(Exception):
+    pass
+
+
+class OperationCancelled(Exception):
+    """
+    Raised by operations when the processing of a file was cancelled,
+    because the file was modified or deleted in the meantime.
+    """
+
+    pass
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+class NotYetRunning(Exception):
+    pass
@@ -0,0 +1,557 @@
+from __future__ import annotations
+
+import itertools
+import logging
+from time import time
+from queue import Queue, Empty
+from threading import Lock, Semaphore, current_thread
+from typing import Final, List, Optional
+
+from munch import Munch
+
+from ..file import File, FileStatus
+from .scheduling import ReadyQueue, get_file_size
+from .exceptions import SkippedOperation, OperationCancelled
+from .retry import RetryPolicy
+from .utils import ExitableThread
+
+from tenacity import RetryError
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+
+    SKIPPED_MESSAGE = "A preceding operation has been skipped"
+    ERROR_MESSAGE = "Operation not started due to previous error"
+
+    def __init__(self, queue, file: File):
+        self._queue = queue
+        self._file = file
+        self._resume_index: int = 0
+
+    @property
+    def file(self) -> File:
+        return self._file
+
+    @property
+    def resume_index(self) -> int:
+        """The index of the first operation that needs to run"""
+        return self._resume_index
+
+    @property
+    def _should_exit(self) -> bool:
+        thread = current_thread()
+        return isinstance(thread, ExitableThread) and thread.should_exit
+
+    def run(self):
+        self.start()
+        for index in range(self._resume_index, len(self._queue.operations)):
+            self.run_operation(index)
+        self.finish()
+
+    @property
+    def failed(self) -> bool:
+        """
+        True as soon as one of the operations has failed,
+        including when it will be retried later.
+        """
+        return self._global_rv is not None or self._requeue_status is not None
+
+    def start(self):
+        # record the size while no locks are held,
+        # for the observers that account for the bytes processed
+        if self._file.size_hint is None:
+            self._file.size_hint = get_file_size(self._file)
+
+        # update status to running
+        self._file.update_status(-1, FileStatus.RUNNING)
+
+        self._journal = self._queue.journal
+        self._resume_index = self._file.resume_index
+        if self._journal is not None:
+            self._journal.record_started(self._file, self._resume_index)
+
+        # If operation.run() returns None, then it was considered a success.
+        # Otherwise a string is returned with an error message
+        self._rv = None
+        # this will contain the first error message we run into,
+        # and will be used as tooltip for the parent row
+        self._global_rv = None
+        # set when the file goes back to the queue before all operations
+        # have run, to have the remaining ones run by a later job
+        self._requeue_status: Optional[FileStatus] = None
+
+    def run_operation(self, index: int):
+        """
+        Runs a single operation. Once an operation has failed,
+        the remaining operations are marked as failed without running them.
+        """
+        if self._requeue_status is not None:
+            # the remaining operations will be run by a later job
+            return
+
+        operation = self._queue.operations[index]
+        if (
+            self._rv is None
+            and not self._should_exit
+            and not self._queue.allow_operation(self._file, index)
+        ):
+            self._hold(operation, index)
+            return
+
+        rv = self._rv
+        attempted = False
+        unavailable = False
+        cancelled = False
+        if self._should_exit:
+            rv = "Monitoring aborted"
+        elif rv is None:
+            # operations that are not run are not reported as running,
+            # which keeps them out of the metrics and the traces
+            self._file.update_status(index, FileStatus.RUNNING)
+            attempted = True
+            try:
+                self._file.cancellable.raise_if_cancelled()
+                process_pool = self._queue.process_pool
+                if process_pool is not None and getattr(
+                    operation, "CPU_BOUND", False
+                ):
+                    func = process_pool.run_operation
+                    args = (
+                        type(operation).run_in_process,
+                        operation.get_process_params(),
+                        self._file,
+                        index,
+                    )
+                else:
+                    func = operation.run
+                    args = (self._file,)
+                profiler = self._queue.profiler
+                if profiler is not None and profiler.is_profiled(index):
+                    rv = profiler.runcall(index, func, *args)
+                else:
+                    rv = func(*args)
+            except SkippedOperation as e:
+                rv = e
+            except OperationCancelled as e:
+                rv = str(e)
+                cancelled = True
+            except getattr(operation, "CONNECTION_ERRORS", ()) as e:
+                rv = str(e)
+                unavailable = True
+                logger.warning(f"{operation.NAME} could not connect: {rv}")
+            except RetryError as e:
+                # happens when the run method is wrapped with tenacity.retry
+                # and we ran out of retries
+                rv = str(e.last_attempt.result())
+            except Exception as e:
+                # exceptions caught here indicate a programming error,
+                # as exceptions should be caught during run, and if necessary,
+                # run should appropriate error message instead of None
+                # The only reason to catch it here is to avoid it taking the app down...
+                rv = str(e)
+                logger.exception(f"run() exception caught: {rv}!")
+            if (
+                rv is not None
+                and not isinstance(rv, SkippedOperation)
+                and self._file.cancellable.is_cancelled()
+            ):
+                # the operation may have turned the cancellation into an error
+                rv = self._file.cancellable.reason
+                cancelled = True
+            if not cancelled:
+                self._queue.record_operation(self._file, index, unavailable)
+        else:
+            # If we get here then an error was returned in a previous operation already
+            rv = self.ERROR_MESSAGE
+
+        if rv is None:
+            # update operation status to success
+            status, message = FileStatus.SUCCESS, None
+            self._file.attempts = 0
+        elif isinstance(rv, SkippedOperation):
+            # update operation status to skipped
+            status, message = FileStatus.SKIPPED, str(rv)
+            # reset rv to None to ensure the other operations are run
+            rv = None
+            self._file.attempts = 0
+        elif cancelled and self._file.requeue:
+            # saved again: the queue will start over with the new contents
+            logger.info(f"{self._file.filename}: {rv}")
+            self._requeue_status = FileStatus.SAVED
+            self._file.update_status(index, FileStatus.QUEUED, rv)
+            return
+        elif (
+            attempted
+            and not cancelled
+            and self._schedule_retry(operation, index, rv)
+        ):
+            return
+        else:
+            # update operation status to failed
+            status, message = FileStatus.FAILURE, rv
+            if self._global_rv is None:
+                self._global_rv = rv
+        self._rv = rv
+
+        self._file.update_status(index, status, message)
+        if self._journal is not None:
+            self._journal.record_operation(self._file, index, status, message)
+
+    def _schedule_retry(self, operation, index: int, rv: str) -> bool:
+        """
+        Returns True if the operation that just failed will be retried,
+        according to its RETRY_POLICY. The queue will hold on to the file
+        until its next attempt is due, while this worker moves on.
+        """
+        policy: Optional[RetryPolicy] = getattr(operation, "RETRY_POLICY", None)
+        if policy is None or self._should_exit:
+            return False
+        delay = policy.get_delay(self._file.attempts + 1)
+        if delay is None:
+            return False
+
+        self._file.attempts += 1
+        self._file.retry_at = time() + delay
+        self._file.resume_index = index
+        self._requeue_status = FileStatus.SAVED
+        message = f"Attempt {self._file.attempts} failed: {rv}. Retrying in {delay:.3g} seconds"
+        logger.info(f"{self._file.filename}: {message}")
+        self._file.update_status(index, FileStatus.QUEUED, message)
+        return True
+
+    def _hold(self, operation, index: int):
+        """
+        Returns the file to the queue without running the operation,
+        as its circuit breaker is open. The queue will hold on to the file
+        until the operation is available again.
+        """
+        self._file.resume_index = index
+        self._requeue_status = FileStatus.QUEUED
+        self._file.update_status(
+            index,
+            FileStatus.QUEUED,
+            f"{operation.NAME} is unavailable: waiting for it to recover",
+        )
+
+    def finish(self):
+        if self._requeue_status is not None:
+            # back to the queue: a file that failed is promoted again
+            # once its retry_at timestamp has passed
+            self._file.update_status(-1, self._requeue_status)
+            return
+
+        if self._journal is not None:
+            self._journal.record_finished(self._file, self._global_rv is None)
+
+        # update global operation status
+        if self._global_rv is None:
+            # update job status to success
+            # the timestamp must be set first, as the queue manager
+            # will use it to schedule the removal from the table
+            self._file.succeeded = time()
+            self._file.update_status(-1, FileStatus.SUCCESS)
+        else:
+            # update job status to failed
+            self._file.failed = time()
+            self._file.update_status(-1, FileStatus.FAILURE, self._global_rv)
+
+
+class Worker(ExitableThread):
+    """
+    A long-lived thread of a WorkerPool, which keeps pulling work
+    from the pool until it is closed.
+    """
+
+    def __init__(self, pool: WorkerPool, index: int, stage: int = 0):
+        super().__init__()
+        self._pool = pool
+        self._stage = stage
+        self.name = f"rfi-file-monitor-worker-{index}"
+        self.daemon = True
+        self._local: Final[Munch] = Munch()
+
+    @property
+    def pool(self) -> WorkerPool:
+        return self._pool
+
+    @property
+    def stage(self) -> int:
+        """The operation this worker runs, when part of a StagedWorkerPool"""
+        return self._stage
+
+    @property
+    def local(self) -> Munch:
+        """
+        State that operations may want to keep around while
+        this worker processes files, such as clients and sessions.
+        Values that have a close() method will be closed
+        when the worker exits.
+        """
+        return self._local
+
+    def run(self):
+        while True:
+            item = self._pool._get(self)
+            if item is None:
+                # the pool has been closed, or this worker has been retired
+                break
+            self._pool._process(self, item)
+
+        for value in self._local.values():
+            if callable(getattr(value, "close", None)):
+                try:
+                    value.close()
+                except Exception:
+                    logger.exception(f"{self.name}: could not close {value}")
+        self._local.clear()
+
+
+class WorkerPool:
+    """
+    A number of workers that process the files in the ready queue.
+    Each worker runs all operations on a file, before picking up the next one.
+    The number of workers may be changed while the pool is running.
+    """
+
+    # how often idle workers check if they have been retired
+    RETIRE_INTERVAL: Final[float] = 1.0
+
+    def __init__(self, queue, ready_queue: ReadyQueue, size: int):
+        self._queue = queue
+        self._ready_queue = ready_queue
+        self._lock = Lock()
+        self._njobs_running: int = 0
+        self._size: int = size
+        self._started: bool = False
+        self._worker_counter = itertools.count()
+        self._workers: Final[List[Worker]] = [
+            self._create_worker(stage)
+            for stage in range(self._nstages)
+            for _ in range(size)
+        ]
+
+    @property
+    def _nstages(self) -> int:
+        return 1
+
+    def _create_worker(self, stage: int) -> Worker:
+        return Worker(self, next(self._worker_counter), stage)
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def ready_queue(self) -> ReadyQueue:
+        return self._ready_queue
+
+    @property
+    def size(self) -> int:
+        """The number of workers, per stage for a StagedWorkerPool"""
+        with self._lock:
+            return self._size
+
+    @property
+    def nworkers(self) -> int:
+        """The number of workers, across all stages"""
+        with self._lock:
+            return self._size * self._nstages
+
+    @property
+    def njobs_running(self) -> int:
+        with self._lock:
+            return self._njobs_running
+
+    def _job_started(self):
+        with self._lock:
+            self._njobs_running += 1
+
+    def _job_finished(self):
+        with self._lock:
+            self._njobs_running -= 1
+
+    def resize(self, size: int):
+        """
+        Changes the number of workers. New workers start immediately,
+        while surplus workers exit once they have finished their current job.
+        """
+        if size < 1:
+            raise ValueError("A worker pool needs at least one worker")
+        with self._lock:
+            self._size = size
+            for stage in range(self._nstages):
+                nworkers = sum(
+                    1 for worker in self._workers if worker.stage == stage
+                )
+                for _ in range(size - nworkers):
+                    worker = self._create_worker(stage)
+                    self._workers.append(worker)
+                    if self._started:
+                        worker.start()
+
+    def _retire(self, worker: Worker) -> bool:
+        """Returns True if the worker should exit because the pool has shrunk"""
+        with self._lock:
+            nworkers = sum(
+                1 for _worker in self._workers if _worker.stage == worker.stage
+            )
+            if nworkers > self._size:
+                self._workers.remove(worker)
+                return True
+            return False
+
+    def _get(self, worker: Worker):
+        """Returns the next item for a worker, or None when it should exit"""
+        while not worker.should_exit and not self._retire(worker):
+            file = self._ready_queue.get(timeout=self.RETIRE_INTERVAL)
+            if file is not None or self._ready_queue.closed:
+                return file
+        return None
+
+    def _process(self, worker: Worker, file: File):
+        self._job_started()
+        try:
+            Job(self._queue, file).run()
+        except Exception:
+            logger.exception(f"Job for {file.filename} crashed")
+        finally:
+            self._job_finished()
+
+    def start(self):
+        with self._lock:
+            self._started = True
+            for worker in self._workers:
+                worker.start()
+
+    def stop(self):
+        """
+        Stops the pool without blocking: files that are still waiting
+        in the ready queue are dropped, and jobs that are currently running
+        will skip their remaining operations. The workers exit afterwards.
+        """
+        with self._lock:
+            for worker in self._workers:
+                worker.should_exit = True
+        self._ready_queue.close()
+
+    def join(self, timeout: Optional[float] = None):
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.join(timeout)
+
+
+class StagedWorkerPool(WorkerPool):
+    """
+    Runs the operations as a pipeline: each operation gets its own workers,
+    and a bounded inbox of jobs that have completed the previous operation.
+    This allows a file to be processed by an operation, while the next file
+    is processed by the operation before it.
+
+    The operations of a file are still run in order, and a job that fails
+    does not enter the next stages: its remaining operations are marked
+    as failed by the worker that ran into the error.
+    """
+
+    # poll interval for workers that are waiting for room in a full inbox
+    PUT_TIMEOUT: Final[float] = 0.5
+
+    def __init__(
+        self, queue, ready_queue: ReadyQueue, size: int, inbox_size: int
+    ):
+        nstages = len(queue.operations)
+        # the first stage pulls from the ready queue instead
+        self._inboxes: Final[List[Queue]] = [Queue() for _ in range(nstages)]
+        # limits the number of jobs that wait in each inbox
+        self._slots: Final[List[Semaphore]] = [
+            Semaphore(inbox_size) for _ in range(nstages)
+        ]
+        super().__init__(queue, ready_queue, size)
+
+    @property
+    def _nstages(self) -> int:
+        return len(self._inboxes)
+
+    @property
+    def nstages(self) -> int:
+        return self._nstages
+
+    def _get(self, worker: Worker):
+        stage = worker.stage
+        if stage == 0:
+            while True:
+                file = super()._get(worker)
+                if file is None:
+                    return None
+                job = Job(self._queue, file)
+                self._job_started()
+                try:
+                    job.start()
+                except Exception:
+                    logger.exception(f"Job for {file.filename} crashed")
+                    self._job_finished()
+                    continue
+                return job
+        # jobs that are still in the inbox when the pool is stopped
+        # are taken out before the workers exit, to mark them as aborted
+        while not self._retire(worker):
+            try:
+                job = self._inboxes[stage].get(timeout=self.RETIRE_INTERVAL)
+            except Empty:
+                continue
+            if job is not None:
+                self._slots[stage].release()
+            return job
+        return None
+
+    def _process(self, worker: Worker, job: Job):
+        stage = worker.stage
+        try:
+            if stage >= job.resume_index:
+                job.run_operation(stage)
+            next_stage = stage + 1
+            if (
+                next_stage < self._nstages
+                and not job.failed
+                and not worker.should_exit
+            ):
+                # blocks while the next inbox is full
+                while not self._slots[next_stage].acquire(
+                    timeout=self.PUT_TIMEOUT
+                ):
+                    if worker.should_exit:
+                        break
+                else:
+                    self._inboxes[next_stage].put(job)
+                    return
+            # this was the last stage for this job
+            for index in range(next_stage, self._nstages):
+                job.run_operation(index)
+            job.finish()
+        except Exception:
+            logger.exception(f"Job for {job.file.filename} crashed")
+        self._job_finished()
+
+    def stop(self):
+        """
+        Stops the pool without blocking. Jobs that are waiting
+        in an inbox will have their remaining operations marked as aborted.
+        """
+        super().stop()
+        with self._lock:
+            for worker in self._workers:
+                if worker.stage > 0:
+                    self._inboxes[worker.stage].put(None)
+
+
+def worker_local() -> Optional[Munch]:
+    """
+    Returns the state of the worker that is running the current thread,
+    or None when not called from within a worker.
+    """
+    thread = current_thread()
+    if isinstance(thread, Worker):
+        return thread.local
+    return None
@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Final, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
+from queue import Queue, Empty
+from threading import Lock, Thread, local
+from time import time
+import json
+import logging
+import os
+import sqlite3
+import urllib.parse
+
+from ..file import File, FileStatus
+from ..files.directory import Directory
+from ..files.s3_object import S3Object
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SCHEMA: Final[Sequence[str]] = (
+    """CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS files (
+        filename TEXT PRIMARY KEY,
+        status INTEGER NOT NULL,
+        signature TEXT,
+        succeeded INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS operations (
+        filename TEXT NOT NULL,
+        operation_index INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        message TEXT,
+        metadata TEXT,
+        PRIMARY KEY (filename, operation_index)
+    )""",
+)
+
+# SQLite limits the number of host parameters in a single statement
+_LOOKUP_CHUNK_SIZE: Final[int] = 500
+
+
+def get_file_signature(file: File) -> Optional[str]:
+    """
+    Returns a string that changes whenever the contents of a file change,
+    or None if this cannot be determined cheaply.
+    Files without signature are never skipped or resumed by the journal.
+    """
+    if isinstance(file, S3Object):
+        return file.etag or None
+    elif isinstance(file, Directory):
+        # the contents of a directory cannot be verified without walking it
+        return None
+    try:
+        stat = os.stat(file.filename)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+@dataclass
+class JournalEntry:
+    status: FileStatus
+    signature: Optional[str]
+    succeeded: bool
+    # operation index -> (status, metadata)
+    operations: Dict[int, Tuple[FileStatus, Optional[Dict[str, Any]]]] = field(
+        default_factory=dict
+    )
+
+
+def _connect_read_only(
+    path: str, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+    return sqlite3.connect(
+        uri, uri=True, timeout=30, check_same_thread=check_same_thread
+    )
+
+
+def _lookup(
+    conn: sqlite3.Connection, filenames: Sequence[str]
+) -> Dict[str, JournalEntry]:
+    rv: Dict[str, JournalEntry] = dict()
+    filenames = list(filenames)
+    for i in range(0, len(filenames), _LOOKUP_CHUNK_SIZE):
+        chunk = filenames[i : i + _LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        for filename, status, signature, succeeded in conn.execute(
+            f"SELECT filename, status, signature, succeeded FROM files WHERE filename IN ({placeholders})",
+            chunk,
+        ):
+            rv[filename] = JournalEntry(
+                status=FileStatus(status),
+                signature=signature,
+                succeeded=bool(succeeded),
+            )
+        for filename, index, status, metadata in conn.execute(
+            f"SELECT filename, operation_index, status, metadata FROM operations WHERE filename IN ({placeholders})",
+            chunk,
+        ):
+            if filename not in rv:
+                continue
+            rv[filename].operations[index] = (
+                FileStatus(status),
+                json.loads(metadata) if metadata else None,
+            )
+    return rv
+
+
+class JournalIndex:
+    """
+    Read-only view of a journal, which allows producers such as engines
+    to find the files that were processed successfully already,
+    before these are added to the queue. It uses its own connection,
+    which may only be used from the thread that created the index.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self._conn: Optional[sqlite3.Connection] = _connect_read_only(path)
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'fingerprint'"
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            # records of another pipeline
+            self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def split(
+        self, files: Sequence[File]
+    ) -> Tuple[List[File], List[File], Dict[str, JournalEntry]]:
+        """
+        Splits the files in those that still need to be processed,
+        and those that were processed successfully in a previous session
+        and have not changed since. Only the latter are checked for changes.
+        Also returns the journal entries of the files that still need to be
+        processed, which the queue uses to resume them.
+        """
+        if self._conn is None:
+            return list(files), list(), dict()
+        entries = _lookup(self._conn, [file.filename for file in files])
+        pending: List[File] = list()
+        processed: List[File] = list()
+        for file in files:
+            entry = entries.get(file.filename)
+            if (
+                entry is not None
+                and entry.succeeded
+                and entry.signature is not None
+                and entry.signature == get_file_signature(file)
+            ):
+                processed.append(file)
+                del entries[file.filename]
+            else:
+                pending.append(file)
+        return pending, processed, entries
+
+
+class _JournalWriterThread(Thread):
+    """
+    Writes the journal records in batches, each in a single transaction,
+    so that neither the GUI nor the workers have to wait for the disk.
+    """
+
+    # maximum number of records per transaction
+    BATCH_SIZE: Final[int] = 1000
+
+    def __init__(self, journal: Journal):
+        super().__init__(name="rfi-file-monitor-journal-writer")
+        self._journal = journal
+
+    def run(self):
+        conn = self._journal._connect()
+        try:
+            while True:
+                record = self._journal._records.get()
+                if record is None:
+                    break
+                batch = [record]
+                while len(batch) < self.BATCH_SIZE:
+                    try:
+                        record = self._journal._records.get_nowait()
+                    except Empty:
+                        break
+                    if record is None:
+                        self._write(conn, batch)
+                        return
+                    batch.append(record)
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, batch):
+        try:
+            with conn:
+                for statement, args in batch:
+                    conn.execute(statement, args)
+        except sqlite3.Error:
+            logger.exception(f"Could not write {len(batch)} journal records")
+
+
+class Journal:
+    """
+    On-disk record of the state of all files that pass through the
+    queue manager, and of the outcome of each of their operations.
+    After a restart it is used to skip files that were already processed
+    successfully, and to resume the others from the first operation
+    that did not succeed.
+
+    The journal is only valid for one particular pipeline: if the
+    fingerprint of the operations and their parameters changes,
+    all records are discarded.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self._path = path
+        self._fingerprint = fingerprint
+        self._records: Queue = Queue()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writer: Optional[_JournalWriterThread] = None
+        # lookups use a read-only connection per thread, as the queue
+        # adds files from the threads of the engines as well
+        self._readers = local()
+        self._reader_connections: List[sqlite3.Connection] = list()
+        self._readers_lock = Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def open_index(self) -> JournalIndex:
+        """
+        Opens a read-only index of this journal,
+        for use in the calling thread. The journal must be open.
+        """
+        return JournalIndex(self._path, self._fingerprint)
+
+    @staticmethod
+    def compact(path: str) -> int:
+        """
+        Removes the records of local files that no longer exist,
+        and reclaims the space they used. The journal must not be
+        in use by a running queue. Returns the number of removed records.
+        """
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            removed: List[Tuple[str]] = list()
+            for (filename,) in conn.execute("SELECT filename FROM files"):
+                # other files, such as S3 objects, cannot be checked cheaply
+                if os.path.isabs(filename) and not os.path.lexists(filename):
+                    removed.append((filename,))
+            with conn:
+                conn.executemany(
+                    "DELETE FROM files WHERE filename = ?", removed
+                )
+                conn.executemany(
+                    "DELETE FROM operations WHERE filename = ?", removed
+                )
+                # operations whose file record has been replaced
+                conn.execute(
+                    "DELETE FROM operations WHERE filename NOT IN (SELECT filename FROM files)"
+                )
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        logger.info(f"Removed {len(removed)} records from journal {path}")
+        return len(removed)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def open(self):
+        """
+        Opens the database, creating it if necessary.
+        The connection that is opened here may only be used
+        from the calling thread, which is usually the GUI thread.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                for statement in JOURNAL_SCHEMA:
+                    conn.execute(statement)
+                row = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'fingerprint'"
+                ).fetchone()
+                if row is not None and row[0] != self._fingerprint:
+                    logger.info(
+                        f"Pipeline has changed: discarding journal {self._path}"
+                    )
+                    conn.execute("DELETE FROM files")
+                    conn.execute("DELETE FROM operations")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                    (self._fingerprint,),
+                )
+        except sqlite3.Error:
+            conn.close()
+            raise
+        self._conn = conn
+        self._writer = _JournalWriterThread(self)
+        self._writer.start()
+
+    def close(self):
+        """
+        Stops accepting new records, and waits until the records that are
+        still pending have been written to disk by the writer thread,
+        so that a journal that is reopened right away sees all of them.
+        """
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
+        with self._readers_lock:
+            for conn in self._reader_connections:
+                conn.close()
+            self._reader_connections.clear()
+        self._records.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _get_reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            # closed by close(), which may be called from another thread
+            conn = _connect_read_only(self._path, check_same_thread=False)
+            with self._readers_lock:
+                self._reader_connections.append(conn)
+            self._readers.conn = conn
+        return conn
+
+    def lookup(self, filenames: Sequence[str]) -> Dict[str, JournalEntry]:
+        """
+        Returns the journal entries of those files that have one.
+        May be called from any thread, each of which reads
+        through a connection of its own.
+        """
+        if self._conn is None:
+            return dict()
+        return _lookup(self._get_reader(), filenames)
+
+    def _put(self, statement: str, args: tuple):
+        if self._conn is None:
+            # the journal has been closed already: drop the record
+            return
+        self._records.put((statement, args))
+
+    def record_status(self, file: File):
+        """
+        Records the current status of a file. When a file is (re)saved,
+        the outcome of the previous run is forgotten,
+        unless the file is about to be resumed.
+        """
+        if (
+            file.status in (FileStatus.CREATED, FileStatus.SAVED)
+            and file.resume_index == 0
+        ):
+            self._put(
+                "INSERT OR REPLACE INTO files (filename, status, signature, succeeded, updated) VALUES (?, ?, NULL, 0, ?)",
+                (file.filename, int(file.status), time()),
+            )
+            self._put(
+                "DELETE FROM operations WHERE filename = ?", (file.filename,)
+            )
+        else:
+            self._put(
+                "UPDATE files SET status = ?, updated = ? WHERE filename = ?",
+                (int(file.status), time(), file.filename),
+            )
+
+    def record_started(self, file: File, resume_index: int):
+        """
+        Records that a job has started processing a file,
+        along with the signature of its contents. Call from the worker thread.
+        """
+        self._put(
+            "INSERT OR REPLACE INTO files (filename, status, signature, succeeded, updated) VALUES (?, ?, ?, 0, ?)",
+            (
+                file.filename,
+                int(FileStatus.RUNNING),
+                get_file_signature(file),
+                time(),
+            ),
+        )
+        self._put(
+            "DELETE FROM operations WHERE filename = ? AND operation_index >= ?",
+            (file.filename, resume_index),
+        )
+
+    def record_operation(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        """
+        Records the outcome of an operation,
+        including the metadata it attached to the file.
+        """
+        metadata = file.operation_metadata.get(index)
+        self._put(
+            "INSERT OR REPLACE INTO operations (filename, operation_index, status, message, metadata) VALUES (?, ?, ?, ?, ?)",
+            (
+                file.filename,
+                index,
+                int(status),
+                message,
+                json.dumps(metadata, default=str)
+                if metadata is not None
+                else None,
+            ),
+        )
+
+    def record_finished(self, file: File, succeeded: bool):
+        self._put(
+            "UPDATE files SET succeeded = ?, updated = ? WHERE filename = ?",
+            (int(succeeded), time(), file.filename),
+        )
@@ -0,0 +1,492 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+from threading import Event, Lock, Thread
+from time import time
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+
+from ..file import File, FileStatus
+from .events import QueueObserver
+from .scheduling import get_file_size
+from .utils import ExitableThread
+
+logger = logging.getLogger(__name__)
+
+PREFIX: Final[str] = "rfi_file_monitor"
+
+# upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS: Final[Tuple[float, ...]] = (
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+    3600,
+)
+
+
+class Histogram:
+    """
+    Counts observations in buckets with fixed upper bounds,
+    like a Prometheus histogram. This class is not thread-safe.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self._buckets = buckets
+        # the last count is for observations above the largest bound
+        self._counts: List[int] = [0] * (len(buckets) + 1)
+        self._sum: float = 0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The cumulative count per upper bound, the sum and the count"""
+        cumulative = 0
+        buckets = list()
+        for bound, count in zip(self._buckets, self._counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return dict(buckets=buckets, sum=self._sum, count=self.count)
+
+
+class _OperationMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.nbytes: int = 0
+        self.succeeded: int = 0
+        self.failed: int = 0
+        self.retries: int = 0
+        self.latency = Histogram()
+
+
+class QueueMetrics(QueueObserver):
+    """
+    Collects metrics on the files that pass through a QueueCore:
+    the number of files per status, the bytes processed and the latency
+    of every operation, the end-to-end latency of the files,
+    retries and failures, and the utilization of the workers.
+
+    The end-to-end latency is measured from the moment a file is added
+    to the queue until it has been processed, successfully or not.
+    Additional gauges can be registered with add_gauge,
+    such as the backlog of a GUI.
+    """
+
+    def __init__(self, queue):
+        self._queue = queue
+        self._lock = Lock()
+        self._operations: Final[List[_OperationMetrics]] = [
+            _OperationMetrics(operation.NAME) for operation in queue.operations
+        ]
+        self._latency = Histogram()
+        self._nsucceeded: int = 0
+        self._nfailed: int = 0
+        self._gauges: Final[Dict[str, Tuple[str, Callable[[], float]]]] = {}
+
+        # the start time of the files, and of their running operations,
+        # along with the number of attempts at that point
+        self._added: Dict[str, float] = dict()
+        self._started: Dict[Tuple[str, int], Tuple[float, int]] = dict()
+
+    def add_gauge(self, name: str, help: str, callback: Callable[[], float]):
+        """
+        Registers a value that is read whenever a snapshot is taken.
+        The callback may be called from any thread.
+        """
+        with self._lock:
+            self._gauges[name] = (help, callback)
+
+    def file_added(self, file: File):
+        with self._lock:
+            self._added[file.filename] = time()
+
+    def file_requeued(self, file: File):
+        with self._lock:
+            self._added[file.filename] = time()
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        if new_status not in (
+            FileStatus.SUCCESS,
+            FileStatus.FAILURE,
+            FileStatus.REMOVED_FROM_LIST,
+        ):
+            return
+        with self._lock:
+            added = self._added.pop(file.filename, None)
+            if new_status == FileStatus.SUCCESS:
+                self._nsucceeded += 1
+            elif new_status == FileStatus.FAILURE:
+                self._nfailed += 1
+            else:
+                return
+            if added is not None:
+                self._latency.observe(time() - added)
+
+    def operation_status_changed(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        if index < 0 or index >= len(self._operations):
+            return
+        key = (file.filename, index)
+        if status == FileStatus.RUNNING:
+            with self._lock:
+                self._started[key] = (time(), file.attempts)
+            return
+        # stat the file outside of the lock
+        size = get_file_size(file) if status == FileStatus.SUCCESS else None
+        with self._lock:
+            started = self._started.pop(key, None)
+            if started is None:
+                return
+            operation = self._operations[index]
+            if status == FileStatus.SUCCESS:
+                operation.succeeded += 1
+                operation.nbytes += size or 0
+            elif status == FileStatus.FAILURE:
+                operation.failed += 1
+            elif status == FileStatus.QUEUED and file.attempts > started[1]:
+                # only retries increase the number of attempts
+                operation.retries += 1
+            if status in (FileStatus.SUCCESS, FileStatus.FAILURE):
+                operation.latency.observe(time() - started[0])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics, as a dict that can be serialized to JSON"""
+        # the queue calls the observers with its lock held,
+        # so it must not be called with our lock held
+        queue = self._queue
+        counts = queue.get_status_counts()
+        backlog = queue.backlog
+        nspilled = queue.nspilled
+        narchived = queue.narchived
+        nworkers = queue.nworkers
+        njobs_running = queue.njobs_running
+        breakers = queue.circuit_breakers
+        with self._lock:
+            gauges = list(self._gauges.items())
+            snapshot: Dict[str, Any] = dict(
+                timestamp=time(),
+                files={
+                    status.name.lower(): counts[status]
+                    for status in FileStatus
+                    if status != FileStatus.REMOVED_FROM_LIST
+                },
+                backlog=backlog,
+                spilled=nspilled,
+                archived=narchived,
+                succeeded=self._nsucceeded,
+                failed=self._nfailed,
+                latency=self._latency.snapshot(),
+                workers=dict(
+                    total=nworkers,
+                    busy=njobs_running,
+                    utilization=njobs_running / nworkers if nworkers else 0,
+                ),
+                operations=[
+                    dict(
+                        name=operation.name,
+                        bytes=operation.nbytes,
+                        succeeded=operation.succeeded,
+                        failed=operation.failed,
+                        retries=operation.retries,
+                        latency=operation.latency.snapshot(),
+                        circuit_breaker=str(breakers[index].state)
+                        if index < len(breakers)
+                        else None,
+                    )
+                    for index, operation in enumerate(self._operations)
+                ],
+            )
+        snapshot["gauges"] = dict()
+        for name, (_, callback) in gauges:
+            try:
+                snapshot["gauges"][name] = callback()
+            except Exception:
+                logger.exception(f"Could not read gauge {name}")
+        return snapshot
+
+    def to_prometheus(self, snapshot: Optional[Dict[str, Any]] = None) -> str:
+        """Renders a snapshot in the Prometheus text exposition format"""
+        if snapshot is None:
+            snapshot = self.snapshot()
+        lines: List[str] = list()
+
+        def _add(
+            name: str,
+            type: str,
+            help: str,
+            samples: List[Tuple[str, float]],
+        ):
+            # samples consist of the suffix of the name, including the labels,
+            # and the value
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} {type}")
+            lines.extend(
+                f"{PREFIX}_{name}{suffix} {value}" for suffix, value in samples
+            )
+
+        def _histogram(
+            histogram: Dict[str, Any], label: Optional[str] = None
+        ) -> List[Tuple[str, float]]:
+            labels = [label] if label else []
+            samples = [
+                (_labels("_bucket", labels + [f'le="{bound}"']), count)
+                for bound, count in histogram["buckets"]
+            ]
+            samples.append(
+                (_labels("_bucket", labels + ['le="+Inf"']), histogram["count"])
+            )
+            samples.append((_labels("_sum", labels), histogram["sum"]))
+            samples.append((_labels("_count", labels), histogram["count"]))
+            return samples
+
+        _add(
+            "files",
+            "gauge",
+            "The number of files in the queue per status",
+            [
+                (f'{{status="{status}"}}', count)
+                for status, count in snapshot["files"].items()
+            ],
+        )
+        _add(
+            "backlog",
+            "gauge",
+            "The number of files that have not been processed yet",
+            [("", snapshot["backlog"])],
+        )
+        _add(
+            "spilled_files",
+            "gauge",
+            "The number of files that are waiting on disk to be added",
+            [("", snapshot["spilled"])],
+        )
+        _add(
+            "archived_files",
+            "gauge",
+            "The number of files that were removed from the list",
+            [("", snapshot["archived"])],
+        )
+        _add(
+            "files_processed_total",
+            "counter",
+            "The number of files that have been processed",
+            [
+                ('{outcome="success"}', snapshot["succeeded"]),
+                ('{outcome="failure"}', snapshot["failed"]),
+            ],
+        )
+        _add(
+            "file_latency_seconds",
+            "histogram",
+            "The time from adding a file to the queue until it was processed",
+            _histogram(snapshot["latency"]),
+        )
+        _add(
+            "workers",
+            "gauge",
+            "The number of workers",
+            [("", snapshot["workers"]["total"])],
+        )
+        _add(
+            "workers_busy",
+            "gauge",
+            "The number of workers that are processing a file",
+            [("", snapshot["workers"]["busy"])],
+        )
+
+        operations = snapshot["operations"]
+        for name, type, help, key in (
+            (
+                "operation_bytes_total",
+                "counter",
+                "The number of bytes processed by an operation",
+                "bytes",
+            ),
+            (
+                "operation_succeeded_total",
+                "counter",
+                "The number of files an operation processed successfully",
+                "succeeded",
+            ),
+            (
+                "operation_failed_total",
+                "counter",
+                "The number of files an operation failed to process",
+                "failed",
+            ),
+            (
+                "operation_retries_total",
+                "counter",
+                "The number of times an operation was retried",
+                "retries",
+            ),
+        ):
+            _add(
+                name,
+                type,
+                help,
+                [
+                    (
+                        f'{{operation="{_escape(operation["name"])}"}}',
+                        operation[key],
+                    )
+                    for operation in operations
+                ],
+            )
+        _add(
+            "operation_latency_seconds",
+            "histogram",
+            "The time an operation took to process a file",
+            [
+                sample
+                for operation in operations
+                for sample in _histogram(
+                    operation["latency"],
+                    f'operation="{_escape(operation["name"])}"',
+                )
+            ],
+        )
+        _add(
+            "circuit_breaker_open",
+            "gauge",
+            "Whether the circuit breaker of an operation is not closed",
+            [
+                (
+                    f'{{operation="{_escape(operation["name"])}"}}',
+                    int(operation["circuit_breaker"] not in (None, "closed")),
+                )
+                for operation in operations
+            ],
+        )
+
+        with self._lock:
+            helps = {name: help for name, (help, _) in self._gauges.items()}
+        for name, value in snapshot["gauges"].items():
+            _add(name, "gauge", helps.get(name, name), [("", value)])
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _labels(suffix: str, labels: List[str]) -> str:
+    if not labels:
+        return suffix
+    return f"{suffix}{{{','.join(labels)}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """
+    Serves the metrics in the Prometheus text format over HTTP,
+    on localhost only.
+    """
+
+    def __init__(self, metrics: QueueMetrics, port: int):
+        self._metrics = metrics
+        self._port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[Thread] = None
+
+    @property
+    def port(self) -> int:
+        """The port that is listened on, which is useful if 0 was requested"""
+        if self._server is not None:
+            return self._server.server_address[1]
+        return self._port
+
+    def start(self):
+        metrics = self._metrics
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self._port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(
+            target=self._server.serve_forever,
+            name="rfi-file-monitor-metrics-server",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"Serving metrics on http://127.0.0.1:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+
+class MetricsWriter(ExitableThread):
+    """
+    Appends a snapshot of the metrics to a JSON lines file
+    at a fixed interval, and once more when stopped.
+    """
+
+    def __init__(self, metrics: QueueMetrics, path: str, interval: float):
+        super().__init__()
+        self.name = "rfi-file-monitor-metrics-writer"
+        self.daemon = True
+        self._metrics = metrics
+        self._path = path
+        self._interval = interval
+        self._wake_up = Event()
+
+    def _write(self):
+        try:
+            line = json.dumps(self._metrics.snapshot())
+            with open(self._path, "a") as f:
+                f.write(line + "\n")
+        except Exception:
+            logger.exception(f"Could not write metrics to {self._path}")
+
+    def run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        while not self._wake_up.wait(self._interval):
+            self._write()
+        self._write()
+
+    def stop(self):
+        self.should_exit = True
+        self._wake_up.set()
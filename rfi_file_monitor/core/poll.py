@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+import logging
+import os
+import platform
+from time import monotonic, time
+from typing import (
+    Dict,
+    Final,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .scan import ScanEntry, ScanProgress
+from .utils import PatternMatcher
+
+logger = logging.getLogger(__name__)
+
+# on Windows, os.scandir gets the size and modification time of files
+# along with their names, while the inode number requires a separate call
+_STAT_IS_FREE: Final[bool] = platform.system() == "Windows"
+
+# size, modification time in ns, inode number as reported by os.scandir
+_FileRecord = Tuple[int, int, int]
+
+
+class _Directory:
+    __slots__ = ("mtime_ns", "racy", "files", "subdirectories")
+
+    def __init__(self, mtime_ns: int, racy: bool):
+        self.mtime_ns = mtime_ns
+        # set when the directory may have changed again within the
+        # granularity of its modification time, after it was listed
+        self.racy = racy
+        self.files: Dict[str, _FileRecord] = dict()
+        self.subdirectories: Set[str] = set()
+
+
+@dataclass
+class PollChanges:
+    """The changes a DirectoryPoller found since the previous poll"""
+
+    created: List[ScanEntry] = field(default_factory=list)
+    modified: List[ScanEntry] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.created or self.modified or self.deleted)
+
+
+class DirectoryPoller:
+    """
+    Detects changes to the files in a directory tree by polling,
+    for filesystems whose changes are not reported to the monitor,
+    such as NFS, SMB and GPFS mounts written to by other hosts.
+
+    A snapshot of the size and modification time of all matching files
+    is kept. Each poll checks the modification time of all directories,
+    and only lists those that changed, as that is where files were
+    created, deleted or renamed. The files that changed recently, and are
+    therefore likely still being written, are checked on every poll.
+    All other files are only checked every full_check_interval seconds,
+    if set, to find files that are modified in place long after being
+    created. All checks are spread across a pool of threads,
+    which hides the latency of the metadata server.
+
+    Symbolic links are ignored. A directory that cannot be read is
+    kept as it was, so that a share that is unavailable for a while
+    does not cause its files to be reported as deleted.
+    """
+
+    MAX_WORKERS: Final[int] = 8
+    # directories modified this long before being listed may be modified
+    # again without their modification time changing on coarse filesystems
+    RACY_INTERVAL: Final[float] = 2.0
+    # the number of files that are checked by a single task
+    STAT_CHUNK_SIZE: Final[int] = 256
+
+    def __init__(
+        self,
+        directory: Union[str, os.PathLike],
+        matcher: PatternMatcher,
+        recursive: bool = True,
+        active_interval: float = 60.0,
+        full_check_interval: float = 0.0,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self._root = os.fspath(directory)
+        self._matcher = matcher
+        self._recursive = recursive
+        self._active_interval = active_interval
+        self._full_check_interval = full_check_interval
+        self._max_workers = max_workers
+        self._directories: Dict[str, _Directory] = dict()
+        # files that changed recently, with the time they were seen changing
+        self._active: Dict[str, float] = dict()
+        self._last_full_check = monotonic()
+
+    @property
+    def directory(self) -> str:
+        return self._root
+
+    @property
+    def ndirectories(self) -> int:
+        return len(self._directories)
+
+    @property
+    def nactive(self) -> int:
+        """The number of files that are checked on every poll"""
+        return len(self._active)
+
+    def __len__(self) -> int:
+        return sum(
+            len(directory.files) for directory in self._directories.values()
+        )
+
+    def scan(
+        self, progress: Optional[ScanProgress] = None
+    ) -> Iterator[ScanEntry]:
+        """
+        Takes the initial snapshot of the tree, yielding the files
+        while it is being scanned. Errors reading the directory itself
+        are raised by the iterator, errors reading its subdirectories
+        are logged.
+        """
+        if self._directories:
+            raise RuntimeError("The directory has been scanned already")
+        now = time()
+        for entry in self._update([self._root], [], PollChanges(), progress):
+            if now - entry.stat.st_mtime < self._active_interval:
+                self._active[entry.path] = monotonic()
+            yield entry
+
+    def poll(self) -> PollChanges:
+        """
+        Updates the snapshot, and returns the changes since the previous
+        poll, or since the initial scan. Raises an exception if the
+        directory itself cannot be read, leaving the snapshot untouched.
+        """
+        now = monotonic()
+        for path, changed in list(self._active.items()):
+            if now - changed > self._active_interval:
+                del self._active[path]
+        check_all = (
+            self._full_check_interval > 0
+            and now - self._last_full_check >= self._full_check_interval
+        )
+        if check_all:
+            self._last_full_check = now
+
+        paths = list(self._directories)
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="rfi-file-monitor-poller",
+        ) as executor:
+            stats = list(executor.map(_stat_directory, paths))
+
+        rescan: List[str] = list()
+        unchanged: Set[str] = set()
+        for path, stat in zip(paths, stats):
+            if isinstance(stat, OSError):
+                if path == self._root:
+                    raise stat
+                # removed directories are found by listing their parent
+                if not isinstance(stat, FileNotFoundError):
+                    logger.warning(f"Could not check {path}: {stat}")
+                continue
+            directory = self._directories[path]
+            if directory.racy or stat.st_mtime_ns != directory.mtime_ns:
+                rescan.append(path)
+            else:
+                unchanged.add(path)
+
+        if check_all:
+            files = [
+                os.path.join(path, name)
+                for path in unchanged
+                for name in self._directories[path].files
+            ]
+        else:
+            files = [
+                path
+                for path in self._active
+                if os.path.dirname(path) in unchanged
+            ]
+
+        changes = PollChanges()
+        for entry in self._update(rescan, files, changes, check_all=check_all):
+            self._active[entry.path] = monotonic()
+            changes.created.append(entry)
+        return changes
+
+    def _update(
+        self,
+        directories: List[str],
+        files: List[str],
+        changes: PollChanges,
+        progress: Optional[ScanProgress] = None,
+        check_all: bool = False,
+    ) -> Iterator[ScanEntry]:
+        # lists the directories and checks the files in parallel,
+        # recording the deleted and modified files in changes,
+        # and yielding the created files, which are not marked as active
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="rfi-file-monitor-poller",
+        ) as executor:
+            futures: Dict[Future, str] = dict()
+
+            def list_directory(path: str):
+                future = executor.submit(
+                    self._list,
+                    path,
+                    self._directories.get(path),
+                    check_all,
+                )
+                futures[future] = path
+
+            for path in directories:
+                list_directory(path)
+            for index in range(0, len(files), self.STAT_CHUNK_SIZE):
+                chunk = files[index : index + self.STAT_CHUNK_SIZE]
+                futures[executor.submit(_stat_files, chunk)] = ""
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = futures.pop(future)
+                    if not path:
+                        self._update_files(future.result(), changes)
+                        continue
+                    try:
+                        directory, created, modified = future.result()
+                    except OSError as e:
+                        if path == self._root:
+                            raise
+                        self._list_failed(path, e)
+                        continue
+                    old = self._directories.get(path)
+                    self._directories[path] = directory
+                    if old is not None:
+                        for name in old.files.keys() - directory.files.keys():
+                            self._deleted(os.path.join(path, name), changes)
+                        for subdirectory in (
+                            old.subdirectories - directory.subdirectories
+                        ):
+                            self._remove(subdirectory, changes)
+                    for subdirectory in directory.subdirectories:
+                        if subdirectory not in self._directories:
+                            list_directory(subdirectory)
+                    now = monotonic()
+                    for entry in modified:
+                        self._active[entry.path] = now
+                    changes.modified.extend(modified)
+                    if progress is not None:
+                        progress._add(directories=1, files=len(created))
+                    yield from created
+
+    def _list(
+        self, path: str, known: Optional[_Directory], check_all: bool
+    ) -> Tuple[_Directory, List[ScanEntry], List[ScanEntry]]:
+        # runs in a worker thread: the snapshot is only read here
+        listed = time()
+        stat = os.stat(path)
+        directory = _Directory(
+            stat.st_mtime_ns, stat.st_mtime >= listed - self.RACY_INTERVAL
+        )
+        created: List[ScanEntry] = list()
+        modified: List[ScanEntry] = list()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self._recursive:
+                            directory.subdirectories.add(entry.path)
+                        continue
+                    if not entry.is_file(
+                        follow_symlinks=False
+                    ) or not self._matcher.match(entry.path):
+                        continue
+                    inode = 0 if _STAT_IS_FREE else entry.inode()
+                    record = (
+                        known.files.get(entry.name)
+                        if known is not None
+                        else None
+                    )
+                    # files that were neither replaced nor changed recently
+                    # are assumed to be unchanged, avoiding a stat call
+                    if (
+                        record is not None
+                        and not check_all
+                        and not _STAT_IS_FREE
+                        and record[2] == inode
+                        and entry.path not in self._active
+                    ):
+                        directory.files[entry.name] = record
+                        continue
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                directory.files[entry.name] = (
+                    entry_stat.st_size,
+                    entry_stat.st_mtime_ns,
+                    inode,
+                )
+                if record is None:
+                    created.append(ScanEntry(entry.path, entry_stat))
+                elif record[:2] != (entry_stat.st_size, entry_stat.st_mtime_ns):
+                    modified.append(ScanEntry(entry.path, entry_stat))
+        return directory, created, modified
+
+    def _list_failed(self, path: str, e: OSError):
+        if path in self._directories:
+            # keep the old contents, it is listed again when it changes
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Could not list {path}: {e}")
+            return
+        # make sure a new directory is tried again on the next poll,
+        # by listing its parent again
+        if not isinstance(e, FileNotFoundError):
+            logger.warning(f"Could not list {path}: {e}. Trying again later")
+        parent = self._directories.get(os.path.dirname(path))
+        if parent is not None:
+            parent.subdirectories.discard(path)
+            parent.racy = True
+
+    def _update_files(
+        self,
+        results: List[Tuple[str, Union[os.stat_result, OSError]]],
+        changes: PollChanges,
+    ):
+        now = monotonic()
+        for path, stat in results:
+            # deleted files are found by listing their directory
+            if isinstance(stat, OSError):
+                continue
+            parent, name = os.path.split(path)
+            directory = self._directories.get(parent)
+            if directory is None or name not in directory.files:
+                continue
+            size, mtime_ns, inode = directory.files[name]
+            if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                directory.files[name] = (stat.st_size, stat.st_mtime_ns, inode)
+                self._active[path] = now
+                changes.modified.append(ScanEntry(path, stat))
+
+    def _deleted(self, path: str, changes: PollChanges):
+        self._active.pop(path, None)
+        changes.deleted.append(path)
+
+    def _remove(self, path: str, changes: PollChanges):
+        # forgets a directory that was removed, along with its subdirectories
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            directory = self._directories.pop(path, None)
+            if directory is None:
+                continue
+            for name in directory.files:
+                self._deleted(os.path.join(path, name), changes)
+            stack.extend(directory.subdirectories)
+
+
+def _stat_directory(path: str) -> Union[os.stat_result, OSError]:
+    try:
+        return os.stat(path)
+    except OSError as e:
+        return e
+
+
+def _stat_files(
+    paths: List[str],
+) -> List[Tuple[str, Union[os.stat_result, OSError]]]:
+    results: List[Tuple[str, Union[os.stat_result, OSError]]] = list()
+    for path in paths:
+        try:
+            results.append((path, os.lstat(path)))
+        except OSError as e:
+            results.append((path, e))
+    return results
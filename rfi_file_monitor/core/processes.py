@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import ctypes
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Event, Lock, Thread, current_thread
+from typing import Any, Callable, Dict, Final, Optional, Tuple
+
+from ..file import File
+from .events import QueueObserver
+from .exceptions import OperationCancelled
+from .job import Worker
+from .utils import Cancellable
+
+logger = logging.getLogger(__name__)
+
+# the number of tasks whose cancellation can be tracked at the same time
+CANCEL_SLOTS: Final[int] = 4096
+
+# the queue that the progress updates are sent through,
+# and the flags of the cancelled tasks,
+# only set in the processes of a ProcessPool
+_progress_queue = None
+_cancelled = None
+
+
+def _init_process(progress_queue, cancelled):
+    global _progress_queue, _cancelled
+    _progress_queue = progress_queue
+    _cancelled = cancelled
+
+
+class _TaskCancellable(Cancellable):
+    """Follows the cancellable of the file in the main process"""
+
+    def __init__(self, task_id: int):
+        super().__init__()
+        self._slot = task_id % CANCEL_SLOTS
+
+    def is_cancelled(self) -> bool:
+        return bool(_cancelled[self._slot])
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise OperationCancelled("Operation cancelled")
+
+
+class _ProgressForwarder(QueueObserver):
+    """Sends the progress of a file back to the main process"""
+
+    def __init__(self, task_id: int):
+        self._task_id = task_id
+
+    def operation_progress_changed(self, file: File, index: int, value: float):
+        _progress_queue.put((self._task_id, index, value))
+
+
+def _run_operation(
+    task_id: int, func: Callable, params, file: File, index: int
+):
+    file.observer = _ProgressForwarder(task_id)
+    file._cancellable = _TaskCancellable(task_id)
+    try:
+        rv = func(params, file, index)
+    finally:
+        # lets the main process know that all progress has been sent
+        _progress_queue.put((task_id, None, None))
+    return rv, file.operation_metadata.get(index)
+
+
+class ProcessPool:
+    """
+    A pool of processes that runs the CPU-bound operations,
+    which would otherwise compete for the GIL with the GUI and with
+    each other. The processes are spawned rather than forked,
+    as forking a process that runs GTK is not safe.
+
+    Anything that is sent to the processes must be picklable.
+    Files are sent without their observer: their progress is sent back
+    to the main process, where it is reported for the original file.
+    Cancelling the original file is passed on to the copy in the process.
+    """
+
+    # how long to wait for the remaining progress of an operation
+    PROGRESS_TIMEOUT: Final[float] = 5.0
+
+    def __init__(self, size: int):
+        self._size = size
+        self._lock = Lock()
+        self._tasks: Final[Dict[int, Tuple[File, Event]]] = dict()
+        self._task_counter = itertools.count()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress_queue = None
+        self._cancelled = None
+        self._progress_thread: Optional[Thread] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        self._progress_queue = context.Queue()
+        self._cancelled = context.RawArray(ctypes.c_bool, CANCEL_SLOTS)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._size,
+            mp_context=context,
+            initializer=_init_process,
+            initargs=(self._progress_queue, self._cancelled),
+        )
+        self._progress_thread = Thread(
+            target=self._forward_progress,
+            name="rfi-file-monitor-process-progress",
+            daemon=True,
+        )
+        self._progress_thread.start()
+
+    def stop(self):
+        """
+        Stops the pool without blocking. Operations that are still
+        running in a process will be allowed to finish.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._progress_queue.put(None)
+
+    def _forward_progress(self):
+        progress_queue = self._progress_queue
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                break
+            task_id, index, value = item
+            with self._lock:
+                task = self._tasks.get(task_id)
+            if task is None:
+                continue
+            file, done = task
+            if index is None:
+                done.set()
+            else:
+                file.update_progressbar(index, value)
+
+    def run_operation(self, func: Callable, params, file: File, index: int):
+        """
+        Runs func(params, file, index) in one of the processes, and blocks
+        until it has finished. The return value is passed on, as are
+        exceptions. The metadata that the operation attached to the file
+        is copied to the original file.
+        """
+        task_id = next(self._task_counter)
+        slot = task_id % CANCEL_SLOTS
+        done = Event()
+        self._cancelled[slot] = False
+
+        def _cancel():
+            self._cancelled[slot] = True
+
+        with self._lock:
+            self._tasks[task_id] = (file, done)
+        file.cancellable.connect(_cancel)
+        try:
+            future = self._executor.submit(
+                _run_operation, task_id, func, params, file, index
+            )
+            try:
+                rv, metadata = future.result()
+            except OperationCancelled:
+                # with the reason it was cancelled for
+                file.cancellable.raise_if_cancelled()
+                raise
+            finally:
+                # the progress may still be on its way
+                done.wait(self.PROGRESS_TIMEOUT)
+        finally:
+            file.cancellable.disconnect(_cancel)
+            with self._lock:
+                del self._tasks[task_id]
+        if metadata is not None:
+            file.operation_metadata[index] = metadata
+        return rv
+
+    def call(self, func: Callable, *args) -> Any:
+        """Runs func(*args) in one of the processes, and returns its result"""
+        return self._executor.submit(func, *args).result()
+
+
+def process_pool() -> Optional[ProcessPool]:
+    """
+    Returns the process pool of the queue that the current thread
+    is processing files for, or None if there is none.
+    """
+    thread = current_thread()
+    if isinstance(thread, Worker):
+        return thread.pool.queue.process_pool
+    return None
+
+
+def run_cpu_bound(func: Callable, *args) -> Any:
+    """
+    Runs a CPU-bound function, such as a checksum calculation,
+    in the process pool if one is available,
+    or in the current thread otherwise.
+    func and its arguments must be picklable.
+    """
+    pool = process_pool()
+    if pool is None:
+        return func(*args)
+    return pool.call(func, *args)
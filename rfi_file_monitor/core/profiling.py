@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from collections import Counter
+import cProfile
+import logging
+import os
+import pstats
+import re
+import sys
+from threading import Event, Lock, Thread, get_ident
+from typing import Any, Callable, Dict, Final, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OperationProfile:
+    """
+    The profile of one operation, aggregated across all files:
+    the statistics collected by cProfile, and the call stacks
+    that were sampled while the operation was running.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._lock = Lock()
+        self._stats: Optional[pstats.Stats] = None
+        self._stacks: Final[Counter[str]] = Counter()
+        self._ncalls: int = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def ncalls(self) -> int:
+        """The number of files that were profiled"""
+        with self._lock:
+            return self._ncalls
+
+    def _add_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            self._ncalls += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def _add_stack(self, stack: str):
+        with self._lock:
+            self._stacks[stack] += 1
+
+    def dump_stats(self, filename: str) -> bool:
+        """
+        Writes the cProfile statistics, which can be loaded with pstats
+        or visualized with snakeviz. Returns False if there are none.
+        """
+        with self._lock:
+            if self._stats is None:
+                return False
+            self._stats.dump_stats(filename)
+            return True
+
+    def dump_collapsed_stacks(self, filename: str) -> bool:
+        """
+        Writes the sampled stacks in the collapsed format,
+        as expected by flamegraph.pl and speedscope.
+        Returns False if there are none.
+        """
+        with self._lock:
+            if not self._stacks:
+                return False
+            with open(filename, "w") as f:
+                for stack, count in sorted(self._stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            return True
+
+
+def _get_frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """
+    Profiles the operations of a queue that have profiling enabled.
+    Every run of such an operation is wrapped with cProfile,
+    while a thread samples the call stacks of the workers that are running
+    them, which shows where time is spent waiting as well.
+
+    CPU-bound operations that run in a process pool cannot be profiled
+    this way: only the time spent waiting for the pool is recorded.
+    """
+
+    SAMPLE_INTERVAL: Final[float] = 0.01  # seconds
+
+    def __init__(self, operation_names: Sequence[Optional[str]]):
+        # None for the operations that are not profiled
+        self._profiles: Final[List[Optional[OperationProfile]]] = [
+            OperationProfile(name) if name is not None else None
+            for name in operation_names
+        ]
+        self._lock = Lock()
+        # the threads that are running a profiled operation,
+        # along with the frame that called it
+        self._running: Dict[int, Tuple[OperationProfile, Any]] = dict()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def profiles(self) -> List[OperationProfile]:
+        return [profile for profile in self._profiles if profile is not None]
+
+    def is_profiled(self, index: int) -> bool:
+        return (
+            0 <= index < len(self._profiles)
+            and self._profiles[index] is not None
+        )
+
+    def runcall(self, index: int, func: Callable, *args):
+        """Calls func, profiling it as part of the given operation"""
+        profile = self._profiles[index]
+        ident = get_ident()
+        with self._lock:
+            self._running[ident] = (profile, sys._getframe())
+        cprofile = cProfile.Profile()
+        try:
+            cprofile.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            cprofile = None
+        try:
+            return func(*args)
+        finally:
+            if cprofile is not None:
+                cprofile.disable()
+                profile._add_profile(cprofile)
+            with self._lock:
+                del self._running[ident]
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            running = list(self._running.items())
+        for ident, (profile, caller) in running:
+            frame = frames.get(ident)
+            labels: List[str] = list()
+            while frame is not None and frame is not caller:
+                labels.append(_get_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                profile._add_stack(";".join(reversed(labels)))
+
+    def _run(self):
+        while not self._stop.wait(self.SAMPLE_INTERVAL):
+            try:
+                self._sample()
+            except Exception:
+                logger.exception("Could not sample the call stacks")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._run, name="rfi-file-monitor-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def dump(self, directory: str) -> List[str]:
+        """
+        Writes the statistics and the collapsed stacks of every
+        profiled operation to the directory. Returns the filenames.
+        """
+        filenames: List[str] = list()
+        for index, profile in enumerate(self._profiles, start=1):
+            if profile is None:
+                continue
+            slug = re.sub(r"[^a-z0-9]+", "-", profile.name.lower()).strip("-")
+            basename = os.path.join(directory, f"operation-{index}-{slug}")
+            if profile.dump_stats(basename + ".pstats"):
+                filenames.append(basename + ".pstats")
+            if profile.dump_collapsed_stacks(basename + ".collapsed"):
+                filenames.append(basename + ".collapsed")
+        return filenames
@@ -0,0 +1,1368 @@
+from __future__ import annotations
+
+from typing import OrderedDict as OrderedDictType
+from typing import (
+    Final,
+    List,
+    Union,
+    Sequence,
+    Optional,
+    Dict,
+    Set,
+    Tuple,
+    Iterable,
+)
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import RLock, Condition, current_thread
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+from time import time
+
+from ..file import FileStatus, File
+from ..files.directory import Directory
+from ..files.s3_object import S3Object
+from .archive import FileArchive
+from .breaker import CircuitBreaker
+from .completion import CompletionMode, CompletionRules
+from .concurrency import AdaptiveConcurrency
+from .events import QueueObserver
+from .exceptions import AlreadyRunning, NotYetRunning
+from .job import WorkerPool, StagedWorkerPool
+from .journal import Journal, JournalEntry, JournalIndex, get_file_signature
+from .metrics import QueueMetrics, MetricsServer, MetricsWriter
+from .processes import ProcessPool
+from .scheduling import (
+    ReadyQueue,
+    SCHEDULING_POLICIES,
+    FIFOPolicy,
+    OldestDeadlineFirstPolicy,
+)
+from .profiling import Profiler
+from .spill import SpillQueue
+from .tracing import Tracer
+from .utils import ExitableThread
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueSettings:
+    """
+    The parameters of a QueueCore. The names of the fields match
+    those of the options of the GTK QueueManager.
+    """
+
+    created_status_promotion_active: bool = False
+    created_status_promotion_delay: float = 5  # seconds
+    saved_status_promotion_delay: float = 5  # seconds
+    # provided by the engine: files whose rule is not DELAY are promoted
+    # when they are closed or their size and modification time settle,
+    # instead of after saved_status_promotion_delay
+    completion_rules: Optional[CompletionRules] = None
+    max_threads: int = 1
+    # run each operation with its own workers
+    staged_pipeline_active: bool = False
+    staged_pipeline_inbox_size: int = 4
+    # adjust the number of workers to the observed throughput and latency
+    adaptive_concurrency_active: bool = False
+    adaptive_concurrency_min: int = 1
+    adaptive_concurrency_max: int = 32
+    adaptive_concurrency_interval: float = 5  # seconds
+    # producers are paused when the backlog reaches the high-water mark,
+    # until it drops to the low-water mark
+    admission_high_water: int = 50000
+    admission_low_water: int = 10000
+    # producers add their files in batches of this size, or smaller
+    # if the next file takes longer than ADMISSION_BATCH_INTERVAL to find
+    admission_batch_size: int = 1000
+    # instead of pausing producers, keep the files that do not fit
+    # on disk, and add them as the backlog drops to the low-water mark.
+    # A temporary file is used when no path is provided.
+    spill_active: bool = False
+    spill_path: Optional[str] = None
+    # hold back the files of an operation after this many consecutive
+    # connection failures (0 to disable), and probe the endpoint
+    # with a single file at this interval
+    circuit_breaker_threshold: int = 5
+    circuit_breaker_timeout: float = 30  # seconds
+    # run the operations that are CPU_BOUND in separate processes
+    process_pool_active: bool = False
+    process_pool_size: int = os.cpu_count() or 1
+    scheduling_policy: str = FIFOPolicy.NAME
+    remove_from_list_status_promotion_active: bool = True
+    remove_from_list_status_promotion_delay: float = 60  # minutes
+    remove_failed_from_list_active: bool = False
+    archive_max_files: int = 100000
+    archive_max_memory: int = 64  # MB
+    # the journal is only used when a path is provided
+    journal_path: Optional[str] = None
+    journal_fingerprint: str = ""
+    # serve metrics in the Prometheus text format on localhost
+    metrics_http_active: bool = False
+    metrics_http_port: int = 9464
+    # append a snapshot of the metrics to a JSON lines file at this interval,
+    # only used when a path is provided
+    metrics_jsonl_path: Optional[str] = None
+    metrics_jsonl_interval: float = 60  # seconds
+    # record when each file goes through each stage,
+    # keeping the traces of this many processed files
+    tracing_active: bool = False
+    tracing_max_files: int = 10000
+
+    def __post_init__(self):
+        if self.adaptive_concurrency_active and not (
+            1 <= self.adaptive_concurrency_min <= self.adaptive_concurrency_max
+        ):
+            raise ValueError(
+                f"invalid adaptive concurrency limits: minimum {self.adaptive_concurrency_min}, maximum {self.adaptive_concurrency_max}"
+            )
+        if self.admission_low_water >= self.admission_high_water:
+            raise ValueError(
+                f"the admission low-water mark ({self.admission_low_water}) must be lower than the high-water mark ({self.admission_high_water})"
+            )
+
+
+class _DeadlineThread(ExitableThread):
+    """
+    Promotes the files of a QueueCore as soon as their deadline expires.
+    """
+
+    def __init__(self, queue: QueueCore):
+        super().__init__()
+        self.name = "rfi-file-monitor-deadlines"
+        self.daemon = True
+        self._queue = queue
+
+    def run(self):
+        queue = self._queue
+        while not self.should_exit:
+            # releases the lock while it checks files that may still change
+            queue.tick()
+            with queue._deadlines_cond:
+                if self.should_exit:
+                    break
+                wakeup = queue._get_next_wakeup()
+                if wakeup is not None:
+                    timeout = max(wakeup - time(), 0)
+                else:
+                    timeout = None
+                queue._deadlines_cond.wait(timeout)
+
+
+class _SpillThread(ExitableThread):
+    """
+    Moves the files that were spilled to disk back into a QueueCore,
+    whenever it has room for them.
+    """
+
+    # seconds to wait after failing to add the spilled files
+    RETRY_INTERVAL: Final[float] = 1.0
+
+    def __init__(self, queue: QueueCore):
+        super().__init__()
+        self.name = "rfi-file-monitor-spill"
+        self.daemon = True
+        self._queue = queue
+
+    def run(self):
+        queue = self._queue
+        while True:
+            with queue._admission_cond:
+                queue._admission_cond.wait_for(
+                    lambda: self.should_exit
+                    or (not queue._throttled and len(queue._spill) > 0)
+                )
+                if self.should_exit:
+                    break
+            # called without the lock, which it only takes to add the files
+            if not queue._page_in():
+                with queue._admission_cond:
+                    # try again later, rather than in a tight loop
+                    queue._admission_cond.wait(self.RETRY_INTERVAL)
+
+
+# the files that count towards the backlog
+BACKLOG_STATUSES: Final[Tuple[FileStatus, ...]] = (
+    FileStatus.CREATED,
+    FileStatus.SAVED,
+    FileStatus.QUEUED,
+    FileStatus.RUNNING,
+)
+
+
+RESUMED_MESSAGE: Final[str] = "Operation completed in a previous session"
+
+
+class QueueCore(QueueObserver):
+    """
+    Keeps track of the files that have been detected by an engine, promotes
+    them through the CREATED, SAVED and QUEUED stages, and runs the operations
+    on them using a pool of workers. This class does not depend on GTK:
+    observers can be registered to follow what happens to the files.
+
+    The operations can be any objects with a NAME attribute and a run(file)
+    method that returns None on success, or an error message on failure.
+    """
+
+    # how often producers that wait for admission check if they should exit
+    ADMISSION_POLL_INTERVAL: Final[float] = 1.0
+    ADMISSION_BATCH_INTERVAL: Final[float] = 1.0  # seconds
+
+    def __init__(
+        self,
+        operations: Sequence,
+        settings: Optional[QueueSettings] = None,
+    ):
+        self._operations: Final[List] = list(operations)
+        self._settings = settings if settings is not None else QueueSettings()
+        self._observers: Final[List[QueueObserver]] = list()
+        self._running = False
+        self._lock = RLock()
+        self._deadlines_cond = Condition(self._lock)
+        self._admission_cond = Condition(self._lock)
+        self._throttled = False
+        self._spill: Optional[SpillQueue] = None
+        self._spill_thread: Optional[_SpillThread] = None
+        self._files_dict: OrderedDictType[str, File] = OrderedDict()
+        self._ready_queue: Optional[ReadyQueue] = None
+        self._worker_pool: Optional[WorkerPool] = None
+        self._deadline_thread: Optional[_DeadlineThread] = None
+        self._journal: Optional[Journal] = None
+        self._concurrency: Optional[AdaptiveConcurrency] = None
+        self._process_pool: Optional[ProcessPool] = None
+        self._metrics: Optional[QueueMetrics] = None
+        self._metrics_server: Optional[MetricsServer] = None
+        self._metrics_writer: Optional[MetricsWriter] = None
+        self._tracer: Optional[Tracer] = None
+        self._profiler: Optional[Profiler] = None
+        # one per operation
+        self._circuit_breakers: List[CircuitBreaker] = list()
+        # files that were removed from the list, as well as those that
+        # the journal reported as processed already.
+        # They are added again when they are saved.
+        self._archive: Optional[FileArchive] = None
+
+        # filenames per status, which double as status counters
+        self._status_index: Final[Dict[FileStatus, Set[str]]] = {
+            status: set() for status in FileStatus
+        }
+        # min-heap of (deadline, counter, filename) for timed promotions.
+        # _deadlines holds the currently valid deadline of each file,
+        # heap entries that don't match it are stale and will be skipped.
+        self._deadlines_heap: Final[List[Tuple[float, int, str]]] = list()
+        self._deadlines: Final[Dict[str, float]] = dict()
+        self._deadlines_counter = itertools.count()
+        # the signatures of the SAVED files whose completion is detected
+        # by checking if they remain unchanged
+        self._stability_signatures: Final[Dict[str, Optional[str]]] = dict()
+
+    @property
+    def operations(self) -> List:
+        return self._operations
+
+    @property
+    def settings(self) -> QueueSettings:
+        return self._settings
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def journal(self) -> Optional[Journal]:
+        return self._journal
+
+    @property
+    def concurrency(self) -> Optional[AdaptiveConcurrency]:
+        """The controller of the number of workers, if active"""
+        return self._concurrency
+
+    @property
+    def process_pool(self) -> Optional[ProcessPool]:
+        """The pool that runs the CPU-bound operations, if active"""
+        return self._process_pool
+
+    @property
+    def metrics(self) -> Optional[QueueMetrics]:
+        """The metrics of the queue, if they are exported"""
+        return self._metrics
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        """
+        The traces of the files, if tracing is active.
+        These remain available after the queue has been stopped.
+        """
+        return self._tracer
+
+    @property
+    def profiler(self) -> Optional[Profiler]:
+        """
+        The profiles of the operations whose profile attribute is True,
+        if any. These remain available after the queue has been stopped.
+        """
+        return self._profiler
+
+    @property
+    def circuit_breakers(self) -> List[CircuitBreaker]:
+        """
+        The circuit breakers of the operations, in the same order.
+        Their properties may be read from any thread.
+        """
+        return self._circuit_breakers
+
+    @property
+    def njobs_running(self) -> int:
+        if self._worker_pool is None:
+            return 0
+        return self._worker_pool.njobs_running
+
+    @property
+    def nworkers(self) -> int:
+        if self._worker_pool is None:
+            return 0
+        return self._worker_pool.nworkers
+
+    def add_observer(self, observer: QueueObserver):
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: QueueObserver):
+        self._observers.remove(observer)
+
+    def _notify(self, event: str, *args):
+        for observer in self._observers:
+            try:
+                getattr(observer, event)(*args)
+            except Exception:
+                logger.exception(f"{event}: exception in {observer}")
+
+    def get_status_counts(self) -> Dict[FileStatus, int]:
+        """The number of files per status. Archived files are not included."""
+        with self._lock:
+            return {
+                status: len(filenames)
+                for status, filenames in self._status_index.items()
+            }
+
+    @property
+    def backlog(self) -> int:
+        """The number of files that have not been processed yet"""
+        with self._lock:
+            return sum(
+                len(self._status_index[status]) for status in BACKLOG_STATUSES
+            )
+
+    @property
+    def throttled(self) -> bool:
+        """
+        True while the backlog is too large to accept new files.
+        Producers that cannot block may poll this instead of using admit.
+        """
+        with self._lock:
+            return self._throttled
+
+    @property
+    def nspilled(self) -> int:
+        """The number of files that are waiting on disk to be added"""
+        spill = self._spill
+        return len(spill) if spill is not None else 0
+
+    def _update_admission(self):
+        """
+        Pauses the producers when the backlog has reached the high-water
+        mark, and resumes them once it has dropped to the low-water mark.
+        Must be called with the lock held.
+        """
+        backlog = sum(
+            len(self._status_index[status]) for status in BACKLOG_STATUSES
+        )
+        if self._throttled:
+            if backlog <= self._settings.admission_low_water:
+                logger.info(f"Backlog down to {backlog} files: resuming")
+                self._throttled = False
+                self._admission_cond.notify_all()
+        elif backlog >= self._settings.admission_high_water:
+            logger.info(f"Backlog up to {backlog} files: pausing producers")
+            self._throttled = True
+
+    def wait_for_admission(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks while the queue is throttled. Returns True if new files
+        may be added, or False if the timeout expired first,
+        or the queue was stopped.
+        """
+        with self._lock:
+            self._admission_cond.wait_for(
+                lambda: not self._throttled or not self._running, timeout
+            )
+            return self._running and not self._throttled
+
+    def admit(
+        self,
+        files: Iterable[File],
+        batch_size: Optional[int] = None,
+    ) -> bool:
+        """
+        Adds files to the queue in batches, waiting for admission
+        before each batch. This is meant for producers that run in their own
+        thread, such as engines that scan for existing files. files may be
+        a generator, in which case no more files are generated than
+        the queue has room for, and files are added while it is running:
+        a batch is added when it is full, or when it was started more than
+        ADMISSION_BATCH_INTERVAL ago, so that slow producers do not hold
+        back the first files. Returns False if not all files were added,
+        because the queue was stopped, or the calling thread should exit.
+
+        If spilling is active, batches that do not fit are written to disk
+        instead, and this method does not wait.
+
+        If the journal is active, files that were processed successfully
+        in a previous session and have not changed since are archived
+        right away, without being added to the queue, and without
+        holding the lock of the queue while looking them up.
+        """
+        if batch_size is None:
+            batch_size = self._settings.admission_batch_size
+        index = self._open_journal_index()
+        batch: List[File] = list()
+        batch_started = time()
+        try:
+            for _file in itertools.chain(files, (None,)):
+                if batch and (
+                    _file is None
+                    or time() - batch_started >= self.ADMISSION_BATCH_INTERVAL
+                ):
+                    if not self._admit_batch(batch, index):
+                        return False
+                    batch = list()
+                if _file is None:
+                    break
+                if not batch:
+                    batch_started = time()
+                batch.append(_file)
+                if len(batch) >= batch_size:
+                    if not self._admit_batch(batch, index):
+                        return False
+                    batch = list()
+        finally:
+            if index is not None:
+                index.close()
+        return True
+
+    def _open_journal_index(self) -> Optional[JournalIndex]:
+        journal = self._journal
+        if journal is None:
+            return None
+        try:
+            return journal.open_index()
+        except sqlite3.Error:
+            logger.exception(f"Could not open journal {journal.path}")
+            return None
+
+    def _archive_processed(self, files: List[File]) -> List[File]:
+        """
+        Archives files that were processed in a previous session,
+        so that they are added again when they are saved.
+        Returns the files that are in the queue already,
+        which should be added as usual.
+        """
+        known: List[File] = list()
+        with self._lock:
+            if not self._running:
+                return known
+            for _file in files:
+                if _file.filename in self._files_dict:
+                    known.append(_file)
+                else:
+                    self._archive.add(_file)
+        logger.info(
+            f"Skipped {len(files) - len(known)} files that were processed already in a previous session"
+        )
+        return known
+
+    def _admit_batch(
+        self, batch: List[File], index: Optional[JournalIndex] = None
+    ) -> bool:
+        # None when the files still need to be looked up by add
+        journal_entries: Optional[Dict[str, JournalEntry]] = None
+        if index is not None:
+            try:
+                batch, processed, journal_entries = index.split(batch)
+            except sqlite3.Error:
+                logger.exception("Could not look up files in the journal")
+            else:
+                if processed:
+                    batch.extend(self._archive_processed(processed))
+                if not batch:
+                    return True
+        if self._spill_batch(batch):
+            return True
+        thread = current_thread()
+        while not self.wait_for_admission(self.ADMISSION_POLL_INTERVAL):
+            if not self._running or (
+                isinstance(thread, ExitableThread) and thread.should_exit
+            ):
+                return False
+        try:
+            self._add(batch, journal_entries)
+        except NotYetRunning:
+            # stopped after the batch was admitted
+            return False
+        return True
+
+    def _spill_batch(self, batch: List[File]) -> bool:
+        """
+        Writes a batch to disk if the queue is throttled, or if other files
+        are waiting on disk already, which keeps the files in order.
+        Returns False if the batch should be added as usual.
+        """
+        with self._lock:
+            if self._spill is None or not (
+                self._throttled or len(self._spill) > 0
+            ):
+                return False
+            self._spill.push(batch)
+            self._admission_cond.notify_all()
+            return True
+
+    def _page_in(self) -> bool:
+        """
+        Adds the files that are waiting on disk, up to the high-water mark.
+        The files are only removed from disk once they have been added.
+        Returns False if they could not be added.
+        Must be called without the lock, which is only held while the files
+        are inserted, as reading and preparing them may take long.
+        """
+        with self._lock:
+            spill = self._spill
+            if spill is None:
+                return True
+            room = self._settings.admission_high_water - self.backlog
+        try:
+            files = spill.peek(
+                max(min(room, self._settings.admission_batch_size), 1)
+            )
+            logger.debug(f"Adding {len(files)} files that were spilled to disk")
+            self._add(files)
+        except Exception:
+            if not self._running:
+                # stopped in the meantime, which discards the spilled files
+                return True
+            logger.exception(
+                "Could not add the files that were spilled to disk"
+            )
+            return False
+        with self._lock:
+            # the files that were spilled in the meantime come after these
+            if self._spill is spill:
+                spill.discard(len(files))
+        return True
+
+    @property
+    def narchived(self) -> int:
+        with self._lock:
+            return len(self._archive) if self._archive is not None else 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._files_dict)
+
+    def __contains__(self, filename: str) -> bool:
+        with self._lock:
+            return filename in self._files_dict
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        with self._lock:
+            if self._files_dict.get(file.filename) is not file:
+                return
+            self._status_index[old_status].discard(file.filename)
+            self._status_index[new_status].add(file.filename)
+            if self._journal is not None:
+                self._journal.record_status(file)
+            self._notify("file_status_changed", file, old_status, new_status)
+            self._schedule(file)
+            self._update_admission()
+
+    def operation_status_changed(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        self._notify("operation_status_changed", file, index, status, message)
+
+    def operation_progress_changed(self, file: File, index: int, value: float):
+        self._notify("operation_progress_changed", file, index, value)
+
+    def _schedule(self, file: File):
+        """
+        Works out what should happen next with a file, based on its current status.
+        Files that need to be promoted after a delay get a deadline,
+        queued files are appended to the ready queue, and finished files
+        that have been saved again in the meantime are requeued.
+        Must be called with the lock held.
+        """
+        filename = file.filename
+        deadline: Optional[float] = None
+
+        if file.status == FileStatus.CREATED:
+            if self._settings.created_status_promotion_active:
+                deadline = (
+                    file.created + self._settings.created_status_promotion_delay
+                )
+        elif file.status == FileStatus.SAVED:
+            if file.requeue:
+                # saved again while running, after which the job
+                # was cancelled, or will retry an operation
+                file.requeue = False
+                file.saved = time()
+                file.cancellable.reset()
+                self._discard_resume(file)
+                self._stability_signatures.pop(filename, None)
+                self._notify("file_requeued", file)
+            if self._get_completion_mode(file) == CompletionMode.DELAY:
+                delay = self._settings.saved_status_promotion_delay
+            elif filename in self._stability_signatures:
+                delay = self._settings.completion_rules.stability_interval
+            else:
+                # due right away: the deadline thread takes the signature
+                # that is compared with the one at the actual deadline
+                delay = 0
+            deadline = max(file.saved + delay, file.retry_at)
+        elif file.status == FileStatus.QUEUED:
+            breaker = self._get_circuit_breaker(file.resume_index)
+            if breaker is not None and not breaker.allow(file):
+                logger.info(
+                    f"Holding back {filename}: {self._operations[file.resume_index].NAME} is unavailable"
+                )
+                breaker.hold(file)
+                # wakes up the deadline thread, which sends the probes
+                self._deadlines_cond.notify()
+            else:
+                self._ready_queue.put(file)
+        elif file.status in (FileStatus.SUCCESS, FileStatus.FAILURE):
+            if file.requeue:
+                # this will schedule the file again
+                self._requeue(file)
+                return
+            elif self._settings.remove_from_list_status_promotion_active:
+                delay = (
+                    60 * self._settings.remove_from_list_status_promotion_delay
+                )
+                if file.status == FileStatus.SUCCESS:
+                    deadline = file.succeeded + delay
+                elif self._settings.remove_failed_from_list_active:
+                    deadline = file.failed + delay
+
+        if deadline is None:
+            # any previously set deadline is now obsolete
+            self._deadlines.pop(filename, None)
+        elif self._deadlines.get(filename) != deadline:
+            self._deadlines[filename] = deadline
+            # entries whose deadline no longer matches are skipped when popped
+            heapq.heappush(
+                self._deadlines_heap,
+                (deadline, next(self._deadlines_counter), filename),
+            )
+            self._deadlines_cond.notify()
+
+    def _get_circuit_breaker(self, index: int) -> Optional[CircuitBreaker]:
+        if index < len(self._circuit_breakers):
+            return self._circuit_breakers[index]
+        return None
+
+    def allow_operation(self, file: File, index: int) -> bool:
+        """
+        Returns False if the circuit breaker of the operation is open,
+        in which case the job should return the file to the queue as QUEUED.
+        """
+        with self._lock:
+            breaker = self._get_circuit_breaker(index)
+            return breaker is None or breaker.allow(file)
+
+    def record_operation(self, file: File, index: int, unavailable: bool):
+        """
+        Called by the jobs after running an operation on a file.
+        unavailable should be True if the operation could not connect.
+        """
+        with self._lock:
+            breaker = self._get_circuit_breaker(index)
+            if breaker is None or not self._running:
+                return
+            breaker.record(file, unavailable)
+            if breaker.nheld:
+                for _file in breaker.release():
+                    self._ready_queue.put(_file)
+                self._deadlines_cond.notify()
+
+    def _get_next_wakeup(self) -> Optional[float]:
+        """
+        Returns when the earliest deadline expires, or when the next probe
+        should be sent. Must be called with the lock held.
+        """
+        wakeups = [
+            breaker.probe_at
+            for breaker in self._circuit_breakers
+            if breaker.nheld and breaker.probe_at is not None
+        ]
+        if self._deadlines_heap:
+            wakeups.append(self._deadlines_heap[0][0])
+        return min(wakeups, default=None)
+
+    def add(self, file_or_files: Union[File, Sequence[File]]):
+        """Add one or more new files to the queue."""
+
+        if isinstance(file_or_files, File):
+            self._add([file_or_files])
+        else:
+            self._add(list(file_or_files))
+
+    def _add(
+        self,
+        file_paths: List[File],
+        journal_entries: Optional[Dict[str, JournalEntry]] = None,
+    ):
+        # the journal entries are looked up here if not provided,
+        # as when the files were split by a JournalIndex already.
+        # This happens before taking the lock, like checking the files
+        # that have an entry, as both may take long on network filesystems
+        if journal_entries is None:
+            journal_entries = self._lookup_journal(file_paths)
+        signatures = {
+            _file.filename: get_file_signature(_file)
+            for _file in file_paths
+            if isinstance(_file, File) and _file.filename in journal_entries
+        }
+
+        with self._lock:
+            # checked with the lock held, as the queue may be stopped
+            # from another thread
+            if not self._running:
+                raise NotYetRunning(
+                    "The queue needs to be started before files can be added."
+                )
+
+            for _file in file_paths:
+                if not isinstance(_file, File):
+                    raise TypeError(f"{str(_file)} must be a File object")
+
+                file_path = _file.filename
+
+                if file_path in self._files_dict:
+                    logger.info(
+                        f"{file_path} has been recreated! Calling saved..."
+                    )
+                    self.saved(file_path)
+                    continue
+
+                # a new file object supersedes the archived one
+                self._archive.pop(file_path)
+
+                if file_path in journal_entries and not self._resume(
+                    _file, journal_entries[file_path], signatures[file_path]
+                ):
+                    continue
+
+                if _file.status == FileStatus.CREATED:
+                    logger.info(f"New file {file_path} created")
+                elif _file.status == FileStatus.SAVED:
+                    logger.info(f"Adding existing file {file_path}")
+                    _file.saved = time()
+                else:
+                    raise NotImplementedError(
+                        "Newly created files must have CREATED or SAVED as status!"
+                    )
+
+                self._files_dict[file_path] = _file
+                self._status_index[_file.status].add(file_path)
+                _file.observer = self
+                if self._journal is not None:
+                    self._journal.record_status(_file)
+                self._notify("file_added", _file)
+                for index in range(_file.resume_index):
+                    # restored from the journal, along with its metadata
+                    _file.update_status(
+                        index, FileStatus.SKIPPED, RESUMED_MESSAGE
+                    )
+                self._schedule(_file)
+            self._update_admission()
+
+    def _lookup_journal(self, files: List[File]) -> Dict[str, JournalEntry]:
+        """
+        Returns the journal entries of the files that are not listed yet.
+        Called without the lock: the files that are listed already are only
+        skipped to save work, as they are never resumed.
+        """
+        journal = self._journal
+        if journal is None:
+            return dict()
+        try:
+            return journal.lookup(
+                [
+                    _file.filename
+                    for _file in files
+                    if isinstance(_file, File)
+                    and _file.filename not in self._files_dict
+                ]
+            )
+        except sqlite3.Error:
+            logger.exception(
+                "Could not look up files in the journal. Adding them without..."
+            )
+            return dict()
+
+    def _resume(
+        self, file: File, entry: JournalEntry, signature: Optional[str]
+    ) -> bool:
+        """
+        Prepares a file that has an entry in the journal, given its current
+        signature, which should be obtained without holding the lock.
+        Returns False if the file has been processed successfully already,
+        and should therefore not be added.
+        Must be called with the lock held.
+        """
+        if signature is None or signature != entry.signature:
+            # the file has changed since it was last processed
+            return True
+
+        if entry.succeeded:
+            logger.info(
+                f"{file.filename} has been processed already in a previous session"
+            )
+            self._archive.add(file)
+            return False
+
+        # restore the metadata of the operations that completed
+        for index in range(len(self._operations)):
+            try:
+                status, metadata = entry.operations[index]
+            except KeyError:
+                break
+            if status not in (FileStatus.SUCCESS, FileStatus.SKIPPED):
+                break
+            if metadata is not None:
+                file.operation_metadata[index] = metadata
+            file.resume_index = index + 1
+
+        if file.resume_index:
+            logger.info(
+                f"Resuming {file.filename} from operation {file.resume_index}"
+            )
+        return True
+
+    def saved(self, file_path: Union[str, Sequence[str]]):
+        """Call when the engine detected that the file(s) have been saved (again)."""
+
+        if not self._running:
+            raise NotYetRunning(
+                "The queue needs to be started before files can be saved."
+            )
+
+        if isinstance(file_path, str):
+            file_paths = [file_path]
+        else:
+            file_paths = list(file_path)
+
+        with self._lock:
+            for file_path in file_paths:
+                archived_file = self._archive.pop(file_path)
+                if archived_file is not None:
+                    # file has been removed from the list already: add it back
+                    logger.info(
+                        f"File {file_path} was removed from list but is now back!"
+                    )
+                    # it has changed since it was processed, so the journal
+                    # is not consulted, which would happen with the lock held
+                    self._add(
+                        [archived_file.restore(file_path, FileStatus.SAVED)],
+                        dict(),
+                    )
+                    continue
+                try:
+                    file = self._files_dict[file_path]
+                except KeyError:
+                    logger.warning(
+                        f"{file_path} has not been created yet! Ignoring..."
+                    )
+                    continue
+
+                # the size may have changed
+                file.size_hint = None
+
+                if file.status == FileStatus.SAVED:
+                    # looks like this file has been saved again!
+                    # update saved timestamp
+                    logger.info(f"File {file_path} has been saved again")
+                    file.saved = time()
+                    self._discard_resume(file)
+                    self._schedule(file)
+                elif file.status == FileStatus.CREATED:
+                    logger.info(f"File {file_path} has been saved")
+                    file.saved = time()
+                    self._discard_resume(file)
+                    file.status = FileStatus.SAVED
+                elif file.status == FileStatus.QUEUED:
+                    breaker = self._get_circuit_breaker(file.resume_index)
+                    if self._ready_queue.remove(file) or (
+                        breaker is not None and breaker.unhold(file)
+                    ):
+                        # file hasn't been processed yet, so it's safe to demote it to SAVED
+                        logger.info(
+                            f"File {file_path} has been saved again while queued"
+                        )
+                        file.saved = time()
+                        self._discard_resume(file)
+                        file.status = FileStatus.SAVED
+                    else:
+                        # a worker picked it up already, but its status hasn't been updated yet
+                        logger.info(
+                            f"File {file_path} has been saved again while starting to run"
+                        )
+                        file.requeue = True
+                        file.cancellable.cancel("The file has been saved again")
+                elif file.status in (
+                    FileStatus.RUNNING,
+                    FileStatus.SUCCESS,
+                    FileStatus.FAILURE,
+                ):
+                    # file is currently being processed or has been processed -> mark it for being requeued
+                    logger.info(
+                        f"File {file_path} has been saved again while {str(file.status)}"
+                    )
+                    file.requeue = True
+                    if file.status == FileStatus.RUNNING:
+                        # abort processing the previous contents
+                        file.cancellable.cancel("The file has been saved again")
+                    self._schedule(file)
+                else:
+                    logger.info(
+                        f"File {file_path} has been saved again after it was queued for processing!!"
+                    )
+
+    def completed(self, file_path: Union[str, Sequence[str]]):
+        """
+        Call when the engine detected that the file(s) have been written
+        completely, because their writer closed them. Files whose completion
+        rule is CLOSE are queued right away, without waiting for
+        the promotion delays. Otherwise, this is the same as saved.
+        """
+
+        if not self._running:
+            raise NotYetRunning(
+                "The queue needs to be started before files can be completed."
+            )
+
+        if isinstance(file_path, str):
+            file_paths = [file_path]
+        else:
+            file_paths = list(file_path)
+
+        with self._lock:
+            self.saved(file_paths)
+            now = time()
+            for file_path in file_paths:
+                file = self._files_dict.get(file_path)
+                if (
+                    file is None
+                    or file.status != FileStatus.SAVED
+                    or file.requeue
+                    or file.retry_at > now
+                    or self._get_completion_mode(file) != CompletionMode.CLOSE
+                ):
+                    continue
+                logger.info(f"File {file_path} has been closed")
+                self._stability_signatures.pop(file_path, None)
+                file.status = FileStatus.QUEUED
+
+    def deleted(self, file_path: Union[str, Sequence[str]]):
+        """
+        Call when the engine detected that the file(s) have been deleted.
+        Files that are still waiting to be processed fail immediately,
+        and the processing of files that are running is cancelled.
+        """
+
+        if not self._running:
+            raise NotYetRunning(
+                "The queue needs to be started before files can be deleted."
+            )
+
+        if isinstance(file_path, str):
+            file_paths = [file_path]
+        else:
+            file_paths = list(file_path)
+
+        with self._lock:
+            for file_path in file_paths:
+                self._archive.pop(file_path)
+                file = self._files_dict.get(file_path)
+                if file is None or file.status in (
+                    FileStatus.SUCCESS,
+                    FileStatus.FAILURE,
+                ):
+                    continue
+                logger.info(f"File {file_path} has been deleted")
+                file.requeue = False
+                file.cancellable.cancel("The file has been deleted")
+                if file.status == FileStatus.RUNNING:
+                    # the job will fail
+                    continue
+                elif file.status == FileStatus.QUEUED:
+                    breaker = self._get_circuit_breaker(file.resume_index)
+                    if not self._ready_queue.remove(file) and not (
+                        breaker is not None and breaker.unhold(file)
+                    ):
+                        # a worker picked it up already
+                        continue
+                file.failed = time()
+                file.update_status(
+                    -1, FileStatus.FAILURE, "The file has been deleted"
+                )
+
+    def _discard_resume(self, file: File):
+        # the contents have changed, so the pipeline needs to start over
+        file.attempts = 0
+        file.retry_at = 0
+        if file.resume_index:
+            file.resume_index = 0
+            file.operation_metadata.clear()
+            if self._journal is not None:
+                self._journal.record_status(file)
+
+    def start(self):
+        if self._running:
+            raise AlreadyRunning(
+                "The queue is already running. It needs to be stopped before it may be restarted"
+            )
+
+        self._archive = FileArchive(
+            int(self._settings.archive_max_files),
+            int(self._settings.archive_max_memory) * 1024 * 1024,
+        )
+        if self._settings.journal_path:
+            self._journal = Journal(
+                self._settings.journal_path, self._settings.journal_fingerprint
+            )
+            try:
+                self._journal.open()
+            except Exception:
+                logger.exception(
+                    f"Could not open journal {self._journal.path}. Continuing without..."
+                )
+                self._journal = None
+        if self._settings.spill_active:
+            self._spill = SpillQueue(self._settings.spill_path)
+            try:
+                self._spill.open()
+            except Exception:
+                logger.exception(
+                    "Could not open the spill queue. Continuing without..."
+                )
+                self._spill = None
+        if self._settings.process_pool_active:
+            self._process_pool = ProcessPool(
+                int(self._settings.process_pool_size)
+            )
+            self._process_pool.start()
+        policy_class = SCHEDULING_POLICIES.get(
+            self._settings.scheduling_policy, FIFOPolicy
+        )
+        if policy_class is OldestDeadlineFirstPolicy:
+            policy = OldestDeadlineFirstPolicy(
+                self._settings.saved_status_promotion_delay
+            )
+        else:
+            policy = policy_class()
+        self._ready_queue = ReadyQueue(policy)
+        self._circuit_breakers = [
+            CircuitBreaker(
+                operation.NAME,
+                int(self._settings.circuit_breaker_threshold),
+                self._settings.circuit_breaker_timeout,
+            )
+            for operation in self._operations
+        ]
+        if self._settings.staged_pipeline_active and len(self._operations) > 1:
+            self._worker_pool = StagedWorkerPool(
+                self,
+                self._ready_queue,
+                int(self._settings.max_threads),
+                int(self._settings.staged_pipeline_inbox_size),
+            )
+        else:
+            self._worker_pool = WorkerPool(
+                self, self._ready_queue, int(self._settings.max_threads)
+            )
+        if self._settings.adaptive_concurrency_active:
+            self._concurrency = AdaptiveConcurrency(
+                self._worker_pool,
+                int(self._settings.adaptive_concurrency_min),
+                int(self._settings.adaptive_concurrency_max),
+                self._settings.adaptive_concurrency_interval,
+            )
+            self.add_observer(self._concurrency)
+        if (
+            self._settings.metrics_http_active
+            or self._settings.metrics_jsonl_path
+        ):
+            self._start_metrics()
+        if self._settings.tracing_active:
+            self._tracer = Tracer(
+                [operation.NAME for operation in self._operations],
+                int(self._settings.tracing_max_files),
+            )
+            self.add_observer(self._tracer)
+        else:
+            self._tracer = None
+        if any(
+            getattr(operation, "profile", False)
+            for operation in self._operations
+        ):
+            self._profiler = Profiler(
+                [
+                    operation.NAME
+                    if getattr(operation, "profile", False)
+                    else None
+                    for operation in self._operations
+                ]
+            )
+            self._profiler.start()
+        else:
+            self._profiler = None
+        self._worker_pool.start()
+        if self._concurrency is not None:
+            self._concurrency.start()
+        self._deadline_thread = _DeadlineThread(self)
+        self._running = True
+        self._deadline_thread.start()
+        if self._spill is not None:
+            self._spill_thread = _SpillThread(self)
+            self._spill_thread.start()
+
+    def stop(self):
+        """
+        Stops the queue without blocking. Jobs that are still running
+        will skip their remaining operations.
+        """
+        if not self._running:
+            raise NotYetRunning(
+                "The queue needs to be started before it can be stopped."
+            )
+
+        if self._metrics is not None:
+            # the final snapshot includes the files that are still listed
+            self._stop_metrics()
+        with self._lock:
+            self._running = False
+            self._deadline_thread.should_exit = True
+            self._deadlines_cond.notify()
+            self._deadline_thread = None
+            for _file in self._files_dict.values():
+                _file.observer = None
+            self._files_dict.clear()
+            for _filenames in self._status_index.values():
+                _filenames.clear()
+            self._deadlines.clear()
+            self._stability_signatures.clear()
+            self._deadlines_heap.clear()
+            for breaker in self._circuit_breakers:
+                breaker.clear()
+            self._archive = None
+            self._throttled = False
+            if self._spill_thread is not None:
+                self._spill_thread.should_exit = True
+                self._spill_thread = None
+            spill, self._spill = self._spill, None
+            self._admission_cond.notify_all()
+        if self._concurrency is not None:
+            self._concurrency.stop()
+            self.remove_observer(self._concurrency)
+            self._concurrency = None
+        if self._tracer is not None:
+            self.remove_observer(self._tracer)
+        if self._profiler is not None:
+            self._profiler.stop()
+        # running jobs will finish early, after which their workers exit
+        self._worker_pool.stop()
+        self._worker_pool = None
+        self._ready_queue = None
+        if self._process_pool is not None:
+            self._process_pool.stop()
+            self._process_pool = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if spill is not None:
+            # the files that were not added yet are lost
+            spill.close()
+
+    def _start_metrics(self):
+        self._metrics = QueueMetrics(self)
+        self.add_observer(self._metrics)
+        if self._settings.metrics_http_active:
+            self._metrics_server = MetricsServer(
+                self._metrics, int(self._settings.metrics_http_port)
+            )
+            try:
+                self._metrics_server.start()
+            except OSError:
+                # the queue can do without
+                logger.exception(
+                    f"Could not serve metrics on port {self._settings.metrics_http_port}"
+                )
+                self._metrics_server = None
+        if self._settings.metrics_jsonl_path:
+            self._metrics_writer = MetricsWriter(
+                self._metrics,
+                self._settings.metrics_jsonl_path,
+                self._settings.metrics_jsonl_interval,
+            )
+            self._metrics_writer.start()
+
+    def _stop_metrics(self):
+        if self._metrics_writer is not None:
+            # writes the final snapshot
+            self._metrics_writer.stop()
+            self._metrics_writer.join()
+            self._metrics_writer = None
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+        self.remove_observer(self._metrics)
+        self._metrics = None
+
+    def _promote(self, _filename: str, _file: File, now: float):
+        if _file.status == FileStatus.CREATED:
+            # promote to SAVED!
+            logger.info(f"Promoting {_filename} to SAVED")
+            _file.saved = now
+            _file.status = FileStatus.SAVED
+        elif _file.status == FileStatus.SAVED:
+            # queue the job
+            logger.info(f"Adding {_filename} to queue for future processing")
+            _file.status = FileStatus.QUEUED
+        elif _file.status in (FileStatus.SUCCESS, FileStatus.FAILURE):
+            _file.status = FileStatus.REMOVED_FROM_LIST
+            self._archive_file(_filename, _file)
+
+    def _get_completion_mode(self, file: File) -> CompletionMode:
+        rules = self._settings.completion_rules
+        if rules is None:
+            return CompletionMode.DELAY
+        return rules.get_mode(file.filename)
+
+    def _needs_signature(self, _file: File) -> bool:
+        # SAVED files that are waiting to become stable
+        return (
+            _file.status == FileStatus.SAVED
+            and self._get_completion_mode(_file) != CompletionMode.DELAY
+        )
+
+    def _is_stable(
+        self, _filename: str, _file: File, signature: Optional[str], now: float
+    ) -> bool:
+        """
+        Checks if a SAVED file that is waiting to become stable has changed
+        since its previous deadline, given its current signature, which is
+        obtained without holding the lock. The first signature is only
+        recorded. If the file has changed, or could not be checked,
+        the deadline is postponed.
+        Must be called with the lock held.
+        """
+        if _filename not in self._stability_signatures:
+            self._stability_signatures[_filename] = signature
+            self._schedule(_file)
+            return False
+        if signature is None and isinstance(_file, (S3Object, Directory)):
+            # these never have a signature, as they cannot be checked cheaply
+            del self._stability_signatures[_filename]
+            return True
+        if (
+            signature is not None
+            and signature == self._stability_signatures[_filename]
+        ):
+            del self._stability_signatures[_filename]
+            return True
+        if signature is None:
+            # possibly replaced, or deleted, which the engine will report
+            logger.debug(f"{_filename} could not be checked")
+        else:
+            logger.debug(f"{_filename} is still being written")
+        self._stability_signatures[_filename] = signature
+        _file.saved = now
+        self._schedule(_file)
+        return False
+
+    def _archive_file(self, _filename: str, _file: File):
+        """
+        Replace a file that was removed from the list with a compact record.
+        Must be called with the lock held.
+        """
+        del self._files_dict[_filename]
+        self._status_index[_file.status].discard(_filename)
+        self._deadlines.pop(_filename, None)
+        self._stability_signatures.pop(_filename, None)
+        _file.observer = None
+        self._archive.add(_file)
+
+    def _requeue(self, _file: File):
+        # demote to saved so it gets requeued
+        _file.requeue = False
+        _file.saved = time()
+        _file.succeeded = 0
+        _file.failed = 0
+        _file.resume_index = 0
+        _file.attempts = 0
+        _file.retry_at = 0
+        _file.operation_metadata.clear()
+        _file.cancellable.reset()
+        logger.info(f"Requeuing {_file.filename}")
+        self._notify("file_requeued", _file)
+        _file.status = FileStatus.SAVED
+
+    def tick(self, now: Optional[float] = None):
+        """
+        Promotes all files whose deadline has expired.
+        This is called automatically while the queue is running,
+        but may be called with a timestamp in the future to move time forward.
+        Files that are waiting to become stable are checked without
+        holding the lock, as this may take long on network filesystems.
+        """
+        if now is None:
+            now = time()
+        unchecked: List[Tuple[str, File]] = list()
+        with self._lock:
+            while self._deadlines_heap and self._deadlines_heap[0][0] <= now:
+                deadline, _, _filename = heapq.heappop(self._deadlines_heap)
+                if self._deadlines.get(_filename) != deadline:
+                    # stale entry
+                    continue
+                del self._deadlines[_filename]
+                _file = self._files_dict[_filename]
+                if self._needs_signature(_file):
+                    unchecked.append((_filename, _file))
+                else:
+                    self._promote(_filename, _file, now)
+            for breaker in self._circuit_breakers:
+                for _file in breaker.release(now):
+                    self._ready_queue.put(_file)
+        if not unchecked:
+            return
+        signatures = [get_file_signature(_file) for _, _file in unchecked]
+        with self._lock:
+            for (_filename, _file), signature in zip(unchecked, signatures):
+                if (
+                    self._files_dict.get(_filename) is not _file
+                    or _filename in self._deadlines
+                    or not self._needs_signature(_file)
+                ):
+                    # saved again or removed in the meantime
+                    continue
+                if self._is_stable(_filename, _file, signature, now):
+                    self._promote(_filename, _file, now)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How often the queue retries an operation that failed,
+    and how long it waits before each retry. The delays grow exponentially.
+
+    Operations opt in by setting their RETRY_POLICY attribute.
+    While a file waits for its next attempt, it is not held by a worker,
+    which remains available for other files.
+    """
+
+    # the total number of attempts, including the first one
+    max_attempts: int = 5
+    initial_delay: float = 1.0  # seconds
+    multiplier: float = 2.0
+    max_delay: float = 300.0  # seconds
+
+    def get_delay(self, attempt: int) -> Optional[float]:
+        """
+        Returns how long to wait after the given attempt failed,
+        counting from 1, or None if no attempts are left.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        return min(
+            self.initial_delay * self.multiplier ** (attempt - 1),
+            self.max_delay,
+        )
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import platform
+import queue
+from threading import Event, Lock
+from time import monotonic
+from typing import Final, Iterator, Optional, Union
+
+from .utils import PatternMatcher
+
+
+def get_creation_timestamp(stat: os.stat_result) -> float:
+    """
+    The creation time of a file, or something similar,
+    as returned by get_file_creation_timestamp, from a stat result.
+    """
+    if platform.system() == "Windows":
+        return stat.st_ctime
+    # this should work on macOS
+    return getattr(stat, "st_birthtime", stat.st_mtime)
+
+
+class ScanEntry:
+    """A regular file found by a DirectoryScanner, with its lstat result"""
+
+    __slots__ = ("path", "stat")
+
+    def __init__(self, path: str, stat: os.stat_result):
+        self.path = path
+        self.stat = stat
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def created(self) -> float:
+        return get_creation_timestamp(self.stat)
+
+
+class ScanProgress:
+    """
+    Counts the directories and files that one or more DirectoryScanners
+    have found so far. It may be read from any thread, for example
+    to show the progress of an initial scan in the GUI.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._started = monotonic()
+        self._directories: int = 0
+        self._files: int = 0
+        self._finished = Event()
+
+    @property
+    def directories(self) -> int:
+        return self._directories
+
+    @property
+    def files(self) -> int:
+        return self._files
+
+    @property
+    def rate(self) -> float:
+        """The number of files found per second"""
+        return self._files / max(monotonic() - self._started, 1e-3)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def finish(self):
+        self._finished.set()
+
+    def _add(self, directories: int = 0, files: int = 0):
+        with self._lock:
+            self._directories += directories
+            self._files += files
+
+    def __str__(self):
+        return f"Scanned {self._directories} directories, found {self._files} files ({self.rate:.0f} files/s)"
+
+
+# marks the end of a scan in the queue of results
+_DONE: Final = object()
+
+
+class DirectoryScanner:
+    """
+    Finds the regular files in a directory tree that match the patterns
+    of the matcher,
+    using os.scandir, whose entries know their own type on most platforms.
+    A single lstat call is made per matching file, and none for the others.
+    Symbolic links are ignored.
+
+    Subdirectories are scanned in parallel by a pool of threads,
+    which mostly helps on network filesystems. The files are therefore
+    not returned in any particular order.
+    """
+
+    MAX_WORKERS: Final[int] = 8
+    # the number of files that may be waiting for the caller
+    BUFFER_SIZE: Final[int] = 10000
+
+    def __init__(
+        self,
+        matcher: PatternMatcher,
+        recursive: bool = True,
+        filter_directories: bool = False,
+        max_workers: int = MAX_WORKERS,
+        progress: Optional[ScanProgress] = None,
+    ):
+        self._matcher = matcher
+        self._recursive = recursive
+        # when set, subdirectories must match the patterns as well
+        self._filter_directories = filter_directories
+        self._max_workers = max_workers
+        self._progress = progress if progress is not None else ScanProgress()
+
+    @property
+    def progress(self) -> ScanProgress:
+        return self._progress
+
+    def scan(self, directory: Union[str, os.PathLike]) -> Iterator[ScanEntry]:
+        """
+        Yields the matching files while the tree is being scanned.
+        Errors reading a directory are raised by the iterator,
+        files that disappear while scanning are skipped.
+        Closing the iterator stops the scan.
+        """
+        results: queue.Queue = queue.Queue(maxsize=self.BUFFER_SIZE)
+        stop = Event()
+        lock = Lock()
+        pending = 0
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def submit(path: str):
+            nonlocal pending
+            with lock:
+                pending += 1
+            try:
+                executor.submit(walk, path)
+            except RuntimeError:
+                # the scan was closed and the pool shut down
+                finish()
+
+        def finish():
+            nonlocal pending
+            with lock:
+                pending -= 1
+                done = pending == 0
+            if done:
+                put(_DONE)
+
+        def walk(path: str):
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if stop.is_set():
+                            return
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self._recursive and (
+                                    not self._filter_directories
+                                    or self._matcher.match(entry.path)
+                                ):
+                                    submit(entry.path)
+                            elif entry.is_file(
+                                follow_symlinks=False
+                            ) and self._matcher.match(entry.path):
+                                stat = entry.stat(follow_symlinks=False)
+                                if not put(ScanEntry(entry.path, stat)):
+                                    return
+                                self._progress._add(files=1)
+                        except FileNotFoundError:
+                            continue
+            except FileNotFoundError as e:
+                # subdirectories may be removed while scanning
+                if path == root:
+                    put(e)
+            except Exception as e:
+                put(e)
+            finally:
+                self._progress._add(directories=1)
+                finish()
+
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="rfi-file-monitor-scanner",
+        ) as executor:
+            root = os.fspath(directory)
+            submit(root)
+            try:
+                while True:
+                    item = results.get()
+                    if item is _DONE:
+                        return
+                    elif isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+
+    def contains_files(self, directory: Union[str, os.PathLike]) -> bool:
+        """Checks if the tree contains at least one matching file"""
+        entries = self.scan(directory)
+        try:
+            return next(entries, None) is not None
+        finally:
+            entries.close()
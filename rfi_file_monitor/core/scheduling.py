@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+from typing import OrderedDict as OrderedDictType
+from typing import Any, Dict, Final, List, Optional, Tuple, Type
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Condition
+from time import monotonic
+import heapq
+import itertools
+import os
+
+from ..file import File
+from ..files.directory import Directory
+from ..files.s3_object import S3Object
+
+
+def get_file_size(file: File) -> Optional[int]:
+    """
+    Returns the size in bytes of a file, or None if it cannot be determined
+    cheaply. Directories only report their size if their file list
+    is up to date, as walking them would block the caller.
+    """
+    if isinstance(file, S3Object):
+        return file.size
+    elif isinstance(file, Directory):
+        return file.known_total_size
+    try:
+        return os.stat(file.filename).st_size
+    except OSError:
+        return None
+
+
+def _needs_size(file: File) -> bool:
+    # the size of S3 objects and directories is known without a stat
+    return (
+        not isinstance(file, (S3Object, Directory)) and file.size_hint is None
+    )
+
+
+def get_cached_file_size(file: File) -> Optional[int]:
+    """
+    Like get_file_size, but never touches the filesystem:
+    regular files report the size that was recorded when they were queued.
+    """
+    if isinstance(file, (S3Object, Directory)):
+        return get_file_size(file)
+    return file.size_hint
+
+
+class SchedulingPolicy(ABC):
+    """
+    Decides in which order the queued files are handed out to the workers.
+    Policies do not need to be thread-safe: the ReadyQueue
+    holds its lock whenever it calls them.
+    Policies must not block: those that order files by size set USES_SIZE,
+    and only read the size cached by the ReadyQueue.
+    """
+
+    NAME: str
+
+    USES_SIZE: bool = False
+
+    @abstractmethod
+    def push(self, file: File):
+        """Add a file. If it was already present, it will be replaced."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self) -> File:
+        """Remove and return the next file. Raises IndexError when empty."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, file: File) -> bool:
+        """Remove a file. Returns False if it was not present."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class FIFOPolicy(SchedulingPolicy):
+
+    NAME = "First in, first out"
+
+    def __init__(self):
+        self._files: OrderedDictType[str, File] = OrderedDict()
+
+    def push(self, file: File):
+        self._files.pop(file.filename, None)
+        self._files[file.filename] = file
+
+    def pop(self) -> File:
+        if not self._files:
+            raise IndexError("pop from an empty FIFOPolicy")
+        _, file = self._files.popitem(last=False)
+        return file
+
+    def remove(self, file: File) -> bool:
+        return self._files.pop(file.filename, None) is not None
+
+    def clear(self):
+        self._files.clear()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+class _HeapPolicy(SchedulingPolicy):
+    """
+    Base class for policies that hand out files in order of a key.
+    Removed and replaced files are left in the heap,
+    and skipped when they come up.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[Any, int, File]] = list()
+        self._entries: Dict[str, Tuple[Any, int, File]] = dict()
+        self._counter = itertools.count()
+
+    @abstractmethod
+    def _key(self, file: File) -> Any:
+        raise NotImplementedError
+
+    def _popped(self, key: Any):
+        pass
+
+    def push(self, file: File):
+        entry = (self._key(file), next(self._counter), file)
+        self._entries[file.filename] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self) -> File:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            key, _, file = entry
+            if self._entries.get(file.filename) is entry:
+                del self._entries[file.filename]
+                self._popped(key)
+                return file
+        raise IndexError(f"pop from an empty {type(self).__name__}")
+
+    def remove(self, file: File) -> bool:
+        if self._entries.pop(file.filename, None) is None:
+            return False
+        if not self._entries:
+            # drop the stale entries
+            self._heap.clear()
+        return True
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ShortestFirstPolicy(_HeapPolicy):
+    """
+    Smallest files go first. Files whose size is unknown go last.
+    """
+
+    NAME = "Smallest files first"
+
+    USES_SIZE = True
+
+    def _key(self, file: File) -> Any:
+        size = get_cached_file_size(file)
+        if size is None:
+            return (1, 0)
+        return (0, size)
+
+
+class OldestDeadlineFirstPolicy(_HeapPolicy):
+    """
+    Files whose promotion deadline expired first go first. The deadline is
+    the time the file was saved plus the promotion delay, or the time
+    its retry was due, whichever is later.
+    """
+
+    NAME = "Oldest deadline first"
+
+    def __init__(self, delay: float = 0):
+        super().__init__()
+        self._delay = delay
+
+    def _key(self, file: File) -> Any:
+        return max(file.saved + self._delay, file.retry_at)
+
+
+class FairSharePolicy(_HeapPolicy):
+    """
+    Weighted fair queuing, using the top-level component of the relative
+    filename as flow. Each flow gets a share of the bytes that are processed
+    proportional to its weight (1 by default), so a busy folder
+    cannot starve the others.
+    Files in the monitored directory itself make up one flow.
+    """
+
+    NAME = "Fair share per top-level folder"
+
+    USES_SIZE = True
+
+    # cost per file, so that empty files cannot monopolize the workers
+    FILE_COST: Final[int] = 64 * 1024
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self._weights: Dict[str, float] = dict(weights) if weights else {}
+        self._virtual_time: float = 0
+        self._finish_tags: Dict[str, float] = dict()
+
+    @staticmethod
+    def get_flow(file: File) -> str:
+        parts = file.relative_filename.parts
+        return parts[0] if len(parts) > 1 else ""
+
+    def _key(self, file: File) -> Any:
+        flow = self.get_flow(file)
+        size = get_cached_file_size(file) or 0
+        weight = self._weights.get(flow, 1.0)
+        start = max(self._virtual_time, self._finish_tags.get(flow, 0))
+        finish = start + (size + self.FILE_COST) / weight
+        self._finish_tags[flow] = finish
+        return finish
+
+    def _popped(self, key: Any):
+        self._virtual_time = key
+
+    def clear(self):
+        super().clear()
+        self._virtual_time = 0
+        self._finish_tags.clear()
+
+
+SCHEDULING_POLICIES: Final[Dict[str, Type[SchedulingPolicy]]] = {
+    policy.NAME: policy
+    for policy in (
+        FIFOPolicy,
+        ShortestFirstPolicy,
+        OldestDeadlineFirstPolicy,
+        FairSharePolicy,
+    )
+}
+
+
+class ReadyQueue:
+    """
+    Thread-safe queue of files that are ready for processing.
+    The queue manager puts QUEUED files in here, while the workers
+    of the worker pool block on get() until a file becomes available.
+    The order in which files are handed out is determined by the policy.
+
+    If the policy needs the size of the files, files whose size is not known
+    yet wait in line until a worker has determined their size,
+    without holding the lock. Each worker does so for at most
+    STAT_CHUNK_SIZE files before taking a file, so that the others
+    can keep processing the files that were sized already.
+    """
+
+    # the number of files that are checked by a worker at once
+    STAT_CHUNK_SIZE: Final[int] = 256
+
+    def __init__(self, policy: Optional[SchedulingPolicy] = None):
+        self._cond = Condition()
+        self._policy: Final[SchedulingPolicy] = (
+            policy if policy is not None else FIFOPolicy()
+        )
+        self._closed: bool = False
+        # files whose size has not been determined yet
+        self._unsized: OrderedDictType[str, File] = OrderedDict()
+        # files whose size is being determined by a worker
+        self._sizing: Dict[str, File] = dict()
+
+    @property
+    def policy(self) -> SchedulingPolicy:
+        return self._policy
+
+    def put(self, file: File):
+        with self._cond:
+            if self._closed:
+                return
+            if self._policy.USES_SIZE:
+                self._policy.remove(file)
+                self._sizing.pop(file.filename, None)
+                self._unsized.pop(file.filename, None)
+            if self._policy.USES_SIZE and _needs_size(file):
+                self._unsized[file.filename] = file
+            else:
+                self._policy.push(file)
+            self._cond.notify()
+
+    def remove(self, file: File) -> bool:
+        """
+        Remove a file from the queue, if it's still waiting in it.
+        Returns False if the file was not found,
+        meaning that it has been picked up by a worker already.
+        """
+        with self._cond:
+            if self._unsized.pop(file.filename, None) is not None:
+                return True
+            if self._sizing.pop(file.filename, None) is not None:
+                return True
+            return self._policy.remove(file)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[File]:
+        """
+        Returns the next file in line. Blocks until a file is available,
+        the timeout has expired, or the queue is closed,
+        in which case None is returned.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                if self._unsized:
+                    self._size_files()
+                    if self._closed:
+                        break
+                if len(self._policy):
+                    return self._policy.pop()
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            return None
+
+    def _size_files(self):
+        # called with the lock held, which is released while the files
+        # are checked, as that may take long on network filesystems
+        files: List[File] = list()
+        while self._unsized and len(files) < self.STAT_CHUNK_SIZE:
+            filename, file = self._unsized.popitem(last=False)
+            self._sizing[filename] = file
+            files.append(file)
+        self._cond.release()
+        try:
+            for file in files:
+                file.size_hint = get_file_size(file)
+        finally:
+            self._cond.acquire()
+        for file in files:
+            # skip files that were removed or put again in the meantime
+            if self._sizing.get(file.filename) is file:
+                del self._sizing[file.filename]
+                self._policy.push(file)
+        self._cond.notify_all()
+
+    def close(self):
+        """Wake up all workers and discard all remaining files"""
+        with self._cond:
+            self._closed = True
+            self._policy.clear()
+            self._unsized.clear()
+            self._sizing.clear()
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self):
+        with self._cond:
+            return len(self._policy) + len(self._unsized) + len(self._sizing)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+from threading import RLock
+from typing import List, Optional, Sequence
+
+from ..file import File, FileStatus
+from .archive import ArchivedFile
+
+logger = logging.getLogger(__name__)
+
+
+class SpillQueue:
+    """
+    A first-in, first-out queue of files that have been found by an engine,
+    but that the queue has no room for yet. The files are stored
+    as ArchivedFile records in an SQLite database, and are turned into
+    File objects again when they are popped.
+
+    When no path is provided, a temporary database is used,
+    which is deleted when the queue is closed.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._temporary = path is None
+        self._lock = RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._len: int = 0
+
+    @property
+    def path(self) -> Optional[str]:
+        return self._path
+
+    def open(self):
+        if self._temporary:
+            fd, self._path = tempfile.mkstemp(
+                prefix="rfi-file-monitor-spill-", suffix=".sqlite"
+            )
+            os.close(fd)
+        self._connection = sqlite3.connect(
+            self._path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS spilled ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "filename TEXT NOT NULL, "
+            "status INTEGER NOT NULL, "
+            "record BLOB NOT NULL)"
+        )
+        (self._len,) = self._connection.execute(
+            "SELECT COUNT(*) FROM spilled"
+        ).fetchone()
+
+    def close(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.close()
+            self._connection = None
+            if self._temporary:
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.unlink(self._path + suffix)
+                    except FileNotFoundError:
+                        pass
+                self._path = None
+
+    def push(self, files: Sequence[File]):
+        rows = [
+            (
+                _file.filename,
+                int(_file.status),
+                pickle.dumps(ArchivedFile(_file)),
+            )
+            for _file in files
+        ]
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    "INSERT INTO spilled (filename, status, record) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+            self._len += len(rows)
+
+    def peek(self, n: int) -> List[File]:
+        """
+        Returns up to n files from the queue, oldest first,
+        without removing them. Use discard to remove them afterwards.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT filename, status, record FROM spilled "
+                "ORDER BY id LIMIT ?",
+                (n,),
+            ).fetchall()
+
+        return [
+            pickle.loads(record).restore(filename, FileStatus(status))
+            for filename, status, record in rows
+        ]
+
+    def discard(self, n: int):
+        """Removes the n oldest files from the queue"""
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                cursor = self._connection.execute(
+                    "DELETE FROM spilled WHERE id IN "
+                    "(SELECT id FROM spilled ORDER BY id LIMIT ?)",
+                    (n,),
+                )
+            self._len -= cursor.rowcount
+
+    def pop(self, n: int) -> List[File]:
+        """Removes up to n files from the queue, oldest first"""
+        with self._lock:
+            files = self.peek(n)
+            self.discard(len(files))
+        return files
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._len
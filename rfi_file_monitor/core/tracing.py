@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from collections import deque
+import csv
+import json
+from threading import Lock
+from time import time
+from typing import Any, Deque, Dict, List, Optional, Sequence, TextIO, Tuple
+from typing import Union
+
+from ..file import File, FileStatus
+from .events import QueueObserver
+
+# the events that do not correspond to a status
+DISCOVERED: str = "discovered"
+REQUEUED: str = "requeued"
+
+
+class FileTrace:
+    """
+    The timestamps at which a file went through each stage of the queue.
+    Operations are identified by their index, -1 refers to the file itself.
+    """
+
+    __slots__ = ("filename", "events", "finished")
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.events: List[Tuple[float, int, Union[FileStatus, str]]] = list()
+        self.finished: bool = False
+
+    def record(
+        self,
+        event: Union[FileStatus, str],
+        index: int = -1,
+        timestamp: Optional[float] = None,
+    ):
+        self.events.append(
+            (time() if timestamp is None else timestamp, index, event)
+        )
+
+
+def _get_event_name(event: Union[FileStatus, str]) -> str:
+    if isinstance(event, FileStatus):
+        return event.name.lower()
+    return event
+
+
+class Tracer(QueueObserver):
+    """
+    Attaches a FileTrace to every file that is added to a QueueCore,
+    and keeps the traces of the most recently processed files,
+    which can be exported as Chrome trace events or as CSV.
+
+    A file that is saved again after it was processed gets a new trace.
+    """
+
+    def __init__(self, operation_names: Sequence[str], max_files: int = 10000):
+        self._operation_names = list(operation_names)
+        self._lock = Lock()
+        self._active: Dict[str, FileTrace] = dict()
+        self._finished: Deque[FileTrace] = deque(maxlen=max_files)
+
+    def _start(self, file: File, event: str):
+        trace = FileTrace(file.filename)
+        trace.record(event)
+        trace.record(file.status)
+        file.trace = trace
+        with self._lock:
+            previous = self._active.pop(file.filename, None)
+            if previous is not None and not previous.finished:
+                # cancelled before it could finish
+                self._finished.append(previous)
+            self._active[file.filename] = trace
+
+    def file_added(self, file: File):
+        self._start(file, DISCOVERED)
+
+    def file_requeued(self, file: File):
+        self._start(file, REQUEUED)
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        if new_status not in (FileStatus.SUCCESS, FileStatus.FAILURE):
+            return
+        trace = file.trace
+        if trace is None or trace.finished:
+            return
+        with self._lock:
+            trace.finished = True
+            self._active.pop(file.filename, None)
+            self._finished.append(trace)
+
+    @property
+    def traces(self) -> List[FileTrace]:
+        """The traces of the processed files, followed by the others"""
+        with self._lock:
+            return list(self._finished) + list(self._active.values())
+
+    def _get_operation_name(self, index: int) -> str:
+        if 0 <= index < len(self._operation_names):
+            return self._operation_names[index]
+        return f"Operation {index}"
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Returns the traces in the Chrome trace event format,
+        which can be loaded in chrome://tracing or Perfetto.
+        Every file is shown as a thread, with a slice for each stage
+        and for each operation that ran.
+        """
+        events: List[Dict[str, Any]] = list()
+        for tid, trace in enumerate(self.traces, start=1):
+            events.append(
+                dict(
+                    name="thread_name",
+                    ph="M",
+                    pid=1,
+                    tid=tid,
+                    args=dict(name=trace.filename),
+                )
+            )
+            # the file itself
+            stages = [event for event in trace.events if event[1] < 0]
+            for (timestamp, _, event), next_stage in zip(
+                stages, stages[1:] + [None]
+            ):
+                name = _get_event_name(event)
+                if not isinstance(event, FileStatus) or next_stage is None:
+                    events.append(
+                        dict(
+                            name=name,
+                            cat="file",
+                            ph="i",
+                            s="t",
+                            ts=timestamp * 1e6,
+                            pid=1,
+                            tid=tid,
+                        )
+                    )
+                    continue
+                events.append(
+                    dict(
+                        name=name,
+                        cat="file",
+                        ph="X",
+                        ts=timestamp * 1e6,
+                        dur=(next_stage[0] - timestamp) * 1e6,
+                        pid=1,
+                        tid=tid,
+                    )
+                )
+            # the operations
+            started: Dict[int, float] = dict()
+            for timestamp, index, event in trace.events:
+                if index < 0:
+                    continue
+                if event == FileStatus.RUNNING:
+                    started[index] = timestamp
+                    continue
+                start = started.pop(index, None)
+                if start is None:
+                    continue
+                events.append(
+                    dict(
+                        name=self._get_operation_name(index),
+                        cat="operation",
+                        ph="X",
+                        ts=start * 1e6,
+                        dur=(timestamp - start) * 1e6,
+                        pid=1,
+                        tid=tid,
+                        args=dict(outcome=_get_event_name(event)),
+                    )
+                )
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def write_chrome_trace(self, f: TextIO):
+        json.dump(self.to_chrome_trace(), f)
+
+    def write_csv(self, f: TextIO):
+        """
+        Writes a row per event, with the time elapsed since
+        the file was discovered or requeued.
+        """
+        writer = csv.writer(f)
+        writer.writerow(
+            ("filename", "timestamp", "elapsed", "operation", "event")
+        )
+        for trace in self.traces:
+            if not trace.events:
+                continue
+            first = trace.events[0][0]
+            for timestamp, index, event in trace.events:
+                writer.writerow(
+                    (
+                        trace.filename,
+                        f"{timestamp:.6f}",
+                        f"{timestamp - first:.6f}",
+                        self._get_operation_name(index) if index >= 0 else "",
+                        _get_event_name(event),
+                    )
+                )
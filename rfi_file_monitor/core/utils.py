@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+from typing import (
+    Callable,
+    Dict,
+    Final,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+from functools import lru_cache
+from pathlib import PurePath, PureWindowsPath
+from threading import Event, Lock, Thread
+import re
+
+from .exceptions import OperationCancelled
+
+
+class ExitableThread(Thread):
+    def __init__(self):
+        super().__init__()
+        self._should_exit: bool = False
+
+    @property
+    def should_exit(self):
+        return self._should_exit
+
+    @should_exit.setter
+    def should_exit(self, value: bool):
+        self._should_exit = value
+
+
+class Cancellable:
+    """
+    Thread-safe flag that is used to signal that the processing
+    of a file should be aborted.
+    """
+
+    def __init__(self):
+        self._event = Event()
+        self._lock = Lock()
+        self._reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = list()
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def cancel(self, reason: str = "Operation cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """
+        Raises OperationCancelled if cancelled. Operations should call this
+        regularly while processing a file, for example in progress callbacks.
+        """
+        if self._event.is_set():
+            raise OperationCancelled(self._reason)
+
+    def reset(self):
+        with self._lock:
+            self._event.clear()
+            self._reason = None
+
+    def connect(self, callback: Callable[[], None]):
+        """
+        Registers a function that is called from the thread that cancels.
+        It is called immediately if cancelled already.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            cancelled = self._event.is_set()
+        if cancelled:
+            callback()
+
+    def disconnect(self, callback: Callable[[], None]):
+        with self._lock:
+            self._callbacks.remove(callback)
+
+
+def _get_common_patterns(
+    included_patterns: List[str],
+    excluded_patterns: List[str],
+    case_sensitive: bool,
+) -> Set[str]:
+    if not case_sensitive:
+        included_patterns = [x.lower() for x in included_patterns] + [
+            x.upper() for x in included_patterns
+        ]
+        excluded_patterns = [x.lower() for x in excluded_patterns] + [
+            x.upper() for x in excluded_patterns
+        ]
+    return set(included_patterns).intersection(excluded_patterns)
+
+
+def _translate_part(pattern: str) -> str:
+    """
+    Translates the glob of a single path component to a regular expression,
+    following fnmatch, except that wildcards never match a separator.
+    """
+    i, n = 0, len(pattern)
+    res: List[str] = list()
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            # consecutive stars are equivalent to a single one
+            if not res or res[-1] != "[^/]*":
+                res.append("[^/]*")
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                res.append("\\[")
+                continue
+            stuff = pattern[i:j].replace("\\", "\\\\")
+            i = j + 1
+            # escape set operations, as fnmatch does
+            stuff = re.sub(r"([&~|])", r"\\\1", stuff)
+            if stuff[0] == "!":
+                stuff = "^" + stuff[1:]
+            elif stuff[0] == "^":
+                stuff = "\\" + stuff
+            res.append(f"(?!/)[{stuff}]")
+        else:
+            res.append(re.escape(c))
+    return "".join(res)
+
+
+class PatternMatcher:
+    """
+    Checks if paths match any of the included patterns, and none of the
+    excluded patterns, like match_path, which relies on PurePath.match:
+    relative patterns are matched against the last components of the path,
+    absolute patterns against the whole path.
+
+    All patterns are compiled into a single regular expression,
+    with a fast path for patterns that only check the extension,
+    and the results for the most recently matched paths are cached.
+    Conflicting patterns raise a ValueError when the matcher is created.
+
+    Paths are matched using the conventions of path_type,
+    e.g. PurePosixPath for S3 keys. Strings must be normalized paths.
+    """
+
+    CACHE_SIZE: Final[int] = 65536
+
+    def __init__(
+        self,
+        included_patterns: Sequence[str],
+        excluded_patterns: Sequence[str],
+        case_sensitive: bool = True,
+        path_type: Type[PurePath] = PurePath,
+    ):
+        common_patterns = _get_common_patterns(
+            list(included_patterns), list(excluded_patterns), case_sensitive
+        )
+        if common_patterns:
+            raise ValueError(
+                f"conflicting patterns `{common_patterns}` included and excluded"
+            )
+        self._included_patterns = tuple(included_patterns)
+        self._excluded_patterns = tuple(excluded_patterns)
+        self._case_sensitive = case_sensitive
+        self._path_type = path_type
+        # PurePath and Path are the flavour of the current platform
+        self._windows = isinstance(path_type(), PureWindowsPath)
+        self._compile()
+
+    def _compile(self):
+        self._included = self._compile_patterns(self._included_patterns)
+        self._excluded = self._compile_patterns(self._excluded_patterns)
+        self._cache: Dict[str, bool] = dict()
+
+    def _compile_patterns(
+        self, patterns: Sequence[str]
+    ) -> Union[None, Tuple[str, ...], re.Pattern]:
+        """
+        Returns None if no path can match, the suffixes that paths
+        must end with if all patterns are simple extensions,
+        and a regular expression otherwise.
+        """
+        if not patterns:
+            return None
+        suffixes: List[str] = list()
+        regexes: List[str] = list()
+        for pattern in patterns:
+            if pattern.startswith("*") and not re.search(
+                r"[*?\[/\\]", pattern[1:]
+            ):
+                suffix = pattern[1:]
+                suffixes.append(suffix if not self._windows else suffix.lower())
+            parsed = self._path_type(pattern)
+            if not parsed.parts:
+                raise ValueError("empty pattern")
+            parts = [_translate_part(part) for part in parsed.parts]
+            if parsed.anchor:
+                anchor = re.escape(parsed.anchor.replace("\\", "/"))
+                if self._windows and not parsed.drive:
+                    # a root without drive matches the root of any drive
+                    anchor = "[^/]*" + anchor
+                regexes.append("^" + anchor + "/".join(parts[1:]) + "$")
+            else:
+                regexes.append("(?:^|/)" + "/".join(parts) + "$")
+        if len(suffixes) == len(patterns):
+            return tuple(suffixes)
+        return re.compile(
+            "|".join(f"(?:{regex})" for regex in regexes),
+            re.IGNORECASE if self._windows else 0,
+        )
+
+    def __getstate__(self):
+        # the cache may be large, and the expressions are quickly compiled
+        return (
+            self._included_patterns,
+            self._excluded_patterns,
+            self._case_sensitive,
+            self._path_type,
+            self._windows,
+        )
+
+    def __setstate__(self, state):
+        (
+            self._included_patterns,
+            self._excluded_patterns,
+            self._case_sensitive,
+            self._path_type,
+            self._windows,
+        ) = state
+        self._compile()
+
+    @property
+    def included_patterns(self) -> Tuple[str, ...]:
+        return self._included_patterns
+
+    @property
+    def excluded_patterns(self) -> Tuple[str, ...]:
+        return self._excluded_patterns
+
+    @staticmethod
+    def _search(
+        compiled: Union[None, Tuple[str, ...], re.Pattern], path: str
+    ) -> bool:
+        if compiled is None:
+            return False
+        elif isinstance(compiled, tuple):
+            return path.endswith(compiled)
+        return compiled.search(path) is not None
+
+    def match(self, path: Union[str, PurePath]) -> bool:
+        path = str(path)
+        try:
+            return self._cache[path]
+        except KeyError:
+            pass
+        normalized = path
+        if self._windows:
+            normalized = path.replace("\\", "/")
+            if isinstance(self._included, tuple) or isinstance(
+                self._excluded, tuple
+            ):
+                normalized = normalized.lower()
+        rv = self._search(self._included, normalized) and not self._search(
+            self._excluded, normalized
+        )
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[path] = rv
+        return rv
+
+    __call__ = match
+
+
+@lru_cache(maxsize=128)
+def _get_pattern_matcher(
+    included_patterns: Tuple[str, ...],
+    excluded_patterns: Tuple[str, ...],
+    case_sensitive: bool,
+    path_type: Type[PurePath],
+) -> PatternMatcher:
+    return PatternMatcher(
+        included_patterns, excluded_patterns, case_sensitive, path_type
+    )
+
+
+def match_path(
+    path: PurePath,
+    included_patterns: List[str],
+    excluded_patterns: List[str],
+    case_sensitive: bool = True,
+) -> bool:
+    """
+    Checks if the path matches any of the included patterns,
+    and none of the excluded patterns. Prefer creating a PatternMatcher
+    when matching many paths against the same patterns.
+    """
+    return _get_pattern_matcher(
+        tuple(included_patterns),
+        tuple(excluded_patterns),
+        case_sensitive,
+        type(path),
+    ).match(path)
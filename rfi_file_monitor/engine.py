@@ -13,7 +13,9 @@ import traceback
 import logging
 
 from .utils import ExitableThread, LongTaskWindow
-from .utils.exceptions import AlreadyRunning, NotYetRunning
+from .core.completion import CompletionRules
+from .core.scan import ScanProgress
+from .core.exceptions import AlreadyRunning, NotYetRunning
 from .utils.widgetparams import WidgetParams
 
 
@@ -175,3 +177,28 @@ class Engine(ABC, WidgetParams, Gtk.Grid, metaclass=EngineMeta):
 
     def _get_params(self) -> Munch:
         return self.params.copy()
+
+    def show_scan_progress(
+        self, task_window: LongTaskWindow, progress: ScanProgress, title: str
+    ):
+        """
+        Shows the progress of a scan for existing files in the task window,
+        twice per second, until the scan is finished. May be called from
+        the engine thread.
+        """
+
+        def _update():
+            if progress.finished:
+                return GLib.SOURCE_REMOVE
+            task_window.set_text(f"<b>{title}</b>\n{progress}")
+            return GLib.SOURCE_CONTINUE
+
+        GLib.timeout_add(500, _update)
+
+    def get_completion_rules(self) -> Optional[CompletionRules]:
+        """
+        The rules the queue manager uses to decide when a saved file
+        is ready to be queued. Engines that can detect files being closed,
+        or whose files may be written slowly, should override this.
+        """
+        return None
@@ -8,10 +8,12 @@ from ..engine import Engine, EngineThread
 from ..files.s3_object import S3Object
 from ..file import FileStatus
 from ..operations.s3_uploader import AWS_S3_ENGINE_IGNORE_ME
-from ..utils import LongTaskWindow, match_path
+from ..utils import LongTaskWindow, PatternMatcher
 
+from functools import cached_property
 import logging
 from pathlib import PurePosixPath
+from typing import Iterator
 import urllib.parse
 
 logger = logging.getLogger(__name__)
@@ -37,6 +39,16 @@ class BaseS3BucketEngineThread(EngineThread):
             self.params.ignore_patterns
         )
 
+    @cached_property
+    def _matcher(self) -> PatternMatcher:
+        # S3 keys always use forward slashes
+        return PatternMatcher(
+            self._included_patterns,
+            self._excluded_patterns,
+            case_sensitive=False,
+            path_type=PurePosixPath,
+        )
+
     def get_full_name(self, key) -> str:
         raise NotImplementedError
 
@@ -93,12 +105,7 @@ class BaseS3BucketEngineThread(EngineThread):
             etag = ""
         size = object_info["size"]
 
-        if not match_path(
-            PurePosixPath(key),
-            included_patterns=self._included_patterns,
-            excluded_patterns=self._excluded_patterns,
-            case_sensitive=False,
-        ):
+        if not self._matcher.match(key):
             return False
 
         # ensure that this is not an S3Uploader testfile!
@@ -144,66 +151,52 @@ class BaseS3BucketEngineThread(EngineThread):
                 size,
                 self._client_options["region_name"],
             )
-            GLib.idle_add(
-                self._engine._appwindow._queue_manager.add,
-                _file,
-                priority=GLib.PRIORITY_HIGH,
-            )
+            self._engine._appwindow._queue_manager.admit([_file])
         return True
 
+    def _iter_existing_files(self) -> Iterator[S3Object]:
+        paginator = self._engine.s3_client.get_paginator("list_objects_v2")
+        page_iterator = paginator.paginate(Bucket=self.params.bucket_name)
+
+        for page in page_iterator:
+            if page["KeyCount"] == 0:
+                continue
+            for _object in page["Contents"]:
+                key = _object["Key"]
+
+                if not self._matcher.match(key):
+                    continue
+
+                last_modified = _object["LastModified"]
+                size = _object["Size"]
+                etag = _object["ETag"][1:-1]  # get rid of those weird quotes
+                quoted_key = urllib.parse.quote_plus(key)
+
+                full_path = self.get_full_name(quoted_key)
+                relative_path = PurePosixPath(key)
+                created = last_modified.timestamp()
+
+                yield S3Object(
+                    full_path,
+                    relative_path,
+                    created,
+                    FileStatus.SAVED,
+                    self.params.bucket_name,
+                    etag,
+                    size,
+                    self._client_options["region_name"],
+                )
+
     def process_existing_files(self) -> bool:
         GLib.idle_add(
             self._task_window.set_text, "<b>Processing existing objects...</b>"
         )
         try:
-            paginator = self._engine.s3_client.get_paginator("list_objects_v2")
-            page_iterator = paginator.paginate(Bucket=self.params.bucket_name)
-
-            existing_files = []
-
-            for page in page_iterator:
-                if page["KeyCount"] == 0:
-                    continue
-                for _object in page["Contents"]:
-                    key = _object["Key"]
-
-                    if not match_path(
-                        PurePosixPath(key),
-                        included_patterns=self._included_patterns,
-                        excluded_patterns=self._excluded_patterns,
-                        case_sensitive=False,
-                    ):
-                        continue
-
-                    last_modified = _object["LastModified"]
-                    size = _object["Size"]
-                    etag = _object["ETag"][
-                        1:-1
-                    ]  # get rid of those weird quotes
-                    quoted_key = urllib.parse.quote_plus(key)
-
-                    full_path = self.get_full_name(quoted_key)
-                    relative_path = PurePosixPath(key)
-                    created = last_modified.timestamp()
-
-                    _file = S3Object(
-                        full_path,
-                        relative_path,
-                        created,
-                        FileStatus.SAVED,
-                        self.params.bucket_name,
-                        etag,
-                        size,
-                        self._client_options["region_name"],
-                    )
-
-                    existing_files.append(_file)
-            if existing_files:
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.add,
-                    existing_files,
-                    priority=GLib.PRIORITY_HIGH,
-                )
+            # the objects are listed while they are being added,
+            # pausing whenever the queue manager has too many files waiting
+            self._engine._appwindow._queue_manager.admit(
+                self._iter_existing_files()
+            )
         except Exception as e:
             self._engine.cleanup()
             GLib.idle_add(
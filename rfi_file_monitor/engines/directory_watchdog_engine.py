@@ -4,11 +4,12 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib
-from ..utils import match_path, _get_common_patterns
+from ..utils import PatternMatcher, _get_common_patterns
 from watchdog.observers import Observer
 from watchdog.events import (
     FileSystemEventHandler,
     DirCreatedEvent,
+    DirDeletedEvent,
     FileCreatedEvent,
     FileModifiedEvent,
 )
@@ -17,6 +18,12 @@ from .directory_watchdog_engine_advanced_settings import (
     DirectoryWatchdogEngineAdvancedSettings,
 )
 from ..engine import Engine, EngineThread
+from ..core.debounce import EventDebouncer
+from ..core.scan import (
+    DirectoryScanner,
+    ScanProgress,
+    get_creation_timestamp,
+)
 from ..files.directory import Directory
 from ..file import FileStatus
 from ..utils import (
@@ -30,8 +37,9 @@ from ..utils.decorators import (
     with_pango_docs,
 )
 
+from functools import cached_property
 import logging
-from typing import List
+from typing import Iterator, List
 from pathlib import Path, PurePath
 import os
 
@@ -120,8 +128,9 @@ class DirectoryWatchdogEngineThread(Observer):
             self.params.ignore_directory_patterns, defaults=[]
         )
 
+        self._event_handler = EventHandler(engine)
         self.schedule(
-            event_handler=EventHandler(engine),
+            event_handler=self._event_handler,
             path=engine.params.monitored_directory,
             recursive=True,
         )
@@ -136,56 +145,41 @@ class DirectoryWatchdogEngineThread(Observer):
         if self._should_exit:
             self.stop()
 
-    def _search_for_existing_files(self, directory: Path) -> int:
-        rv: int = 0
-        for child in directory.iterdir():
-            if (
-                child.is_file()
-                and not child.is_symlink()
-                and match_path(
-                    child,
-                    included_patterns=self._included_file_patterns,
-                    excluded_patterns=self._excluded_file_patterns,
-                    case_sensitive=False,
-                )
-            ):
-
-                rv += 1
-            elif child.is_dir() and not child.is_symlink():
-                rv += self._search_for_existing_files(directory.joinpath(child))
-        return rv
-
-    def _dir_filter(self, child: Path) -> bool:
-        return (
-            child.is_dir()
-            and not child.is_symlink()
-            and match_path(
-                child,
-                included_patterns=self._included_directory_patterns,
-                excluded_patterns=self._excluded_directory_patterns,
+    def _search_for_existing_directories(
+        self, directory: str, progress: ScanProgress
+    ) -> Iterator[Directory]:
+        scanner = DirectoryScanner(
+            PatternMatcher(
+                self._included_file_patterns,
+                self._excluded_file_patterns,
                 case_sensitive=False,
-            )
-            and (self._search_for_existing_files(child) > 0)
+            ),
+            progress=progress,
+        )
+        directory_matcher = PatternMatcher(
+            self._included_directory_patterns,
+            self._excluded_directory_patterns,
+            case_sensitive=False,
         )
 
-    def _search_for_existing_directories(
-        self, directory: Path
-    ) -> List[Directory]:
-        rv: List[Directory] = list()
-        dirs = filter(self._dir_filter, directory.iterdir())
-
-        for _dir in dirs:
-            rv.append(
-                Directory(
-                    str(_dir),
-                    PurePath(_dir.name),
-                    get_file_creation_timestamp(_dir),
-                    FileStatus.SAVED,
-                    self._included_file_patterns,
-                    self._excluded_file_patterns,
-                )
-            )
-        return rv
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if (
+                    entry.is_dir(follow_symlinks=False)
+                    and directory_matcher.match(entry.path)
+                    # skip directories without files to process
+                    and scanner.contains_files(entry.path)
+                ):
+                    yield Directory(
+                        entry.path,
+                        PurePath(entry.name),
+                        get_creation_timestamp(
+                            entry.stat(follow_symlinks=False)
+                        ),
+                        FileStatus.SAVED,
+                        self._included_file_patterns,
+                        self._excluded_file_patterns,
+                    )
 
     def run(self):
         # confirm patterns are valid
@@ -226,14 +220,18 @@ class DirectoryWatchdogEngineThread(Observer):
                 self._task_window.set_text,
                 "<b>Processing existing directories...</b>",
             )
+            progress = ScanProgress()
+            self._engine.show_scan_progress(
+                self._task_window,
+                progress,
+                "Processing existing directories...",
+            )
             try:
-                existing_directories = self._search_for_existing_directories(
-                    Path(self.params.monitored_directory)
-                )
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.add,
-                    existing_directories,
-                    priority=GLib.PRIORITY_DEFAULT_IDLE,
+                # directories are added in batches while searching
+                self._engine._appwindow._queue_manager.admit(
+                    self._search_for_existing_directories(
+                        self.params.monitored_directory, progress
+                    )
                 )
             except Exception as e:
                 self._engine.cleanup()
@@ -244,6 +242,8 @@ class DirectoryWatchdogEngineThread(Observer):
                     priority=GLib.PRIORITY_HIGH,
                 )
                 return
+            finally:
+                progress.finish()
 
         # if we get here, things should be working.
         # close task_window
@@ -254,10 +254,15 @@ class DirectoryWatchdogEngineThread(Observer):
         )
 
         # kick off watchdog's run method
+        self._event_handler.debouncer.start()
+        metrics = self._engine._appwindow._queue_manager.metrics
+        if metrics is not None:
+            self._event_handler.debouncer.add_gauges(metrics)
         super().run()
 
     def on_thread_stop(self):
         super().on_thread_stop()
+        self._event_handler.debouncer.stop()
         self._engine.cleanup()
 
 
@@ -284,6 +289,33 @@ class EventHandler(FileSystemEventHandler):
         super().__init__()
 
         self._empty_directories: List[Directory] = []
+        # every write to a file in a directory produces a modified event
+        self.debouncer = EventDebouncer(self._report_saved)
+
+    # created when the first event arrives, as the thread
+    # only starts watching after validating the patterns
+    @cached_property
+    def _file_matcher(self) -> PatternMatcher:
+        return PatternMatcher(
+            self._included_file_patterns,
+            self._excluded_file_patterns,
+            case_sensitive=False,
+        )
+
+    @cached_property
+    def _directory_matcher(self) -> PatternMatcher:
+        return PatternMatcher(
+            self._included_directory_patterns,
+            self._excluded_directory_patterns,
+            case_sensitive=False,
+        )
+
+    def _report_saved(self, paths: List[str]):
+        GLib.idle_add(
+            self._engine._appwindow._queue_manager.saved,
+            paths,
+            priority=GLib.PRIORITY_HIGH,
+        )
 
     def dispatch(self, event):
 
@@ -294,22 +326,9 @@ class EventHandler(FileSystemEventHandler):
             paths.append(os.fsdecode(event.src_path))
 
         for path in paths:
-            _path = Path(path)
-            if (
-                _path.is_dir()
-                and match_path(
-                    _path,
-                    included_patterns=self._included_directory_patterns,
-                    excluded_patterns=self._excluded_directory_patterns,
-                    case_sensitive=False,
-                )
-            ) or (
-                match_path(
-                    _path,
-                    included_patterns=self._included_file_patterns,
-                    excluded_patterns=self._excluded_file_patterns,
-                    case_sensitive=False,
-                )
+            # the patterns are checked first, as these do not need a stat
+            if self._file_matcher.match(path) or (
+                self._directory_matcher.match(path) and os.path.isdir(path)
             ):
 
                 super().dispatch(event)
@@ -333,11 +352,7 @@ class EventHandler(FileSystemEventHandler):
                 and self._engine._appwindow._queue_manager.props.running
             ):
 
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.saved,
-                    path,
-                    priority=GLib.PRIORITY_HIGH,
-                )
+                self.debouncer.add(path)
 
             elif rel_path.parts[0] not in self._empty_directories:
                 logger.info(f"New directory {rel_path.parts[0]} was created")
@@ -369,11 +384,7 @@ class EventHandler(FileSystemEventHandler):
                 else:
                     logger.info(f"File Not found, {path} has been skipped")
                     return
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.add,
-                    _dir,
-                    priority=GLib.PRIORITY_HIGH,
-                )
+                self._engine._appwindow._queue_manager.admit([_dir])
 
             elif (
                 self._engine.props.running
@@ -383,11 +394,7 @@ class EventHandler(FileSystemEventHandler):
                 new_path = os.path.join(
                     self.params.monitored_directory, rel_path.parts[0]
                 )
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.saved,
-                    new_path,
-                    priority=GLib.PRIORITY_HIGH,
-                )
+                self.debouncer.add(new_path)
 
         else:
             raise NotImplementedError(
@@ -396,7 +403,7 @@ class EventHandler(FileSystemEventHandler):
 
     def on_modified(self, event):
         path = event.src_path
-        logger.info(f"Monitor found {path} for event type MODIFIED")
+        logger.debug(f"Monitor found {path} for event type MODIFIED")
         path_object: PurePath = PurePath(path)
         rel_path = path_object.relative_to(self.params.monitored_directory)
 
@@ -414,8 +421,37 @@ class EventHandler(FileSystemEventHandler):
                 new_path = os.path.join(
                     self.params.monitored_directory, rel_path.parts[0]
                 )
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.saved,
-                    new_path,
-                    priority=GLib.PRIORITY_HIGH,
-                )
+                self.debouncer.add(new_path)
+
+    def on_deleted(self, event):
+        path = event.src_path
+        logger.info(f"Monitor found {path} for event type DELETED")
+        path_object: PurePath = PurePath(path)
+        rel_path = path_object.relative_to(self.params.monitored_directory)
+
+        if len(rel_path.parts) == 1:
+            if isinstance(event, DirDeletedEvent):
+                if rel_path.parts[0] in self._empty_directories:
+                    self._empty_directories.remove(rel_path.parts[0])
+                elif (
+                    self._engine.props.running
+                    and self._engine._appwindow._queue_manager.props.running
+                ):
+                    # the whole directory is gone
+                    self.debouncer.discard(path)
+                    GLib.idle_add(
+                        self._engine._appwindow._queue_manager.deleted,
+                        path,
+                        priority=GLib.PRIORITY_HIGH,
+                    )
+            else:
+                logger.info(f"Ignoring file in monitored directory {path}")
+        elif (
+            self._engine.props.running
+            and self._engine._appwindow._queue_manager.props.running
+        ):
+            # this changes the contents of the corresponding Directory instance
+            new_path = os.path.join(
+                self.params.monitored_directory, rel_path.parts[0]
+            )
+            self.debouncer.add(new_path)
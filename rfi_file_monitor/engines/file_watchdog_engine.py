@@ -4,13 +4,16 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib
-from ..utils import match_path
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
 
 from ..engine import Engine, EngineThread
+from ..core.completion import CompletionRules
+from ..core.debounce import EventDebouncer
+from ..core.scan import DirectoryScanner, ScanProgress
 from ..utils import (
     LongTaskWindow,
+    PatternMatcher,
     get_file_creation_timestamp,
     _get_common_patterns,
 )
@@ -25,7 +28,7 @@ from .file_watchdog_engine_advanced_settings import (
     FileWatchdogEngineAdvancedSettings,
 )
 
-from typing import List
+from typing import Iterator, List, Optional
 from pathlib import Path, PurePath
 import logging
 import os
@@ -90,6 +93,18 @@ class FileWatchdogEngine(Engine):
 
         self.notify("valid")
 
+    def get_completion_rules(self) -> Optional[CompletionRules]:
+        if not self.params.completion_rules:
+            return None
+        try:
+            return CompletionRules.parse(
+                self.params.completion_rules,
+                self.params.completion_stability_interval,
+            )
+        except ValueError as e:
+            logger.error(f"Ignoring the write completion rules: {e}")
+            return None
+
 
 # add our ExitableThread methods to Watchdog's Observer class to ensure it can be used as an EngineThread
 class FileWatchdogEngineThread(Observer):
@@ -107,8 +122,9 @@ class FileWatchdogEngineThread(Observer):
             self.params.ignore_patterns
         )
 
+        self._event_handler = EventHandler(engine)
         self.schedule(
-            event_handler=EventHandler(engine),
+            event_handler=self._event_handler,
             path=engine.params.monitored_directory,
             recursive=engine.params.monitor_recursively,
         )
@@ -123,40 +139,28 @@ class FileWatchdogEngineThread(Observer):
         if self._should_exit:
             self.stop()
 
-    def _search_for_existing_files(self, directory: Path) -> List[RegularFile]:
-        rv: List[RegularFile] = list()
-        for child in directory.iterdir():
-            if (
-                child.is_file()
-                and not child.is_symlink()
-                and match_path(
-                    child,
-                    included_patterns=self._included_patterns,
-                    excluded_patterns=self._excluded_patterns,
-                    case_sensitive=False,
-                )
-            ):
-
-                file_path = directory.joinpath(child)
-                relative_file_path = file_path.relative_to(
-                    self.params.monitored_directory
-                )
-                _file = RegularFile(
-                    str(file_path),
-                    relative_file_path,
-                    get_file_creation_timestamp(file_path),
-                    FileStatus.SAVED,
-                )
-                rv.append(_file)
-            elif (
-                self.params.monitor_recursively
-                and child.is_dir()
-                and not child.is_symlink()
-            ):
-                rv.extend(
-                    self._search_for_existing_files(directory.joinpath(child))
-                )
-        return rv
+    def _search_for_existing_files(
+        self, directory: str, progress: ScanProgress
+    ) -> Iterator[RegularFile]:
+        scanner = DirectoryScanner(
+            PatternMatcher(
+                self._included_patterns,
+                self._excluded_patterns,
+                case_sensitive=False,
+            ),
+            recursive=self.params.monitor_recursively,
+            progress=progress,
+        )
+        for entry in scanner.scan(directory):
+            file = RegularFile(
+                entry.path,
+                PurePath(os.path.relpath(entry.path, directory)),
+                entry.created,
+                FileStatus.SAVED,
+            )
+            # spares the scheduling policies a stat
+            file.size_hint = entry.size
+            yield file
 
     def run(self):
         # confirm patterns are valid
@@ -180,14 +184,17 @@ class FileWatchdogEngineThread(Observer):
                 self._task_window.set_text,
                 "<b>Processing existing files...</b>",
             )
+            progress = ScanProgress()
+            self._engine.show_scan_progress(
+                self._task_window, progress, "Processing existing files..."
+            )
             try:
-                existing_files = self._search_for_existing_files(
-                    Path(self.params.monitored_directory)
-                )
-                GLib.idle_add(
-                    self._engine._appwindow._queue_manager.add,
-                    existing_files,
-                    priority=GLib.PRIORITY_DEFAULT_IDLE,
+                # files are added in batches while searching, pausing
+                # whenever the queue manager has too many files waiting
+                self._engine._appwindow._queue_manager.admit(
+                    self._search_for_existing_files(
+                        self.params.monitored_directory, progress
+                    )
                 )
             except Exception as e:
                 self._engine.cleanup()
@@ -198,6 +205,9 @@ class FileWatchdogEngineThread(Observer):
                     priority=GLib.PRIORITY_HIGH,
                 )
                 return
+            finally:
+                progress.finish()
+            logger.info(f"Initial scan finished: {progress}")
 
         # if we get here, things should be working.
         # close task_window
@@ -208,10 +218,15 @@ class FileWatchdogEngineThread(Observer):
         )
 
         # kick off watchdog's run method
+        self._event_handler.debouncer.start()
+        metrics = self._engine._appwindow._queue_manager.metrics
+        if metrics is not None:
+            self._event_handler.debouncer.add_gauges(metrics)
         super().run()
 
     def on_thread_stop(self):
         super().on_thread_stop()
+        self._event_handler.debouncer.stop()
         self._engine.cleanup()
 
 
@@ -234,6 +249,15 @@ class EventHandler(PatternMatchingEventHandler):
             ignore_patterns=ignore_patterns,
             ignore_directories=True,
         )
+        # writing a file produces a modified event for every write call
+        self.debouncer = EventDebouncer(self._report_saved)
+
+    def _report_saved(self, file_paths: List[str]):
+        GLib.idle_add(
+            self._engine._appwindow._queue_manager.saved,
+            file_paths,
+            priority=GLib.PRIORITY_HIGH,
+        )
 
     def on_created(self, event):
         file_path = event.src_path
@@ -256,21 +280,43 @@ class EventHandler(PatternMatchingEventHandler):
             else:
                 logger.info(f"File Not found, {file_path} has been skipped")
                 return None
+            self._engine._appwindow._queue_manager.admit([_file])
+
+    def on_modified(self, event):
+        file_path = event.src_path
+        logger.debug(f"Monitor found {file_path} for event type MODIFIED")
+        if (
+            self._engine.props.running
+            and self._engine._appwindow._queue_manager.props.running
+        ):
+            self.debouncer.add(file_path)
+
+    def on_closed(self, event):
+        # only reported for files that were opened for writing
+        file_path = event.src_path
+        logger.info(f"Monitor found {file_path} for event type CLOSED")
+        if (
+            self._engine.props.running
+            and self._engine._appwindow._queue_manager.props.running
+        ):
+            # completed marks the file as saved as well
+            self.debouncer.discard(file_path)
             GLib.idle_add(
-                self._engine._appwindow._queue_manager.add,
-                _file,
+                self._engine._appwindow._queue_manager.completed,
+                file_path,
                 priority=GLib.PRIORITY_HIGH,
             )
 
-    def on_modified(self, event):
+    def on_deleted(self, event):
         file_path = event.src_path
-        logger.info(f"Monitor found {file_path} for event type MODIFIED")
+        logger.info(f"Monitor found {file_path} for event type DELETED")
         if (
             self._engine.props.running
             and self._engine._appwindow._queue_manager.props.running
         ):
+            self.debouncer.discard(file_path)
             GLib.idle_add(
-                self._engine._appwindow._queue_manager.saved,
+                self._engine._appwindow._queue_manager.deleted,
                 file_path,
                 priority=GLib.PRIORITY_HIGH,
             )
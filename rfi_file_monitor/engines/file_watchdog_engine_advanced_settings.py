@@ -6,6 +6,7 @@ from gi.repository import Gtk
 from ..engine_advanced_settings import EngineAdvancedSettings
 from ..engine import Engine
 from ..utils import PATTERN_PLACEHOLDER_TEXT
+from ..core.completion import CompletionRules
 
 
 class FileWatchdogEngineAdvancedSettings(EngineAdvancedSettings):
@@ -125,6 +126,113 @@ class FileWatchdogEngineAdvancedSettings(EngineAdvancedSettings):
             "ignore_patterns",
         )
         ignore_patterns_grid.attach(self._ignored_patterns_entry, 1, 0, 1, 1)
+        self._row_counter += 1
+
+        self._add_horizontal_separator()
+
+        # Specify how to detect that files have been written completely
+        completion_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+            row_spacing=5,
+        )
+
+        self.attach(completion_grid, 0, self._row_counter, 1, 1)
+        self._row_counter += 1
+        completion_grid.attach(
+            Gtk.Label(
+                label="Write completion rules",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            0,
+            1,
+            1,
+        )
+        self._completion_rules_entry = engine.register_widget(
+            Gtk.Entry(
+                placeholder_text="*.tif: close, *.h5: stable",
+                halign=Gtk.Align.FILL,
+                valign=Gtk.Align.CENTER,
+                hexpand=True,
+                vexpand=False,
+            ),
+            "completion_rules",
+        )
+        self._completion_rules_entry.connect(
+            "changed", self._completion_rules_entry_changed_cb
+        )
+        completion_grid.attach(self._completion_rules_entry, 1, 0, 2, 1)
+        completion_grid.attach(
+            Gtk.Label(
+                label="Consider files stable when unchanged for",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            1,
+            1,
+            1,
+        )
+        self._completion_stability_interval_spinbutton = engine.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=0.1,
+                    upper=3600,
+                    value=2,
+                    page_size=0,
+                    step_increment=0.5,
+                ),
+                value=2,
+                digits=1,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=0.5,
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "completion_stability_interval",
+        )
+        completion_grid.attach(
+            self._completion_stability_interval_spinbutton, 1, 1, 1, 1
+        )
+        completion_grid.attach(
+            Gtk.Label(
+                label="seconds",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            2,
+            1,
+            1,
+            1,
+        )
+
+    def _completion_rules_entry_changed_cb(self, entry):
+        try:
+            CompletionRules.parse(entry.get_text())
+        except ValueError as e:
+            entry.set_icon_from_icon_name(
+                icon_pos=Gtk.EntryIconPosition.SECONDARY,
+                icon_name="dialog-warning",
+            )
+            entry.set_icon_tooltip_text(Gtk.EntryIconPosition.SECONDARY, str(e))
+        else:
+            entry.set_icon_from_icon_name(
+                icon_pos=Gtk.EntryIconPosition.SECONDARY, icon_name=None
+            )
 
     def _add_horizontal_separator(self):
         self.attach(
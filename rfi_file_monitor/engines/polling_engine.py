@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk, GLib
+
+from ..engine import Engine, EngineThread
+from ..core.completion import CompletionRules
+from ..core.poll import DirectoryPoller, PollChanges
+from ..core.scan import ScanEntry, ScanProgress
+from ..utils import (
+    LongTaskWindow,
+    PatternMatcher,
+    _get_common_patterns,
+)
+from ..file import FileStatus
+from ..files.regular_file import RegularFile
+from ..utils.decorators import (
+    exported_filetype,
+    with_advanced_settings,
+    with_pango_docs,
+)
+from .polling_engine_advanced_settings import PollingEngineAdvancedSettings
+
+from typing import Iterable, Iterator, Optional
+from pathlib import Path, PurePath
+from threading import Event
+from time import monotonic
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ERROR_MSG = "Ensure that the selected directory is readable and that any provided patterns do not conflict"
+
+
+@with_pango_docs(filename="polling_engine.pango")
+@with_advanced_settings(engine_advanced_settings=PollingEngineAdvancedSettings)
+@exported_filetype(filetype=RegularFile)
+class PollingEngine(Engine):
+
+    NAME = "Polling Files Monitor"
+
+    def __init__(self, appwindow):
+        super().__init__(appwindow, PollingEngineThread, ERROR_MSG)
+
+        label = Gtk.Label(
+            label="Monitored Directory",
+            halign=Gtk.Align.START,
+            valign=Gtk.Align.CENTER,
+            hexpand=False,
+            vexpand=False,
+        )
+        self.attach(label, 0, 0, 1, 1)
+
+        self._directory_chooser_button = self.register_widget(
+            Gtk.FileChooserButton(
+                title="Select a directory for monitoring",
+                action=Gtk.FileChooserAction.SELECT_FOLDER,
+                create_folders=True,
+                halign=Gtk.Align.FILL,
+                valign=Gtk.Align.FILL,
+                hexpand=True,
+                vexpand=False,
+            ),
+            "monitored_directory",
+        )
+        self.attach(self._directory_chooser_button, 1, 0, 1, 1)
+        self._directory_chooser_button.connect(
+            "selection-changed", self._directory_chooser_button_cb
+        )
+
+    def _directory_chooser_button_cb(self, button):
+        if (
+            self.params.monitored_directory is None
+            or Path(self.params.monitored_directory).is_dir() is False
+        ):
+            self._valid = False
+        else:
+            try:
+                os.listdir(self.params.monitored_directory)
+                self._valid = True
+            except Exception:
+                self._valid = False
+
+        self.notify("valid")
+
+    def get_completion_rules(self) -> Optional[CompletionRules]:
+        if not self.params.completion_rules:
+            return None
+        try:
+            return CompletionRules.parse(
+                self.params.completion_rules,
+                self.params.completion_stability_interval,
+            )
+        except ValueError as e:
+            logger.error(f"Ignoring the write completion rules: {e}")
+            return None
+
+
+class PollingEngineThread(EngineThread):
+    def __init__(self, engine: PollingEngine, task_window: LongTaskWindow):
+        super().__init__(engine, task_window)
+        # set when the thread should exit, interrupting the wait between polls
+        self._exit_event = Event()
+        app = engine.appwindow.props.application
+        self._included_patterns = app.get_allowed_file_patterns(
+            self.params.allowed_patterns
+        )
+        self._excluded_patterns = app.get_ignored_file_patterns(
+            self.params.ignore_patterns
+        )
+        self._poller = DirectoryPoller(
+            self.params.monitored_directory,
+            PatternMatcher(
+                self._included_patterns,
+                self._excluded_patterns,
+                case_sensitive=False,
+            ),
+            recursive=self.params.monitor_recursively,
+            active_interval=float(self.params.active_interval),
+            full_check_interval=float(self.params.full_check_interval) * 60,
+        )
+
+    @property
+    def should_exit(self):
+        return self._should_exit
+
+    @should_exit.setter
+    def should_exit(self, value: bool):
+        self._should_exit = value
+        if self._should_exit:
+            self._exit_event.set()
+
+    def _get_files(
+        self, entries: Iterable[ScanEntry], status: FileStatus
+    ) -> Iterator[RegularFile]:
+        for entry in entries:
+            file = RegularFile(
+                entry.path,
+                PurePath(
+                    os.path.relpath(entry.path, self.params.monitored_directory)
+                ),
+                entry.created,
+                status,
+            )
+            # spares the scheduling policies a stat
+            file.size_hint = entry.size
+            yield file
+
+    def run(self):
+        # confirm patterns are valid
+        if bool(
+            common_patterns := _get_common_patterns(
+                self._included_patterns, self._excluded_patterns, False
+            )
+        ):
+            self._engine.cleanup()
+            GLib.idle_add(
+                self._engine.abort,
+                self._task_window,
+                f"Common patterns {common_patterns} detected!",
+                priority=GLib.PRIORITY_HIGH,
+            )
+            return
+
+        # the initial snapshot is needed to tell new files from existing ones
+        if self.params.process_existing_files:
+            title = "Processing existing files..."
+        else:
+            title = "Scanning existing files..."
+        GLib.idle_add(self._task_window.set_text, f"<b>{title}</b>")
+        progress = ScanProgress()
+        self._engine.show_scan_progress(self._task_window, progress, title)
+        try:
+            entries = self._poller.scan(progress)
+            if self.params.process_existing_files:
+                self._engine._appwindow._queue_manager.admit(
+                    self._get_files(entries, FileStatus.SAVED)
+                )
+            else:
+                for _ in entries:
+                    if self.should_exit:
+                        entries.close()
+                        break
+        except Exception as e:
+            self._engine.cleanup()
+            GLib.idle_add(
+                self._engine.abort,
+                self._task_window,
+                e,
+                priority=GLib.PRIORITY_HIGH,
+            )
+            return
+        finally:
+            progress.finish()
+        logger.info(f"Initial scan finished: {progress}")
+
+        # if we get here, things should be working.
+        # close task_window
+        GLib.idle_add(
+            self._engine.kill_task_window,
+            self._task_window,
+            priority=GLib.PRIORITY_HIGH,
+        )
+
+        try:
+            while not self._exit_event.wait(float(self.params.poll_interval)):
+                started = monotonic()
+                try:
+                    changes = self._poller.poll()
+                except OSError as e:
+                    # network shares may be unavailable for a while
+                    logger.warning(
+                        f"Could not poll {self.params.monitored_directory}: {e}"
+                    )
+                    continue
+                logger.debug(
+                    f"Polled {len(self._poller)} files in {self._poller.ndirectories} directories in {monotonic() - started:.2f} seconds"
+                )
+                if not changes:
+                    continue
+                try:
+                    self._report(changes)
+                except Exception:
+                    # the changes are lost, but polling continues
+                    logger.exception(
+                        f"Could not report the changes in {self.params.monitored_directory}"
+                    )
+        finally:
+            self._engine.cleanup()
+
+    def _report(self, changes: PollChanges):
+        queue_manager = self._engine._appwindow._queue_manager
+        if not (self._engine.props.running and queue_manager.props.running):
+            return
+        logger.info(
+            f"Monitor found {len(changes.created)} created, {len(changes.modified)} modified and {len(changes.deleted)} deleted files"
+        )
+        if changes.deleted:
+            GLib.idle_add(
+                queue_manager.deleted,
+                changes.deleted,
+                priority=GLib.PRIORITY_HIGH,
+            )
+        if changes.created:
+            queue_manager.admit(
+                self._get_files(changes.created, FileStatus.CREATED)
+            )
+        # new files have been written to already when they are found
+        saved = [entry.path for entry in changes.created + changes.modified]
+        if saved:
+            GLib.idle_add(
+                queue_manager.saved,
+                saved,
+                priority=GLib.PRIORITY_HIGH,
+            )
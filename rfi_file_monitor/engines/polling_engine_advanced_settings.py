@@ -0,0 +1,105 @@
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk
+
+from ..engine import Engine
+from .file_watchdog_engine_advanced_settings import (
+    FileWatchdogEngineAdvancedSettings,
+)
+
+
+class PollingEngineAdvancedSettings(FileWatchdogEngineAdvancedSettings):
+    def __init__(self, engine: Engine):
+        super().__init__(engine)
+
+        self._add_horizontal_separator()
+
+        # Specify how often the directory is checked for changes
+        polling_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+            row_spacing=5,
+        )
+
+        self.attach(polling_grid, 0, self._row_counter, 1, 1)
+        self._row_counter += 1
+
+        for row, (label, name, lower, upper, value, unit) in enumerate(
+            (
+                (
+                    "Check for changes every",
+                    "poll_interval",
+                    1,
+                    3600,
+                    5,
+                    "seconds",
+                ),
+                (
+                    "Check files modified in the last",
+                    "active_interval",
+                    0,
+                    3600,
+                    60,
+                    "seconds on every check",
+                ),
+                (
+                    "Check all files for modifications every",
+                    "full_check_interval",
+                    0,
+                    24 * 60,
+                    0,
+                    "minutes (0 to disable)",
+                ),
+            )
+        ):
+            polling_grid.attach(
+                Gtk.Label(
+                    label=label,
+                    halign=Gtk.Align.START,
+                    valign=Gtk.Align.CENTER,
+                    hexpand=False,
+                    vexpand=False,
+                ),
+                0,
+                row,
+                1,
+                1,
+            )
+            spinbutton = engine.register_widget(
+                Gtk.SpinButton(
+                    adjustment=Gtk.Adjustment(
+                        lower=lower,
+                        upper=upper,
+                        value=value,
+                        page_size=0,
+                        step_increment=1,
+                    ),
+                    value=value,
+                    update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                    numeric=True,
+                    climb_rate=5,
+                    halign=Gtk.Align.START,
+                    valign=Gtk.Align.CENTER,
+                    hexpand=False,
+                    vexpand=False,
+                ),
+                name,
+            )
+            polling_grid.attach(spinbutton, 1, row, 1, 1)
+            polling_grid.attach(
+                Gtk.Label(
+                    label=unit,
+                    halign=Gtk.Align.START,
+                    valign=Gtk.Align.CENTER,
+                    hexpand=False,
+                    vexpand=False,
+                ),
+                2,
+                row,
+                1,
+                1,
+            )
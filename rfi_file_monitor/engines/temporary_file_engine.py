@@ -265,11 +265,7 @@ class FileGeneratorThread(EngineThread):
                         time(),
                         FileStatus.CREATED,
                     )
-                    GLib.idle_add(
-                        self._engine._appwindow._queue_manager.add,
-                        _file,
-                        priority=GLib.PRIORITY_HIGH,
-                    )
+                    self._engine._appwindow._queue_manager.admit([_file])
                 # ensure we dont need no to wait too long when stopping the engine
                 for _ in range(int(self._engine.params.creation_delay)):
                     sleep(1)
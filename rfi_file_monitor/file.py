@@ -1,15 +1,16 @@
-import gi
-
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GLib, Gio
-
+from __future__ import annotations
 
 from enum import auto, IntEnum, unique
 import logging
 from pathlib import PurePath
-from typing import Final, Dict, Any, Optional
+from typing import Final, Dict, Any, Optional, Tuple, TYPE_CHECKING
 from abc import ABC, abstractmethod
 
+from .core.utils import Cancellable
+
+if TYPE_CHECKING:
+    from .core.events import QueueObserver
+    from .core.tracing import FileTrace
 
 logger = logging.getLogger(__name__)
 
@@ -44,15 +45,21 @@ class File(ABC):
         self._relative_filename = relative_filename
         self._created: Final[float] = created
         self._status = status
-        self._row_reference: Gtk.TreeRowReference = None
         self._operation_metadata: Final[Dict[int, Dict[str, Any]]] = dict()
-        self._cancellable = Gio.Cancellable()
+        self._cancellable = Cancellable()
         self._saved: float = 0
         self._requeue: bool = False
         self._succeeded: float = 0
+        self._failed: float = 0
+        self._resume_index: int = 0
+        self._attempts: int = 0
+        self._retry_at: float = 0
+        self._size_hint: Optional[int] = None
+        self._observer: Optional[QueueObserver] = None
+        self._trace: Optional[FileTrace] = None
 
     @property
-    def cancellable(self) -> Gio.Cancellable:
+    def cancellable(self) -> Cancellable:
         return self._cancellable
 
     @property
@@ -87,13 +94,95 @@ class File(ABC):
     def succeeded(self, value: int):
         self._succeeded = value
 
+    @property
+    def failed(self) -> float:
+        return self._failed
+
+    @failed.setter
+    def failed(self, value: float):
+        self._failed = value
+
+    @property
+    def resume_index(self) -> int:
+        """
+        Index of the first operation that should be run by the next job.
+        Preceding operations have completed already in a previous session.
+        """
+        return self._resume_index
+
+    @resume_index.setter
+    def resume_index(self, value: int):
+        self._resume_index = value
+
+    @property
+    def attempts(self) -> int:
+        """
+        The number of times the operation at resume_index has failed,
+        when it is going to be retried.
+        """
+        return self._attempts
+
+    @attempts.setter
+    def attempts(self, value: int):
+        self._attempts = value
+
+    @property
+    def retry_at(self) -> float:
+        """The time before which a failed operation will not be retried"""
+        return self._retry_at
+
+    @retry_at.setter
+    def retry_at(self, value: float):
+        self._retry_at = value
+
+    @property
+    def size_hint(self) -> Optional[int]:
+        """
+        The size in bytes of the file when it was queued,
+        as used by the scheduling policies. None if unknown.
+        """
+        return self._size_hint
+
+    @size_hint.setter
+    def size_hint(self, value: Optional[int]):
+        self._size_hint = value
+
     @property
     def status(self) -> FileStatus:
         return self._status
 
     @status.setter
     def status(self, value: FileStatus):
+        old_value = self._status
         self._status = value
+        if self._trace is not None and old_value != value:
+            self._trace.record(value)
+        if self._observer is not None and old_value != value:
+            self._observer.file_status_changed(self, old_value, value)
+
+    @property
+    def observer(self) -> Optional[QueueObserver]:
+        """
+        Receives the status changes and progress updates of this file.
+        This is set by the queue that the file has been added to.
+        """
+        return self._observer
+
+    @observer.setter
+    def observer(self, value: Optional[QueueObserver]):
+        self._observer = value
+
+    @property
+    def trace(self) -> Optional[FileTrace]:
+        """
+        Records when the file went through each stage, if tracing is active.
+        This is set by the queue that the file has been added to.
+        """
+        return self._trace
+
+    @trace.setter
+    def trace(self, value: Optional[FileTrace]):
+        self._trace = value
 
     @property
     def requeue(self) -> bool:
@@ -103,82 +192,46 @@ class File(ABC):
     def requeue(self, value: bool):
         self._requeue = value
 
-    @property
-    def row_reference(self) -> Gtk.TreeRowReference:
-        return self._row_reference
-
-    @row_reference.setter
-    def row_reference(self, value: Gtk.TreeRowReference):
-        self._row_reference = value
+    def _get_archive_args(self) -> Tuple:
+        """
+        The constructor arguments that follow filename, relative_filename,
+        created and status. These are used to recreate the file
+        after it has been archived by the queue manager.
+        Subclasses with additional constructor arguments must override this.
+        """
+        return ()
 
     def __str__(self):
         return f"{type(self).__name__}: {self._filename} -> {str(self._status)}"
 
-    def _update_progressbar_worker_cb(self, index: int, value: float):
-        if not self.row_reference.valid():
-            logger.warning(
-                f"_update_progressbar_worker_cb: {self.filename} is invalid!"
-            )
-            return GLib.SOURCE_REMOVE
-
-        model = self.row_reference.get_model()
-        path = self.row_reference.get_path()
-        parent_iter = model.get_iter(path)
-        n_children = model.iter_n_children(parent_iter)
-
-        cumul_value = (index * 100.0 + value) / n_children
-        model[parent_iter][4] = cumul_value
-        model[parent_iter][5] = f"{cumul_value:.1f} %"
-
-        child_iter = model.iter_nth_child(parent_iter, index)
-        model[child_iter][4] = value
-        model[child_iter][5] = f"{value:.1f} %"
-
-        return GLib.SOURCE_REMOVE
+    def __getstate__(self):
+        # allows sending files to other processes,
+        # without the objects that are bound to this one
+        state = self.__dict__.copy()
+        state["_observer"] = None
+        state["_trace"] = None
+        del state["_cancellable"]
+        return state
 
-    def _update_status_worker_cb(self, index: int, status: FileStatus, message):
-        if not self.row_reference.valid():
-            logger.warning(
-                f"_update_status_worker_cb: {self.filename} is invalid!"
-            )
-            return GLib.SOURCE_REMOVE
-
-        model = self.row_reference.get_model()
-        path = self.row_reference.get_path()
-        iter = model.get_iter(path)
-
-        if index == -1:  # parent
-            self.status = status
-            iter = model.get_iter(path)
-        else:
-            iter = model.iter_nth_child(iter, index)
-
-        model[iter][2] = int(status)
-
-        # When the operation succeeds, ensure that the progressbars go
-        # to 100 %, which is necessary when the operation doesnt
-        # do any progress updated (which would be unfortunate!)
-        if status == FileStatus.SUCCESS:
-            model[iter][4] = 100.0
-            model[iter][5] = "100.0 %"
-        elif status == FileStatus.FAILURE:
-            model[iter][6] = "red"
-            model[iter][7] = GLib.markup_escape_text(message)
-        elif status == FileStatus.SKIPPED:
-            model[iter][6] = "grey"
-            model[iter][7] = GLib.markup_escape_text(message)
-
-        return GLib.SOURCE_REMOVE
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cancellable = Cancellable()
 
     def update_status(
         self, index: int, status: FileStatus, message: Optional[str] = None
     ):
         """
-        When an operation has finished, update the status of the corresponding
-        entry in the treemodel.
-        An index of -1 refers to the parent entry, 0 or higher refers to a child.
+        When an operation has finished, update its status.
+        An index of -1 refers to the file itself, 0 or higher refers to an operation.
         """
-        GLib.idle_add(self._update_status_worker_cb, index, status, message)
+        if index == -1:
+            self.status = status
+        elif self._trace is not None:
+            self._trace.record(status, index)
+        if self._observer is not None:
+            self._observer.operation_status_changed(
+                self, index, status, message
+            )
 
     def update_progressbar(self, index: int, value: float):
         """
@@ -189,4 +242,5 @@ class File(ABC):
         Try not to use this function too often, as it may slow the GUI
         down considerably. I recommend to use it only when value is a whole number
         """
-        GLib.idle_add(self._update_progressbar_worker_cb, index, value)
+        if self._observer is not None:
+            self._observer.operation_progress_changed(self, index, value)
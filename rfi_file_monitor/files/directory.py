@@ -1,12 +1,8 @@
-import gi
-
-gi.require_version("Gtk", "3.0")
-
-
 from ..file import File, FileStatus
-from pathlib import PurePath, Path
-from ..utils import match_path
-from typing import List, Tuple
+from pathlib import PurePath
+from ..core.scan import DirectoryScanner
+from ..core.utils import PatternMatcher
+from typing import List, Tuple, Optional
 from time import time
 
 
@@ -31,10 +27,15 @@ class Directory(File):
         self._included_patterns = included_patterns
         self._excluded_patterns = excluded_patterns
 
+        self._matcher: Optional[PatternMatcher] = None
+
         self._filelist: List[Tuple[str, int]] = []
         self._filelist_timestamp: int = 0
         self._total_size: int = 0
 
+    def _get_archive_args(self) -> Tuple:
+        return (self._included_patterns, self._excluded_patterns)
+
     @property
     def included_patterns(self):
         return self._included_patterns
@@ -43,32 +44,27 @@ class Directory(File):
     def excluded_patterns(self):
         return self._excluded_patterns
 
-    def _get_filelist(self, _dir: Path) -> List[Tuple[str, int]]:
-        rv: List[Tuple[str, int]] = []
-        for entry in _dir.iterdir():
-            if not match_path(
-                entry,
-                included_patterns=self._included_patterns,
-                excluded_patterns=self._excluded_patterns,
+    @property
+    def matcher(self) -> PatternMatcher:
+        if self._matcher is None:
+            self._matcher = PatternMatcher(
+                self._included_patterns,
+                self._excluded_patterns,
                 case_sensitive=False,
-            ):
-                continue
-            if entry.is_file() and not entry.is_symlink():
-                size = entry.stat().st_size
-                self._total_size += size
-                rv.append(
-                    (
-                        str(entry),
-                        size,
-                    )
-                )
-            elif entry.is_dir() and not entry.is_symlink():
-                rv.extend(self._get_filelist(entry))
+            )
+        return self._matcher
+
+    def _get_filelist(self, _dir: str) -> List[Tuple[str, int]]:
+        scanner = DirectoryScanner(self.matcher, filter_directories=True)
+        rv: List[Tuple[str, int]] = sorted(
+            (entry.path, entry.size) for entry in scanner.scan(_dir)
+        )
+        self._total_size += sum(size for _, size in rv)
         return rv
 
     def _refresh_filelist(self):
         self._total_size = 0
-        self._filelist = self._get_filelist(Path(self.filename))
+        self._filelist = self._get_filelist(self.filename)
         self._filelist_timestamp = time()
 
     @property
@@ -77,6 +73,16 @@ class Directory(File):
             self._refresh_filelist()
         return self._total_size
 
+    @property
+    def known_total_size(self) -> Optional[int]:
+        """
+        The total size, without refreshing the file list.
+        Returns None if the file list is out of date.
+        """
+        if self._filelist_timestamp < self._saved:
+            return None
+        return self._total_size
+
     def __iter__(self):
         if self._filelist_timestamp < self._saved:
             self._refresh_filelist()
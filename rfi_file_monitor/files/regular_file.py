@@ -1,10 +1,7 @@
-import gi
-
-gi.require_version("Gtk", "3.0")
-
-from gi.repository import GLib
 from ..file import File, FileStatus
+from ..core.utils import Cancellable
 from pathlib import PurePath
+from typing import Tuple, Optional
 
 
 class RegularFile(File):
@@ -44,7 +41,32 @@ class WeightedRegularFile(RegularFile):
 
         self._offset = offset
         self._weight = weight
+        self._parent: Optional[File] = None
+
+    def _get_archive_args(self) -> Tuple:
+        return (self._offset, self._weight)
+
+    @property
+    def parent(self) -> Optional[File]:
+        """
+        The file whose progress is reported when this file makes progress,
+        such as the directory that contains it.
+        """
+        return self._parent
+
+    @parent.setter
+    def parent(self, value: Optional[File]):
+        self._parent = value
+
+    @property
+    def cancellable(self) -> Cancellable:
+        if self._parent is not None:
+            return self._parent.cancellable
+        return super().cancellable
 
     def update_progressbar(self, index: int, value: float):
         new_value = 100.0 * self._offset + value * self._weight
-        GLib.idle_add(self._update_progressbar_worker_cb, index, new_value)
+        if self._parent is not None:
+            self._parent.update_progressbar(index, new_value)
+        else:
+            super().update_progressbar(index, new_value)
@@ -1,9 +1,6 @@
-import gi
-
-gi.require_version("Gtk", "3.0")
-
 from ..file import File, FileStatus
 from pathlib import PurePath, PurePosixPath
+from typing import Tuple
 
 
 class S3Object(File):
@@ -31,6 +28,9 @@ class S3Object(File):
         self._key = str(PurePosixPath(*self._relative_filename.parts))
         self._region_name = region_name
 
+    def _get_archive_args(self) -> Tuple:
+        return (self._bucket_name, self._etag, self._size, self._region_name)
+
     @property
     def bucket_name(self):
         return self._bucket_name
@@ -2,9 +2,16 @@ from abc import ABC, abstractmethod, ABCMeta
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
+
+from munch import Munch
+
+from typing import Optional, Tuple, Type
+from time import time
 
 from .file import File
+from .core.breaker import BreakerState, CircuitBreaker
+from .core.retry import RetryPolicy
 from .utils.widgetparams import WidgetParams
 
 
@@ -78,6 +85,30 @@ class Operation(ABC, Gtk.Frame, WidgetParams, metaclass=OperationMeta):
 
             help_button.connect("clicked", self._help_clicked_cb)
 
+        # profiles the operation while the monitor is running
+        self._profile_button = Gtk.ToggleButton(
+            image=Gtk.Image(
+                icon_name="utilities-system-monitor-symbolic",
+                icon_size=Gtk.IconSize.SMALL_TOOLBAR,
+            ),
+            tooltip_text="Profile this operation. Use Dump Profiles in the File menu to save the results",
+            halign=Gtk.Align.START,
+            valign=Gtk.Align.CENTER,
+            hexpand=False,
+            vexpand=False,
+        )
+        label_grid.attach(self._profile_button, 3, 0, 1, 1)
+
+        # shows when the queue manager holds back files for this operation
+        self._circuit_breaker_label = Gtk.Label(
+            halign=Gtk.Align.START,
+            valign=Gtk.Align.CENTER,
+            hexpand=False,
+            vexpand=False,
+            use_markup=True,
+        )
+        label_grid.attach(self._circuit_breaker_label, 4, 0, 1, 1)
+
         kwargs.update(
             dict(
                 label_widget=label_grid,
@@ -101,6 +132,34 @@ class Operation(ABC, Gtk.Frame, WidgetParams, metaclass=OperationMeta):
         dialog.select_item(type(self))
         dialog.present()
 
+    def update_circuit_breaker(self, breaker: Optional[CircuitBreaker]):
+        """
+        Shows the state of the circuit breaker of this operation,
+        or hides it when None. Call from the GUI thread.
+        """
+        if breaker is None or breaker.state == BreakerState.CLOSED:
+            label = ""
+        elif breaker.state == BreakerState.OPEN:
+            probe_in = max(breaker.probe_at - time(), 0)
+            label = f"Unavailable: holding back {breaker.nheld} files, next attempt in {probe_in:.0f} s"
+        else:
+            label = f"Checking availability: holding back {breaker.nheld} files"
+        if label:
+            label = f'<span foreground="red">{GLib.markup_escape_text(label)}</span>'
+        self._circuit_breaker_label.set_markup(label)
+
+    @property
+    def profile(self) -> bool:
+        """
+        Whether the queue manager should profile this operation.
+        This is not one of the params, as it does not affect the outcome.
+        """
+        return self._profile_button.get_active()
+
+    @profile.setter
+    def profile(self, value: bool):
+        self._profile_button.set_active(value)
+
     @property
     def appwindow(self):
         """
@@ -141,6 +200,45 @@ class Operation(ABC, Gtk.Frame, WidgetParams, metaclass=OperationMeta):
         """
         raise NotImplementedError
 
+    # Set to True in operations that spend most of their time computing,
+    # such as compressing or hashing. When the queue manager runs
+    # these in a process pool, run_in_process is used instead of run.
+    CPU_BOUND: bool = False
+
+    # Set in operations that may fail temporarily, such as uploads.
+    # A failed run is then retried by the queue manager after a delay,
+    # and the worker is free to process other files in the meantime.
+    # Do not sleep and retry inside run instead.
+    RETRY_POLICY: Optional[RetryPolicy] = None
+
+    # The exceptions that indicate that the endpoint cannot be reached.
+    # When run raises one of these a number of times in a row,
+    # the queue manager holds back the files until the endpoint recovers.
+    # Operations that catch exceptions must re-raise these.
+    CONNECTION_ERRORS: Tuple[Type[BaseException], ...] = ()
+
+    @staticmethod
+    def run_in_process(params: Munch, file: File, index: int):
+        """
+        The equivalent of run for CPU-bound operations, which is executed
+        in a separate process. Since the operation cannot be sent to
+        that process, everything that is needed must be provided by params,
+        which is obtained from get_process_params.
+        The value of index must be used to update the progressbar,
+        and as the key for the file's operation_metadata.
+        The same return values and exceptions as for run apply.
+        """
+        raise NotImplementedError
+
+    def get_process_params(self) -> Munch:
+        """
+        The parameters that are sent to run_in_process.
+        By default these are the operation's params,
+        but any other picklable values needed by run_in_process
+        should be added by overriding this method.
+        """
+        return Munch(self.params)
+
     def preflight_check(self):
         """
         This method will be used to check that all widgets have valid information,
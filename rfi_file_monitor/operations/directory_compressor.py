@@ -4,11 +4,13 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 
+from munch import Munch
+
 from ..operation import Operation
 from ..files.directory import Directory
 from ..utils import ExitableThread, get_random_string
 from ..utils.decorators import supported_filetypes, with_pango_docs
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation
 
 import logging
 from dataclasses import dataclass, field
@@ -51,6 +53,7 @@ COMPRESSORS: Dict[str, Compressor] = {
 class DirectoryCompressorOperation(Operation):
 
     NAME = "Directory Compressor"
+    CPU_BOUND = True
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -179,8 +182,14 @@ class DirectoryCompressorOperation(Operation):
         else:
             tempfile.unlink(missing_ok=True)
 
+    def get_process_params(self) -> Munch:
+        params = super().get_process_params()
+        params.monitored_directory = self._monitored_directory
+        return params
+
+    @staticmethod
     def _check_existing_zipfile(
-        self, _zipfile: Path, file_list: List[Tuple[str, int]]
+        _zipfile: Path, file_list: List[Tuple[str, int]], monitored_directory
     ):
         if not _zipfile.exists() or not zipfile.is_zipfile(_zipfile):
             return
@@ -189,7 +198,7 @@ class DirectoryCompressorOperation(Operation):
             zipped_files = dict(
                 zip(
                     map(
-                        lambda x: os.path.join(self._monitored_directory, x),
+                        lambda x: os.path.join(monitored_directory, x),
                         f.namelist(),
                     ),
                     f.infolist(),
@@ -210,8 +219,9 @@ class DirectoryCompressorOperation(Operation):
 
         raise SkippedOperation("Zipfile contents are equal to directory")
 
+    @staticmethod
     def _check_existing_tarfile(
-        self, _tarfile: Path, file_list: List[Tuple[str, int]]
+        _tarfile: Path, file_list: List[Tuple[str, int]], monitored_directory
     ):
         if not _tarfile.exists() or not tarfile.is_tarfile(_tarfile):
             return
@@ -220,7 +230,7 @@ class DirectoryCompressorOperation(Operation):
             zipped_files = dict(
                 zip(
                     map(
-                        lambda x: os.path.join(self._monitored_directory, x),
+                        lambda x: os.path.join(monitored_directory, x),
                         f.getnames(),
                     ),
                     f.getmembers(),
@@ -242,11 +252,16 @@ class DirectoryCompressorOperation(Operation):
         raise SkippedOperation("Tarball contents are equal to directory")
 
     def run(self, dir: Directory):  # type: ignore[override]
+        return self.run_in_process(self.get_process_params(), dir, self.index)
+
+    @staticmethod
+    def run_in_process(params: Munch, dir: Directory, index: int):  # type: ignore[override]
 
-        compressor = COMPRESSORS[self.params.compression_type]
+        compressor = COMPRESSORS[params.compression_type]
+        monitored_directory = params.monitored_directory
 
         destination_filename = Path(
-            self.params.destination_directory, dir.relative_filename.name
+            params.destination_directory, dir.relative_filename.name
         ).with_suffix(compressor.suffix)
 
         our_thread = current_thread()
@@ -257,9 +272,13 @@ class DirectoryCompressorOperation(Operation):
         size_seen = 0
 
         if "tar" in compressor.suffix:
-            self._check_existing_tarfile(destination_filename, file_list)
+            DirectoryCompressorOperation._check_existing_tarfile(
+                destination_filename, file_list, monitored_directory
+            )
         elif "zip" in compressor.suffix:
-            self._check_existing_zipfile(destination_filename, file_list)
+            DirectoryCompressorOperation._check_existing_zipfile(
+                destination_filename, file_list, monitored_directory
+            )
 
         with compressor.opener(
             destination_filename, compressor.mode, **compressor.opener_args
@@ -270,15 +289,16 @@ class DirectoryCompressorOperation(Operation):
                     and our_thread.should_exit
                 ):
                     return "Job aborted"
-                arcname = os.path.relpath(_file, self._monitored_directory)
+                dir.cancellable.raise_if_cancelled()
+                arcname = os.path.relpath(_file, monitored_directory)
                 getattr(f, compressor.adder)(_file, arcname)
 
                 if total_size == 0:
                     dir.update_progressbar(
-                        self.index, 100.0 * (_file_index + 1) / number_of_files
+                        index, 100.0 * (_file_index + 1) / number_of_files
                     )
                 else:
                     size_seen += _size
                     dir.update_progressbar(
-                        self.index, 100.0 * size_seen / total_size
+                        index, 100.0 * size_seen / total_size
                     )
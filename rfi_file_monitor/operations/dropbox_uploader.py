@@ -4,9 +4,11 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib
 import dropbox
 import keyring
+import requests
 
 from ..operation import Operation
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation
+from ..core.processes import run_cpu_bound
 from ..queue_manager import QueueManager
 from ..utils.decorators import (
     with_pango_docs,
@@ -102,6 +104,18 @@ class DropboxContentHasher(object):
         return self._finish().hexdigest()
 
 
+def get_content_hash(filename: str) -> str:
+    """The Dropbox content hash of a local file"""
+    hasher = DropboxContentHasher()
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(4096)
+            if len(chunk) == 0:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 class DropboxLinkDialog(Gtk.Dialog):
     def __init__(self, appwindow):
         Gtk.Dialog.__init__(
@@ -321,6 +335,10 @@ class DropboxUploaderOperation(Operation):
 
     SESSION = dropbox.create_session(max_connections=QueueManager.MAX_JOBS)
     CHUNK_SIZE = 1024 * 1024  # 1MB
+    CONNECTION_ERRORS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -668,14 +686,8 @@ class DropboxUploaderOperation(Operation):
         else:
             if size == metadata.size:
                 # calculate content hash of local file
-                hasher = DropboxContentHasher()
-                with open(file.filename, "rb") as f:
-                    while True:
-                        chunk = f.read(4096)
-                        if len(chunk) == 0:
-                            break
-                        hasher.update(chunk)
-                if hasher.hexdigest() == metadata.content_hash:
+                content_hash = run_cpu_bound(get_content_hash, file.filename)
+                if content_hash == metadata.content_hash:
                     raise SkippedOperation(
                         "File has already been uploaded to Dropbox"
                     )
@@ -705,6 +717,7 @@ class DropboxUploaderOperation(Operation):
                 commit = dropbox.files.CommitInfo(path=dbx_filename)
 
                 while True:
+                    file.cancellable.raise_if_cancelled()
                     try:
                         if size - f.tell() <= self.CHUNK_SIZE:
                             md = self._dropbox.files_upload_session_finish(
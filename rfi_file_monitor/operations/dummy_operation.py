@@ -10,7 +10,7 @@ import logging
 from random import random
 
 from ..operation import Operation
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation
 from ..utils.decorators import (
     with_pango_docs,
     supported_filetypes,
@@ -1,10 +1,9 @@
 from __future__ import annotations
 
-import boto3
 import botocore
 
 from ..utils.decorators import supported_filetypes, with_pango_docs
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation, OperationCancelled
 from ..utils.s3 import S3ProgressPercentage, TransferConfig
 from ..files.s3_object import S3Object
 from .s3_uploader import S3UploaderOperation, ALLOWED_OBJECT_ACL_OPTIONS
@@ -28,7 +27,7 @@ class S3CopierOperation(S3UploaderOperation):
         )
 
         client_destination_options = self._get_client_options(self.params)
-        s3_destination_client = boto3.client("s3", **client_destination_options)
+        s3_destination_client = self._get_s3_client(client_destination_options)
 
         # object creation options
         object_acl_options = self._get_dict_acl_options(
@@ -90,6 +89,8 @@ class S3CopierOperation(S3UploaderOperation):
                     Key=file.key,
                     **object_acl_options,
                 )
+        except (OperationCancelled,) + self.CONNECTION_ERRORS:
+            raise
         except Exception as e:
             logger.exception(f"S3UploaderOperation.run exception")
             return str(e)
@@ -4,20 +4,15 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    before_log,
-    after_log,
-    before_sleep_log,
-)
+import botocore
 
 from ..files.s3_object import S3Object
 from ..operation import Operation
 from ..utils.decorators import supported_filetypes, with_pango_docs
-from ..utils import get_random_string, monitor_retry_condition
-from ..utils.exceptions import SkippedOperation
+from ..utils import get_random_string
+from ..core.exceptions import SkippedOperation, OperationCancelled
+from ..core.retry import RetryPolicy
+from ..core.processes import run_cpu_bound
 from ..utils.s3 import calculate_etag, TransferConfig, S3ProgressPercentage
 
 import logging
@@ -31,6 +26,8 @@ logger = logging.getLogger(__name__)
 class S3DownloaderOperation(Operation):
 
     NAME = "S3 Downloader"
+    RETRY_POLICY = RetryPolicy()
+    CONNECTION_ERRORS = (botocore.exceptions.ConnectionError,)
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -84,15 +81,6 @@ class S3DownloaderOperation(Operation):
         temp_filename.write_text("delete me")
         temp_filename.unlink()
 
-    @retry(
-        retry=monitor_retry_condition(),
-        reraise=True,
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(),
-        before=before_log(logger, logging.DEBUG),
-        after=after_log(logger, logging.DEBUG),
-        before_sleep=before_sleep_log(logger, logging.DEBUG),
-    )
     def run(self, file: S3Object):  # type: ignore[override]
 
         s3_client = self.appwindow.active_engine.s3_client
@@ -118,7 +106,7 @@ class S3DownloaderOperation(Operation):
                 # note: for this to work with objects that were initially
                 # uploaded with multipart uploads,
                 # then the upload must have used the same TransferConfig as used in S3UploaderOperation
-                local_etag = calculate_etag(destination)
+                local_etag = run_cpu_bound(calculate_etag, destination)
                 if remote_etag == local_etag:
                     # attach metadata
                     raise SkippedOperation("File has been downloaded already")
@@ -136,6 +124,8 @@ class S3DownloaderOperation(Operation):
                     file, destination, self.index, float(key_size)
                 ),
             )
+        except (OperationCancelled,) + self.CONNECTION_ERRORS:
+            raise
         except Exception as e:
             logger.exception(f"S3UploaderOperation.run exception")
             return f"Could not download {str(destination)}: {str(e)}"
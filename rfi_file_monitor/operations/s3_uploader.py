@@ -7,27 +7,22 @@ from gi.repository import Gtk
 import boto3
 import botocore
 from munch import Munch
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    before_log,
-    after_log,
-    before_sleep_log,
-)
 
 from ..operation import Operation
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation, OperationCancelled
+from ..core.retry import RetryPolicy
+from ..core.processes import run_cpu_bound
 from ..file import File
 from ..files.regular_file import RegularFile
 from ..files.directory import Directory
-from ..utils import query_metadata, monitor_retry_condition
+from ..utils import query_metadata
 from ..utils.decorators import (
     with_pango_docs,
     supported_filetypes,
     add_directory_support,
 )
 from ..utils.s3 import S3ProgressPercentage, TransferConfig, calculate_etag
+from ..core.job import worker_local
 
 import os
 import logging
@@ -69,6 +64,8 @@ AWS_S3_ENGINE_IGNORE_ME = "rfi-file-monitor-ignore-me"
 @supported_filetypes(filetypes=(RegularFile, Directory))
 class S3UploaderOperation(Operation):
     NAME = "S3 Uploader"
+    RETRY_POLICY = RetryPolicy()
+    CONNECTION_ERRORS = (botocore.exceptions.ConnectionError,)
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -263,6 +260,17 @@ class S3UploaderOperation(Operation):
         client_options["aws_secret_access_key"] = params.secret_key
         return client_options
 
+    @classmethod
+    def _get_s3_client(cls, client_options: dict):
+        # when running in a worker, reuse its client for the next files
+        local = worker_local()
+        if local is None:
+            return boto3.client("s3", **client_options)
+        key = ("s3_client",) + tuple(sorted(client_options.items()))
+        if key not in local:
+            local[key] = boto3.client("s3", **client_options)
+        return local[key]
+
     @classmethod
     def _preflight_check(
         cls,
@@ -424,15 +432,6 @@ class S3UploaderOperation(Operation):
         self._preflight_cleanup(success, self, self.params)
 
     @classmethod
-    @retry(
-        retry=monitor_retry_condition(),
-        reraise=True,
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(),
-        before=before_log(logger, logging.DEBUG),
-        after=after_log(logger, logging.DEBUG),
-        before_sleep=before_sleep_log(logger, logging.DEBUG),
-    )
     def _run(
         cls,
         file: File,
@@ -441,7 +440,7 @@ class S3UploaderOperation(Operation):
         operation_index: int,
     ):
         client_options = cls._get_client_options(params)
-        s3_client = boto3.client("s3", **client_options)
+        s3_client = cls._get_s3_client(client_options)
 
         # object creation options
         object_acl_options = cls._get_dict_acl_options(
@@ -463,6 +462,8 @@ class S3UploaderOperation(Operation):
                 Bucket=params.bucket_name,
                 Key=key,
             )
+        except cls.CONNECTION_ERRORS:
+            raise
         except botocore.exceptions.ClientError as e:
             # key not found, which is fine
             if int(e.response["Error"]["Code"]) != 404:
@@ -474,7 +475,7 @@ class S3UploaderOperation(Operation):
                 remote_etag = response["ETag"][
                     1:-1
                 ]  # get rid of those extra quotes
-                local_etag = calculate_etag(file.filename)
+                local_etag = run_cpu_bound(calculate_etag, file.filename)
                 if remote_etag == local_etag:
                     # attach metadata
                     cls._attach_metadata(
@@ -508,6 +509,8 @@ class S3UploaderOperation(Operation):
                     Key=key,
                     **object_acl_options,
                 )
+        except (OperationCancelled,) + cls.CONNECTION_ERRORS:
+            raise
         except Exception as e:
             logger.exception(f"S3UploaderOperation.run exception")
             del s3_client
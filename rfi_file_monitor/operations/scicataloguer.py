@@ -12,6 +12,7 @@ from pathlib import PurePath, Path, PurePosixPath
 from pyscicat.client import ScicatClient
 from pyscicat.model import Dataset, RawDataset, DerivedDataset
 import logging
+import requests
 from urllib.parse import urlparse
 from typing import Dict, Optional, List
 from ..version import __version__ as core_version
@@ -23,6 +24,10 @@ logger = logging.getLogger(__name__)
 @with_pango_docs(filename="scicataloguer.pango")
 class SciCataloguer(Operation):
     NAME = "SciCataloguer"
+    CONNECTION_ERRORS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -473,9 +478,13 @@ class SciCataloguer(Operation):
                     username=params.username,
                     password=params.password,
                 )
+            except self.CONNECTION_ERRORS:
+                raise
             except Exception as e:
                 raise Exception(f"Could not login to scicat: {e}")
             self.upsert_payload(payload, scicat_session)
+        except self.CONNECTION_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Scicataloger.run exception")
         else:
@@ -602,6 +611,8 @@ class SciCataloguer(Operation):
             r = scicat_session.upload_dataset(payload)
             if r:
                 logger.info(f"Payload catalogued, PID: {r}")
+        except self.CONNECTION_ERRORS:
+            raise
         except Exception as e:
             raise Exception(f"Could not catalogue payload in scicat: {e}")
 
@@ -4,21 +4,14 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 import paramiko
 from munch import Munch
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    before_log,
-    after_log,
-    before_sleep_log,
-)
 
 from ..operation import Operation
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation, OperationCancelled
+from ..core.retry import RetryPolicy
 from ..file import File
 from ..files.regular_file import RegularFile
 from ..files.directory import Directory
-from ..utils import monitor_retry_condition
+from ..core.job import worker_local
 from ..utils.decorators import (
     with_pango_docs,
     supported_filetypes,
@@ -31,8 +24,10 @@ import tempfile
 from pathlib import PurePosixPath, Path
 import stat
 import posixpath
-from typing import List
+import socket
+from typing import List, Iterator
 from threading import RLock
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +37,14 @@ logger = logging.getLogger(__name__)
 class SftpUploaderOperation(Operation):
 
     NAME = "SFTP Uploader"
+    RETRY_POLICY = RetryPolicy()
+    CONNECTION_ERRORS = (
+        paramiko.SSHException,
+        EOFError,
+        ConnectionError,
+        socket.timeout,
+        socket.gaierror,
+    )
 
     def __init__(self, *args, **kwargs):
         Operation.__init__(self, *args, **kwargs)
@@ -526,15 +529,6 @@ class SftpUploaderOperation(Operation):
         }
 
     @classmethod
-    @retry(
-        retry=monitor_retry_condition(),
-        reraise=True,
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(),
-        before=before_log(logger, logging.DEBUG),
-        after=after_log(logger, logging.DEBUG),
-        before_sleep=before_sleep_log(logger, logging.DEBUG),
-    )
     def _run(
         cls,
         file: File,
@@ -544,15 +538,7 @@ class SftpUploaderOperation(Operation):
         processed_dirs_lock: RLock,
     ):
         try:
-            with paramiko.Transport(
-                (params.hostname, int(params.port))
-            ) as transport:
-
-                transport.connect(
-                    username=params.username,
-                    password=params.password,
-                )
-
+            with sftp_transport(params) as transport:
                 with paramiko.SFTPClient.from_transport(
                     transport
                 ) as sftp_client:
@@ -618,7 +604,7 @@ class SftpUploaderOperation(Operation):
                             rel_filename, int(params.file_chmod_octal, base=8)
                         )
                     remote_filename_full = sftp_client.normalize(rel_filename)
-        except SkippedOperation:
+        except (SkippedOperation, OperationCancelled) + cls.CONNECTION_ERRORS:
             raise
         except Exception as e:
             logger.exception(f"SftpUploaderOperation.run exception")
@@ -648,6 +634,8 @@ class SftpProgressPercentage(object):
         self._operation_index = operation_index
 
     def __call__(self, bytes_so_far: int, bytes_total: int):
+        # aborts the transfer when the file was modified or deleted
+        self._file.cancellable.raise_if_cancelled()
         percentage = (bytes_so_far / bytes_total) * 100
         if int(percentage) > self._last_percentage:
             self._last_percentage = int(percentage)
@@ -656,6 +644,49 @@ class SftpProgressPercentage(object):
             )
 
 
+@contextmanager
+def sftp_transport(params: Munch) -> Iterator[paramiko.Transport]:
+    """
+    Yields a connected transport. When called from within a worker,
+    the transport is kept open and reused for the next files.
+    """
+    local = worker_local()
+    key = (
+        "sftp_transport",
+        params.hostname,
+        int(params.port),
+        params.username,
+    )
+    transport = local.get(key) if local is not None else None
+
+    if transport is None or not transport.is_active():
+        transport = paramiko.Transport((params.hostname, int(params.port)))
+        try:
+            transport.connect(
+                username=params.username,
+                password=params.password,
+            )
+        except Exception:
+            transport.close()
+            raise
+        if local is not None:
+            local[key] = transport
+
+    try:
+        yield transport
+    except SkippedOperation:
+        raise
+    except Exception:
+        # the connection may be broken, so don't reuse it
+        if local is not None:
+            local.pop(key, None)
+        transport.close()
+        raise
+    finally:
+        if local is None:
+            transport.close()
+
+
 # the following methods have been inspired by pysftp
 def isdir(sftp_client: paramiko.SFTPClient, remotepath: str):
     try:
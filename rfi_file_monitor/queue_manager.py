@@ -5,39 +5,74 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib, GObject
 
-from typing import OrderedDict as OrderedDictType
-from typing import Final, List, Union, Sequence, Optional
-from collections import OrderedDict
-from threading import RLock
+from typing import (
+    Final,
+    Union,
+    Sequence,
+    Optional,
+    Dict,
+    List,
+    Tuple,
+    Iterable,
+)
+import hashlib
+import json
 import logging
 import os
-from time import time
-from dataclasses import dataclass, astuple as dc_astuple
+from dataclasses import dataclass, fields, astuple as dc_astuple
+from enum import Enum, auto
+from threading import Lock
 
 from .file import FileStatus, File
-from .job import Job
-from .utils.exceptions import AlreadyRunning, NotYetRunning
+from .core.events import QueueObserver
+from .core.journal import Journal
+from .core.exceptions import AlreadyRunning, NotYetRunning
+from .core.metrics import QueueMetrics
+from .core.queue import QueueCore, QueueSettings
+from .core.scheduling import SCHEDULING_POLICIES
+from .core.profiling import Profiler
+from .core.tracing import Tracer
 from .utils.widgetparams import WidgetParams
 
 logger = logging.getLogger(__name__)
 
 
-class QueueManager(WidgetParams, Gtk.Grid):
+class QueueManager(WidgetParams, QueueObserver, Gtk.Grid):
+    """
+    The options of the queue, and the link between the QueueCore
+    that does the actual work, and the files table of the window.
+    The QueueManager observes the core, and forwards its events
+    to the GUI thread to update the table.
+    """
+
     MAX_JOBS = (
         len(getattr(os, "sched_getaffinity")(0))
         if hasattr(os, "sched_getaffinity")
         else os.cpu_count()
     )
 
+    # the adaptive mode is not limited by the number of CPUs,
+    # as most operations spend their time waiting for the network
+    MAX_ADAPTIVE_JOBS = 256
+
     NAME = "Queue Manager"
 
     def __init__(self, appwindow):
         self._appwindow = appwindow
         self._running = False
-        self._files_dict_lock = RLock()
-        self._files_dict: OrderedDictType[str, File] = OrderedDict()
-        self._jobs_list: Final[List[Job]] = list()
-        self._njobs_running: int = 0
+        self._core: Optional[QueueCore] = None
+        self._tracer: Optional[Tracer] = None
+        self._profiler: Optional[Profiler] = None
+        # only accessed from the GUI thread
+        self._row_references: Final[Dict[str, Gtk.TreeRowReference]] = dict()
+        # table updates waiting to be flushed
+        self._updates_lock = Lock()
+        self._pending_rows: List[Tuple[_RowUpdate, File]] = list()
+        self._pending_status: Dict[str, Tuple[File, FileStatus]] = dict()
+        self._pending_operation_status: Dict[
+            Tuple[str, int], Tuple[File, FileStatus, Optional[str]]
+        ] = dict()
+        self._pending_progress: Dict[str, Tuple[File, int, float]] = dict()
 
         kwargs = dict(
             halign=Gtk.Align.FILL,
@@ -203,6 +238,242 @@ class QueueManager(WidgetParams, Gtk.Grid):
         )
         max_threads_grid.attach(max_threads_spinbutton, 1, 0, 1, 1)
 
+        # Give each operation its own threads
+        staged_pipeline_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(
+            staged_pipeline_grid, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+        staged_pipeline_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Run each operation with its own threads, queueing at most",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "staged_pipeline_active",
+            desensitized=True,
+        )
+        staged_pipeline_grid.attach(staged_pipeline_checkbutton, 0, 0, 1, 1)
+        staged_pipeline_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1, upper=1000, value=4, page_size=0, step_increment=1
+                ),
+                value=4,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "staged_pipeline_inbox_size",
+            desensitized=True,
+        )
+        staged_pipeline_grid.attach(staged_pipeline_spinbutton, 1, 0, 1, 1)
+        staged_pipeline_grid.attach(
+            Gtk.Label(label="files per operation"), 2, 0, 1, 1
+        )
+
+        # Adjust the number of threads while running
+        adaptive_concurrency_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(
+            adaptive_concurrency_grid, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+        adaptive_concurrency_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Adjust the number of threads automatically, between",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "adaptive_concurrency_active",
+            desensitized=True,
+        )
+        adaptive_concurrency_grid.attach(
+            adaptive_concurrency_checkbutton, 0, 0, 1, 1
+        )
+        adaptive_concurrency_min_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=self.MAX_ADAPTIVE_JOBS,
+                    value=1,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=1,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "adaptive_concurrency_min",
+            desensitized=True,
+        )
+        adaptive_concurrency_grid.attach(
+            adaptive_concurrency_min_spinbutton, 1, 0, 1, 1
+        )
+        adaptive_concurrency_grid.attach(Gtk.Label(label="and"), 2, 0, 1, 1)
+        adaptive_concurrency_max_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=self.MAX_ADAPTIVE_JOBS,
+                    value=32,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=32,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "adaptive_concurrency_max",
+            desensitized=True,
+        )
+        adaptive_concurrency_grid.attach(
+            adaptive_concurrency_max_spinbutton, 3, 0, 1, 1
+        )
+        # the minimum may not exceed the maximum
+        for spinbutton in (
+            adaptive_concurrency_min_spinbutton,
+            adaptive_concurrency_max_spinbutton,
+        ):
+            spinbutton.connect(
+                "value-changed",
+                self._bounds_changed_cb,
+                adaptive_concurrency_min_spinbutton,
+                adaptive_concurrency_max_spinbutton,
+                0,
+            )
+        # shows the latest decision while running
+        self._adaptive_concurrency_label = Gtk.Label(
+            label="",
+            halign=Gtk.Align.START,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+        )
+        adaptive_concurrency_grid.attach(
+            self._adaptive_concurrency_label, 0, 1, 4, 1
+        )
+
+        # Run CPU-bound operations in separate processes
+        process_pool_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(process_pool_grid, 0, self.options_child_row_counter, 1, 1)
+        self.options_child_row_counter += 1
+        process_pool_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Run CPU-intensive operations in at most",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "process_pool_active",
+            desensitized=True,
+        )
+        process_pool_grid.attach(process_pool_checkbutton, 0, 0, 1, 1)
+        process_pool_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=self.MAX_JOBS,
+                    value=self.MAX_JOBS,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=self.MAX_JOBS,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "process_pool_size",
+            desensitized=True,
+        )
+        process_pool_grid.attach(process_pool_spinbutton, 1, 0, 1, 1)
+        process_pool_grid.attach(
+            Gtk.Label(label="separate processes"), 2, 0, 1, 1
+        )
+
+        self._add_horizontal_separator()
+
+        # Select the order in which queued files are processed
+        scheduling_policy_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(
+            scheduling_policy_grid, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+        scheduling_policy_grid.attach(
+            Gtk.Label(
+                label="Process queued files in order of",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            0,
+            1,
+            1,
+        )
+        scheduling_policy_combobox = Gtk.ComboBoxText(
+            halign=Gtk.Align.START,
+            valign=Gtk.Align.CENTER,
+            hexpand=False,
+            vexpand=False,
+        )
+        for policy_name in SCHEDULING_POLICIES:
+            scheduling_policy_combobox.append_text(policy_name)
+        scheduling_policy_combobox.set_active(0)
+        self.register_widget(
+            scheduling_policy_combobox,
+            "scheduling_policy",
+            desensitized=True,
+        )
+        scheduling_policy_grid.attach(scheduling_policy_combobox, 1, 0, 1, 1)
+
         self._add_horizontal_separator()
 
         # Remove from list after n minutes
@@ -264,175 +535,633 @@ class QueueManager(WidgetParams, Gtk.Grid):
         remove_from_list_status_promotion_grid.attach(
             Gtk.Label(label="minutes"), 2, 0, 1, 1
         )
+        remove_failed_from_list_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Also remove failed files",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "remove_failed_from_list_active",
+            desensitized=True,
+        )
+        remove_from_list_status_promotion_grid.attach(
+            remove_failed_from_list_checkbutton, 3, 0, 1, 1
+        )
 
-    def _add_horizontal_separator(self):
-        self.attach(
-            Gtk.Separator(
-                orientation=Gtk.Orientation.HORIZONTAL,
-                halign=Gtk.Align.FILL,
+        self._add_horizontal_separator()
+
+        # Limit the number of removed files that are remembered
+        archive_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(archive_grid, 0, self.options_child_row_counter, 1, 1)
+        self.options_child_row_counter += 1
+        archive_grid.attach(
+            Gtk.Label(
+                label="Remember at most",
+                halign=Gtk.Align.START,
                 valign=Gtk.Align.CENTER,
-                hexpand=True,
-                vexpand=True,
+                hexpand=False,
+                vexpand=False,
             ),
             0,
-            self.options_child_row_counter,
+            0,
             1,
             1,
         )
-        self.options_child_row_counter += 1
-
-    @GObject.Property(type=bool, default=False)
-    def running(self):
-        return self._running
-
-    def _add_to_model(self, file: File):
-        # add new entry to model
-        outputrow = OutputRow(
-            relative_filename=str(file.relative_filename),
-            creation_timestamp=file.created,
-            status=int(file.status),
-            operation_name="All",
+        archive_max_files_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=0,
+                    upper=10000000,
+                    value=100000,
+                    page_size=0,
+                    step_increment=1000,
+                ),
+                value=100000,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=5,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "archive_max_files",
+            desensitized=True,
         )
-        iter = self._appwindow._files_tree_model.append(
-            parent=None, row=dc_astuple(outputrow)
+        archive_grid.attach(archive_max_files_spinbutton, 1, 0, 1, 1)
+        archive_grid.attach(
+            Gtk.Label(label="removed files, using at most"), 2, 0, 1, 1
         )
-        _row_reference = Gtk.TreeRowReference.new(
-            self._appwindow._files_tree_model,
-            self._appwindow._files_tree_model.get_path(iter),
+        archive_max_memory_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1, upper=4096, value=64, page_size=0, step_increment=1
+                ),
+                value=64,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=5,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "archive_max_memory",
+            desensitized=True,
         )
+        archive_grid.attach(archive_max_memory_spinbutton, 3, 0, 1, 1)
+        archive_grid.attach(Gtk.Label(label="MB"), 4, 0, 1, 1)
 
-        # create its children, one for each operation
-        for _operation in self._appwindow._operations_box:
-            outputrow = OutputRow(
-                relative_filename="",
-                creation_timestamp=0,
-                status=int(FileStatus.QUEUED),
-                operation_name=_operation.NAME,
-            )
-            self._appwindow._files_tree_model.append(
-                parent=iter, row=dc_astuple(outputrow)
-            )
-
-        file.row_reference = _row_reference
-
-    def add(self, file_or_files: Union[File, Sequence[File]]):
-        """Add one or more new files to the queue. Call from the GUI thread!"""
-
-        if not self._running:
-            raise NotYetRunning(
-                "The queue manager needs to be started before it can be stopped."
-            )
-
-        if isinstance(file_or_files, File):
-            file_paths = [file_or_files]
-        else:
-            file_paths = list(file_or_files)
-
-        with self._files_dict_lock:
-            for _file in file_paths:
-                if not isinstance(_file, File):
-                    raise TypeError(f"{str(_file)} must be a File object")
+        self._add_horizontal_separator()
 
-                file_path = _file.filename
+        # Pause the engine when too many files are waiting
+        admission_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(admission_grid, 0, self.options_child_row_counter, 1, 1)
+        self.options_child_row_counter += 1
+        admission_grid.attach(
+            Gtk.Label(
+                label="Pause adding files when",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            0,
+            1,
+            1,
+        )
+        admission_high_water_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1000,
+                    upper=10000000,
+                    value=50000,
+                    page_size=0,
+                    step_increment=1000,
+                ),
+                value=50000,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1000,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "admission_high_water",
+            desensitized=True,
+        )
+        admission_grid.attach(admission_high_water_spinbutton, 1, 0, 1, 1)
+        admission_grid.attach(
+            Gtk.Label(label="files are waiting, resume at"), 2, 0, 1, 1
+        )
+        admission_low_water_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=0,
+                    upper=10000000,
+                    value=10000,
+                    page_size=0,
+                    step_increment=1000,
+                ),
+                value=10000,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1000,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "admission_low_water",
+            desensitized=True,
+        )
+        admission_grid.attach(admission_low_water_spinbutton, 3, 0, 1, 1)
+        # keep the low-water mark below the high-water mark
+        for spinbutton in (
+            admission_high_water_spinbutton,
+            admission_low_water_spinbutton,
+        ):
+            spinbutton.connect(
+                "value-changed",
+                self._bounds_changed_cb,
+                admission_low_water_spinbutton,
+                admission_high_water_spinbutton,
+                1,
+            )
+        admission_grid.attach(
+            Gtk.Label(
+                label="Add the files found by the engine in batches of",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            1,
+            1,
+            1,
+        )
+        admission_batch_size_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=100000,
+                    value=1000,
+                    page_size=0,
+                    step_increment=100,
+                ),
+                value=1000,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=100,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "admission_batch_size",
+            desensitized=True,
+        )
+        admission_grid.attach(admission_batch_size_spinbutton, 1, 1, 1, 1)
+        admission_grid.attach(
+            Gtk.Label(label="files", halign=Gtk.Align.START), 2, 1, 1, 1
+        )
+        spill_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Instead of pausing, keep the files that are waiting on disk",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=True,
+                vexpand=False,
+            ),
+            "spill_active",
+            desensitized=True,
+        )
+        admission_grid.attach(spill_checkbutton, 0, 2, 4, 1)
+
+        self._add_horizontal_separator()
+
+        # Stop sending files to an endpoint that cannot be reached
+        circuit_breaker_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(
+            circuit_breaker_grid, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+        circuit_breaker_grid.attach(
+            Gtk.Label(
+                label="Hold back the files of an operation after",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            0,
+            1,
+            1,
+        )
+        circuit_breaker_threshold_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=0,
+                    upper=1000,
+                    value=5,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=5,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "circuit_breaker_threshold",
+            desensitized=True,
+        )
+        circuit_breaker_grid.attach(
+            circuit_breaker_threshold_spinbutton, 1, 0, 1, 1
+        )
+        circuit_breaker_grid.attach(
+            Gtk.Label(label="connection failures, and try again every"),
+            2,
+            0,
+            1,
+            1,
+        )
+        circuit_breaker_timeout_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=3600,
+                    value=30,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=30,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=5,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "circuit_breaker_timeout",
+            desensitized=True,
+        )
+        circuit_breaker_grid.attach(
+            circuit_breaker_timeout_spinbutton, 3, 0, 1, 1
+        )
+        circuit_breaker_grid.attach(Gtk.Label(label="seconds"), 4, 0, 1, 1)
+
+        self._add_horizontal_separator()
+
+        # Keep a journal to resume processing after a restart
+        journal_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Keep a journal to resume processing after a restart",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=True,
+                vexpand=False,
+            ),
+            "journal_active",
+            desensitized=True,
+        )
+        self.attach(
+            journal_checkbutton, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+
+        self._add_horizontal_separator()
+
+        # Export metrics
+        metrics_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+            row_spacing=5,
+        )
+        self.attach(metrics_grid, 0, self.options_child_row_counter, 1, 1)
+        self.options_child_row_counter += 1
+        metrics_http_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Serve metrics in the Prometheus format on localhost port",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "metrics_http_active",
+            desensitized=True,
+        )
+        metrics_grid.attach(metrics_http_checkbutton, 0, 0, 1, 1)
+        metrics_http_port_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1024,
+                    upper=65535,
+                    value=9464,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=9464,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "metrics_http_port",
+            desensitized=True,
+        )
+        metrics_grid.attach(metrics_http_port_spinbutton, 1, 0, 1, 1)
+        metrics_jsonl_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Write the metrics to a JSON lines file every",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "metrics_jsonl_active",
+            desensitized=True,
+        )
+        metrics_grid.attach(metrics_jsonl_checkbutton, 0, 1, 1, 1)
+        metrics_jsonl_interval_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1,
+                    upper=3600,
+                    value=60,
+                    page_size=0,
+                    step_increment=1,
+                ),
+                value=60,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=10,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "metrics_jsonl_interval",
+            desensitized=True,
+        )
+        metrics_grid.attach(metrics_jsonl_interval_spinbutton, 1, 1, 1, 1)
+        metrics_grid.attach(Gtk.Label(label="seconds"), 2, 1, 1, 1)
+        tracing_checkbutton = self.register_widget(
+            Gtk.CheckButton(
+                label="Record when each file goes through each stage, for exporting as a trace",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "tracing_active",
+            desensitized=True,
+        )
+        metrics_grid.attach(tracing_checkbutton, 0, 2, 3, 1)
 
-                if file_path in self._files_dict:
-                    logger.info(
-                        f"{file_path} has been recreated! Calling saved..."
-                    )
-                    self.saved(file_path)
-                    continue
+        self._add_horizontal_separator()
 
-                if _file.status == FileStatus.CREATED:
-                    logger.info(f"New file {file_path} created")
-                elif _file.status == FileStatus.SAVED:
-                    logger.info(f"Adding existing file {file_path}")
-                    _file.saved = time()
-                else:
-                    raise NotImplementedError(
-                        "Newly created files must have CREATED or SAVED as status!"
-                    )
+        # Limit the rate at which the table is updated
+        gui_update_rate_grid = Gtk.Grid(
+            halign=Gtk.Align.FILL,
+            valign=Gtk.Align.CENTER,
+            hexpand=True,
+            vexpand=False,
+            column_spacing=5,
+        )
+        self.attach(
+            gui_update_rate_grid, 0, self.options_child_row_counter, 1, 1
+        )
+        self.options_child_row_counter += 1
+        gui_update_rate_grid.attach(
+            Gtk.Label(
+                label="Refresh the table at most",
+                halign=Gtk.Align.START,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            0,
+            0,
+            1,
+            1,
+        )
+        gui_update_rate_spinbutton = self.register_widget(
+            Gtk.SpinButton(
+                adjustment=Gtk.Adjustment(
+                    lower=1, upper=60, value=10, page_size=0, step_increment=1
+                ),
+                value=10,
+                update_policy=Gtk.SpinButtonUpdatePolicy.IF_VALID,
+                numeric=True,
+                climb_rate=1,
+                halign=Gtk.Align.CENTER,
+                valign=Gtk.Align.CENTER,
+                hexpand=False,
+                vexpand=False,
+            ),
+            "gui_update_rate",
+            desensitized=True,
+        )
+        gui_update_rate_grid.attach(gui_update_rate_spinbutton, 1, 0, 1, 1)
+        gui_update_rate_grid.attach(
+            Gtk.Label(label="times per second"), 2, 0, 1, 1
+        )
+
+    def _add_horizontal_separator(self):
+        self.attach(
+            Gtk.Separator(
+                orientation=Gtk.Orientation.HORIZONTAL,
+                halign=Gtk.Align.FILL,
+                valign=Gtk.Align.CENTER,
+                hexpand=True,
+                vexpand=True,
+            ),
+            0,
+            self.options_child_row_counter,
+            1,
+            1,
+        )
+        self.options_child_row_counter += 1
 
-                self._add_to_model(_file)
+    @GObject.Property(type=bool, default=False)
+    def running(self):
+        return self._running
+
+    @property
+    def core(self) -> Optional[QueueCore]:
+        """The QueueCore that is processing the files while running"""
+        return self._core
+
+    @property
+    def njobs_running(self) -> int:
+        if self._core is None:
+            return 0
+        return self._core.njobs_running
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        """The traces of the files of the current or the previous run"""
+        return self._tracer
+
+    @property
+    def metrics(self) -> Optional[QueueMetrics]:
+        """The metrics of the current run, if these are collected"""
+        if self._core is None:
+            return None
+        return self._core.metrics
+
+    @property
+    def profiler(self) -> Optional[Profiler]:
+        """The profiles of the operations of the current or the previous run"""
+        return self._profiler
+
+    def compact_journal(self) -> Optional[Tuple[str, int]]:
+        """
+        Removes the records of files that no longer exist from the journal
+        of the current pipeline. Returns the path of the journal and the number
+        of removed records, or None if there is no journal.
+        May be called from any thread, but not while the queue is running.
+        """
+        if self._running:
+            raise AlreadyRunning(
+                "The journal cannot be compacted while the queue manager is running"
+            )
+        path = self._get_journal_path()
+        if not os.path.exists(path):
+            return None
+        return path, Journal.compact(path)
+
+    def add(self, file_or_files: Union[File, Sequence[File]]):
+        """Add one or more new files to the queue. Call from the GUI thread!"""
+
+        if not self._running:
+            raise NotYetRunning(
+                "The queue manager needs to be started before it can be stopped."
+            )
+        self._core.add(file_or_files)
+
+    def admit(self, files: Iterable[File]) -> bool:
+        """
+        Add files to the queue in batches, blocking while the backlog
+        of the queue is too large. Must be called from a thread other than
+        the GUI thread, such as the thread of an engine.
+        Returns False if not all files were added, because the queue
+        or the calling thread were stopped.
+        """
+        core = self._core
+        if core is None:
+            return False
+        return core.admit(files)
 
-                self._files_dict[file_path] = _file
+    @property
+    def backlog(self) -> int:
+        """The number of files that have not been processed yet"""
+        if self._core is None:
+            return 0
+        return self._core.backlog
 
     def saved(self, file_path: Union[str, Sequence[str]]):
-        """Call when the engine detected that the file(s) have been saved (again).vMust be called from the GUI thread!"""
+        """Call when the engine detected that the file(s) have been saved (again). Must be called from the GUI thread!"""
 
         if not self._running:
             raise NotYetRunning(
                 "The queue manager needs to be started before it can be stopped."
             )
+        self._core.saved(file_path)
 
-        if isinstance(file_path, str):
-            file_paths = [file_path]
-        else:
-            file_paths = list(file_path)
-
-        with self._files_dict_lock:
-            for file_path in file_paths:
-                try:
-                    file = self._files_dict[file_path]
-                except KeyError:
-                    logger.warning(
-                        f"{file_path} has not been created yet! Ignoring..."
-                    )
-                    continue
-
-                if file.status == FileStatus.SAVED:
-                    # looks like this file has been saved again!
-                    # update saved timestamp
-                    logger.info(f"File {file_path} has been saved again")
-                    file.saved = time()
-                elif file.status == FileStatus.CREATED:
-                    logger.info(f"File {file_path} has been saved")
-                    file.status = FileStatus.SAVED
-                    file.saved = time()
-                    path = file.row_reference.get_path()
-                    self._appwindow._files_tree_model[path][2] = int(
-                        FileStatus.SAVED
-                    )
-                elif file.status == FileStatus.QUEUED:
-                    # file hasn't been processed yet, so it's safe to demote it to SAVED
-                    logger.info(
-                        f"File {file_path} has been saved again while queued"
-                    )
-                    file.status = FileStatus.SAVED
-                    path = file.row_reference.get_path()
-                    self._appwindow._files_tree_model[path][2] = int(
-                        FileStatus.SAVED
-                    )
-                elif file.status in (
-                    FileStatus.RUNNING,
-                    FileStatus.SUCCESS,
-                    FileStatus.FAILURE,
-                ):
-                    # file is currently being processed or has been processed -> mark it for being requeued
-                    logger.info(
-                        f"File {file_path} has been saved again while {str(file.status)}"
-                    )
-                    file.requeue = True
-                elif file.status is FileStatus.REMOVED_FROM_LIST:
-                    # file has already been removed from the list!!
-                    logger.info(
-                        f"File {file_path} was removed from list but is now back!"
-                    )
-                    file.requeue = True
-                    self._add_to_model(file)
-                else:
-                    logger.info(
-                        f"File {file_path} has been saved again after it was queued for processing!!"
-                    )
+    def completed(self, file_path: Union[str, Sequence[str]]):
+        """Call when the engine detected that the file(s) have been closed after writing. Must be called from the GUI thread!"""
 
-    def start(self):
-        if self._running:
-            raise AlreadyRunning(
-                "The queue manager is already running. It needs to be stopped before it may be restarted"
+        if not self._running:
+            raise NotYetRunning(
+                "The queue manager needs to be started before files can be completed."
             )
+        self._core.completed(file_path)
 
+    def deleted(self, file_path: Union[str, Sequence[str]]):
+        """Call when the engine detected that the file(s) have been deleted. Must be called from the GUI thread!"""
+
+        if not self._running:
+            raise NotYetRunning(
+                "The queue manager needs to be started before files can be deleted."
+            )
+        self._core.deleted(file_path)
+
+    def _get_settings(self) -> QueueSettings:
+        settings = QueueSettings(
+            **{
+                field.name: self.params[field.name]
+                for field in fields(QueueSettings)
+                if field.name in self.params
+            }
+        )
+        if self.params.journal_active:
+            settings.journal_path = self._get_journal_path()
+            settings.journal_fingerprint = self._get_pipeline_fingerprint()
+        if self.params.metrics_jsonl_active:
+            settings.metrics_jsonl_path = self._get_metrics_path()
+        settings.completion_rules = (
+            self._appwindow._active_engine.get_completion_rules()
+        )
+        return settings
+
+    def start(self):
+        self._core = QueueCore(
+            list(self._appwindow._operations_box), self._get_settings()
+        )
+        self._core.add_observer(self)
+        self._core.start()
+        self._tracer = self._core.tracer
+        self._profiler = self._core.profiler
+        if self._core.metrics is not None:
+            self._core.metrics.add_gauge(
+                "gui_update_backlog",
+                "The number of table updates that are waiting to be flushed",
+                lambda: self.update_backlog,
+            )
         self._running = True
         self._timeout_id = GLib.timeout_add_seconds(
-            1, self._files_dict_timeout_cb, priority=GLib.PRIORITY_DEFAULT
+            1, self._status_bar_timeout_cb, priority=GLib.PRIORITY_DEFAULT
+        )
+        self._flush_timeout_id = GLib.timeout_add(
+            int(1000 / self.params.gui_update_rate),
+            self._flush_updates_timeout_cb,
+            priority=GLib.PRIORITY_DEFAULT,
         )
         self.notify("running")
 
@@ -443,135 +1172,347 @@ class QueueManager(WidgetParams, Gtk.Grid):
             )
 
         GLib.source_remove(self._timeout_id)
-        with self._files_dict_lock:
-            self._files_dict.clear()
-            self._njobs_running = 0
-        for job in self._jobs_list:
-            job.should_exit = True
-        self._jobs_list.clear()
+        # running jobs will finish early, after which their workers exit
+        self._core.stop()
+        self._core.remove_observer(self)
+        GLib.source_remove(self._flush_timeout_id)
+        self._flush_updates_timeout_cb()
+        self._core = None
+        self._row_references.clear()
+        self._adaptive_concurrency_label.props.label = ""
+        for operation in self._appwindow._operations_box:
+            operation.update_circuit_breaker(None)
 
         self._running = False
         self.notify("running")
 
-    def _files_dict_timeout_cb(self, *user_data):
+    def _get_pipeline_fingerprint(self) -> str:
+        pipeline = [
+            dict(name=operation.NAME, params=operation.exportable_params)
+            for operation in self._appwindow._operations_box
+        ]
+        return hashlib.sha256(
+            json.dumps(pipeline, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _get_journal_path(self) -> str:
         """
-        This function runs every second, and will take action based on the status of all files in the dict
-        It runs in the GUI thread, so GUI updates are allowed here.
+        The journal is stored next to the YAML configuration file if
+        there is one, or in the user data folder otherwise.
         """
-        with self._files_dict_lock:
-            status_counters = {
-                FileStatus.CREATED: 0,
-                FileStatus.SAVED: 0,
-                FileStatus.QUEUED: 0,
-                FileStatus.RUNNING: 0,
-                FileStatus.SUCCESS: 0,
-                FileStatus.FAILURE: 0,
-                FileStatus.REMOVED_FROM_LIST: 0,
-            }
-            for _filename, _file in self._files_dict.items():
-                if _file.status == FileStatus.CREATED:
-                    if (
-                        self.params.created_status_promotion_active
-                        and (time() - _file.created)
-                        > self.params.created_status_promotion_delay
-                    ):
-                        # promote to SAVED!
-                        _file.status = FileStatus.SAVED
-                        _file.saved = time()
-                        path = _file.row_reference.get_path()
-                        self._appwindow._files_tree_model[path][2] = int(
-                            FileStatus.SAVED
-                        )
-                        logger.info(f"Promoting {_filename} to SAVED")
-
-                elif _file.status == FileStatus.SAVED:
-                    if (
-                        time() - _file.saved
-                    ) > self.params.saved_status_promotion_delay:
-                        # queue the job
-                        logger.info(
-                            f"Adding {_filename} to queue for future processing"
-                        )
-                        _file.status = FileStatus.QUEUED
-                        path = _file.row_reference.get_path()
-                        self._appwindow._files_tree_model[path][2] = int(
-                            _file.status
-                        )
-
-                elif _file.status == FileStatus.QUEUED:
-                    if self._njobs_running < self.params.max_threads:
-                        # try and launch a new job
-                        logger.info(f"Launching queued job for {_filename}")
-                        job = Job(self, _file)
-                        self._jobs_list.append(job)
-                        job.start()
-                        self._njobs_running += 1
-
-                elif _file.requeue and _file.status in (
-                    FileStatus.SUCCESS,
-                    FileStatus.FAILURE,
-                    FileStatus.REMOVED_FROM_LIST,
-                ):
-                    # demote to saved so it gets requeued
-                    _file.requeue = False
-                    _file.status = FileStatus.SAVED
-                    _file.saved = time()
-                    _file.succeeded = 0
-                    _file.operation_metadata.clear()
-                    path = _file.row_reference.get_path()
-                    iter = self._appwindow._files_tree_model.get_iter(path)
-                    self._appwindow._files_tree_model[iter][2] = int(
-                        FileStatus.SAVED
-                    )
-                    self._appwindow._files_tree_model[iter][4] = 0.0
-                    self._appwindow._files_tree_model[iter][5] = "0.0 %"
-                    self._appwindow._files_tree_model[iter][6] = None
-                    self._appwindow._files_tree_model[iter][7] = ""
-
-                    for child in self._appwindow._files_tree_model[
-                        iter
-                    ].iterchildren():
-                        child[2] = int(FileStatus.QUEUED)
-                        child[4] = 0.0
-                        child[5] = "0.0 %"
-                        child[6] = None
-                        child[7] = ""
-
-                    logger.info(f"Requeuing {_filename}")
-
-                elif _file.status == FileStatus.SUCCESS:
-                    if (
-                        self.params.remove_from_list_status_promotion_active
-                        and (
-                            (time() - _file.succeeded)
-                            > (
-                                60
-                                * self.params.remove_from_list_status_promotion_delay
-                            )
-                        )
-                    ):
-
-                        path = _file.row_reference.get_path()
-
-                        # update status
-                        _file.status = FileStatus.REMOVED_FROM_LIST
-                        # remove from table
-                        del self._appwindow._files_tree_model[path]
-
-                status_counters[_file.status] += 1
-
-            # update status bar
+        yaml_file = self._appwindow._yaml_file
+        if yaml_file:
+            return os.path.splitext(yaml_file)[0] + ".journal.sqlite"
+        return os.path.join(
+            GLib.get_user_data_dir(),
+            "rfi-file-monitor",
+            f"journal-{self._get_pipeline_fingerprint()[:16]}.sqlite",
+        )
+
+    def _get_metrics_path(self) -> str:
+        """The metrics are stored next to the journal"""
+        yaml_file = self._appwindow._yaml_file
+        if yaml_file:
+            return os.path.splitext(yaml_file)[0] + ".metrics.jsonl"
+        return os.path.join(
+            GLib.get_user_data_dir(),
+            "rfi-file-monitor",
+            f"metrics-{self._get_pipeline_fingerprint()[:16]}.jsonl",
+        )
+
+    # QueueObserver methods: these may be called from any thread.
+    # Rather than scheduling an idle callback for every event,
+    # the latest state of each row is stored in a buffer,
+    # which is flushed into the table by a timer in the GUI thread.
+
+    def file_added(self, file: File):
+        with self._updates_lock:
+            self._pending_rows.append((_RowUpdate.ADD, file))
+
+    def file_status_changed(
+        self, file: File, old_status: FileStatus, new_status: FileStatus
+    ):
+        with self._updates_lock:
+            if new_status == FileStatus.REMOVED_FROM_LIST:
+                self._discard_updates(file.filename)
+                self._pending_rows.append((_RowUpdate.REMOVE, file))
+            else:
+                self._pending_status[file.filename] = (file, new_status)
+
+    def file_requeued(self, file: File):
+        with self._updates_lock:
+            self._discard_updates(file.filename)
+            self._pending_rows.append((_RowUpdate.RESET, file))
+
+    def operation_status_changed(
+        self,
+        file: File,
+        index: int,
+        status: FileStatus,
+        message: Optional[str] = None,
+    ):
+        # called from the workers, which may still be running
+        # after the queue was stopped from the GUI thread
+        core = self._core
+        if index >= 0 and status == FileStatus.RUNNING and core is not None:
+            self._appwindow.props.application.google_analytics_context.send_event(
+                "RUN-OPERATION", core.operations[index].NAME
+            )
+        with self._updates_lock:
+            self._pending_operation_status[(file.filename, index)] = (
+                file,
+                status,
+                message,
+            )
+
+    def operation_progress_changed(self, file: File, index: int, value: float):
+        with self._updates_lock:
+            # only the most recent value matters, also for the parent row
+            self._pending_progress.pop(file.filename, None)
+            self._pending_progress[file.filename] = (file, index, value)
+
+    def _discard_updates(self, filename: str):
+        """Forget the updates of a row that is about to be removed or reset. Call with the lock held"""
+        self._pending_status.pop(filename, None)
+        self._pending_progress.pop(filename, None)
+        for key in [
+            key for key in self._pending_operation_status if key[0] == filename
+        ]:
+            del self._pending_operation_status[key]
+
+    @property
+    def update_backlog(self) -> int:
+        """The number of table updates that are waiting to be flushed"""
+        with self._updates_lock:
+            return (
+                len(self._pending_rows)
+                + len(self._pending_status)
+                + len(self._pending_operation_status)
+                + len(self._pending_progress)
+            )
+
+    def _bounds_changed_cb(
+        self,
+        spinbutton: Gtk.SpinButton,
+        lower_spinbutton: Gtk.SpinButton,
+        upper_spinbutton: Gtk.SpinButton,
+        gap: int,
+    ):
+        # keeps the upper bound at least gap above the lower bound.
+        # The value that was changed wins, also when loading the params
+        lower = lower_spinbutton.get_value()
+        upper = upper_spinbutton.get_value()
+        if upper - lower >= gap:
+            return
+        if spinbutton is upper_spinbutton:
+            lower_spinbutton.set_value(upper - gap)
+        else:
+            upper_spinbutton.set_value(lower + gap)
+
+    def _flush_updates_timeout_cb(self, *user_data):
+        with self._updates_lock:
+            rows = self._pending_rows
+            status = self._pending_status
+            operation_status = self._pending_operation_status
+            progress = self._pending_progress
+            self._pending_rows = list()
+            self._pending_status = dict()
+            self._pending_operation_status = dict()
+            self._pending_progress = dict()
+
+        # rows must be added, removed and reset in the order the events came in
+        for update, file in rows:
+            if update == _RowUpdate.ADD:
+                self._add_to_model(file)
+            elif update == _RowUpdate.REMOVE:
+                self._remove_from_model(file)
+            else:
+                self._reset_model(file)
+
+        for file, _status in status.values():
+            self._update_model_status(file, _status)
+
+        for (_, index), (file, _status, message) in operation_status.items():
+            self._update_model_operation_status(file, index, _status, message)
+
+        for file, index, value in progress.values():
+            self._update_model_progress(file, index, value)
+
+        return GLib.SOURCE_CONTINUE
+
+    def _get_row_iter(self, file: File) -> Optional[Gtk.TreeIter]:
+        row_reference = self._row_references.get(file.filename)
+        if row_reference is None or not row_reference.valid():
+            logger.debug(f"{file.filename} is not in the table")
+            return None
+        model = row_reference.get_model()
+        return model.get_iter(row_reference.get_path())
+
+    def _add_to_model(self, file: File):
+        # add new entry to model
+        outputrow = OutputRow(
+            relative_filename=str(file.relative_filename),
+            creation_timestamp=file.created,
+            status=int(file.status),
+            operation_name="All",
+        )
+        iter = self._appwindow._files_tree_model.append(
+            parent=None, row=dc_astuple(outputrow)
+        )
+        self._row_references[file.filename] = Gtk.TreeRowReference.new(
+            self._appwindow._files_tree_model,
+            self._appwindow._files_tree_model.get_path(iter),
+        )
+
+        # create its children, one for each operation
+        for _operation in self._appwindow._operations_box:
+            outputrow = OutputRow(
+                relative_filename="",
+                creation_timestamp=0,
+                status=int(FileStatus.QUEUED),
+                operation_name=_operation.NAME,
+            )
+            self._appwindow._files_tree_model.append(
+                parent=iter, row=dc_astuple(outputrow)
+            )
+
+    def _remove_from_model(self, file: File):
+        iter = self._get_row_iter(file)
+        if iter is None:
+            return
+
+        self._appwindow._files_tree_model.remove(iter)
+        del self._row_references[file.filename]
+
+    def _update_model_status(self, file: File, status: FileStatus):
+        iter = self._get_row_iter(file)
+        if iter is None:
+            return
+
+        self._appwindow._files_tree_model[iter][2] = int(status)
+
+    def _reset_model(self, file: File):
+        iter = self._get_row_iter(file)
+        if iter is None:
+            return
+
+        model = self._appwindow._files_tree_model
+        model[iter][2] = int(FileStatus.SAVED)
+        model[iter][4] = 0.0
+        model[iter][5] = "0.0 %"
+        model[iter][6] = None
+        model[iter][7] = ""
+
+        for child in model[iter].iterchildren():
+            child[2] = int(FileStatus.QUEUED)
+            child[4] = 0.0
+            child[5] = "0.0 %"
+            child[6] = None
+            child[7] = ""
+
+    def _update_model_operation_status(
+        self, file: File, index: int, status: FileStatus, message
+    ):
+        iter = self._get_row_iter(file)
+        if iter is None:
+            return
+
+        model = self._appwindow._files_tree_model
+        if index >= 0:
+            iter = model.iter_nth_child(iter, index)
+
+        model[iter][2] = int(status)
+
+        # When the operation succeeds, ensure that the progressbars go
+        # to 100 %, which is necessary when the operation doesnt
+        # do any progress updated (which would be unfortunate!)
+        if status == FileStatus.SUCCESS:
+            model[iter][4] = 100.0
+            model[iter][5] = "100.0 %"
+        elif status == FileStatus.FAILURE:
+            model[iter][6] = "red"
+            model[iter][7] = GLib.markup_escape_text(message)
+        elif status == FileStatus.SKIPPED:
+            model[iter][6] = "grey"
+            model[iter][7] = GLib.markup_escape_text(message)
+        elif status == FileStatus.QUEUED and message:
+            # the operation failed, and will be retried
+            model[iter][6] = "orange"
+            model[iter][7] = GLib.markup_escape_text(message)
+        elif status == FileStatus.RUNNING and index >= 0:
+            model[iter][6] = None
+            model[iter][7] = ""
+
+    def _update_model_progress(self, file: File, index: int, value: float):
+        parent_iter = self._get_row_iter(file)
+        if parent_iter is None:
+            return
+
+        model = self._appwindow._files_tree_model
+        n_children = model.iter_n_children(parent_iter)
+
+        cumul_value = (index * 100.0 + value) / n_children
+        model[parent_iter][4] = cumul_value
+        model[parent_iter][5] = f"{cumul_value:.1f} %"
+
+        child_iter = model.iter_nth_child(parent_iter, index)
+        model[child_iter][4] = value
+        model[child_iter][5] = f"{value:.1f} %"
+
+    def _status_bar_timeout_cb(self, *user_data):
+        """
+        This function runs every second in the GUI thread,
+        and updates the status bar with the number of files per status.
+        """
+        status_counts = self._core.get_status_counts()
+        narchived = self._core.narchived
+        nspilled = self._core.nspilled
+
+        self._appwindow._status_grid.get_child_at(
+            0, 0
+        ).props.label = (
+            f"Total: {sum(status_counts.values()) + narchived + nspilled}"
+        )
+        for _index, _status in enumerate(STATUS_BAR_STATUSES, start=1):
             self._appwindow._status_grid.get_child_at(
-                0, 0
-            ).props.label = f"Total: {len(self._files_dict)}"
-            for _status, _counter in status_counters.items():
-                self._appwindow._status_grid.get_child_at(
-                    int(_status), 0
-                ).props.label = f"{str(_status)}: {_counter}"
+                _index, 0
+            ).props.label = f"{str(_status)}: {status_counts[_status]}"
+        self._appwindow._status_grid.get_child_at(
+            len(STATUS_BAR_STATUSES) + 1, 0
+        ).props.label = f"Archived: {narchived}"
+        self._appwindow._status_grid.get_child_at(
+            len(STATUS_BAR_STATUSES) + 2, 0
+        ).props.label = f"On disk: {nspilled}"
+
+        for operation, breaker in zip(
+            self._appwindow._operations_box, self._core.circuit_breakers
+        ):
+            operation.update_circuit_breaker(breaker)
+
+        if self._core.concurrency is not None:
+            decision = self._core.concurrency.last_decision
+            if decision is not None:
+                self._adaptive_concurrency_label.props.label = f"Currently using {decision.size} threads: {decision.reason}"
 
         return GLib.SOURCE_CONTINUE
 
 
+class _RowUpdate(Enum):
+    ADD = auto()
+    REMOVE = auto()
+    RESET = auto()
+
+
+STATUS_BAR_STATUSES: Final[Sequence[FileStatus]] = (
+    FileStatus.CREATED,
+    FileStatus.SAVED,
+    FileStatus.QUEUED,
+    FileStatus.RUNNING,
+    FileStatus.SUCCESS,
+    FileStatus.FAILURE,
+)
+
+
 @dataclass
 class OutputRow:
     relative_filename: str
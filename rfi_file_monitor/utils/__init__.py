@@ -16,19 +16,24 @@ from typing import (
     List,
     Iterable,
     Union,
-    Set,
 )
 import logging
-from pathlib import Path, PurePath
+from pathlib import Path
 import hashlib
 import os
 import platform
-from threading import Thread, current_thread
+from threading import current_thread
 import time
 import string
 import random
 
-from .exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation
+from ..core.utils import (
+    ExitableThread,
+    PatternMatcher,
+    match_path,
+    _get_common_patterns,
+)
 
 # bump this number when the yaml layout changes!
 MONITOR_YAML_VERSION = 2
@@ -234,54 +239,6 @@ class LongTaskWindow(Gtk.Window):
         self._label.set_markup(text)
 
 
-class ExitableThread(Thread):
-    def __init__(self):
-        super().__init__()
-        self._should_exit: bool = False
-
-    @property
-    def should_exit(self):
-        return self._should_exit
-
-    @should_exit.setter
-    def should_exit(self, value: bool):
-        self._should_exit = value
-
-
-def _get_common_patterns(
-    included_patterns: List[str],
-    excluded_patterns: List[str],
-    case_sensitive: bool,
-) -> Set[str]:
-    if not case_sensitive:
-        included_patterns = [x.lower() for x in included_patterns] + [
-            x.upper() for x in included_patterns
-        ]
-        excluded_patterns = [x.lower() for x in excluded_patterns] + [
-            x.upper() for x in excluded_patterns
-        ]
-    return set(included_patterns).intersection(excluded_patterns)
-
-
-def match_path(
-    path: PurePath,
-    included_patterns: List[str],
-    excluded_patterns: List[str],
-    case_sensitive: bool = True,
-) -> bool:
-    common_patterns = _get_common_patterns(
-        included_patterns, excluded_patterns, case_sensitive
-    )
-
-    if common_patterns:
-        raise ValueError(
-            f"conflicting patterns `{common_patterns}` included and excluded"
-        )
-    return any(path.match(p) for p in included_patterns) and not any(
-        path.match(p) for p in excluded_patterns
-    )
-
-
 class OperationListBox(Gtk.ListBox):
     """Derive from Gtk.ListBox to ensure we iterate over the ListBoxRow children"""
 
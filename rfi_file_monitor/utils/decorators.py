@@ -5,7 +5,7 @@ from gi.repository import Gio
 
 from ..engine_advanced_settings import EngineAdvancedSettings
 from ..engine import Engine
-from ..utils.exceptions import SkippedOperation
+from ..core.exceptions import SkippedOperation
 from ..file import File, FileStatus
 from ..files.regular_file import RegularFile, WeightedRegularFile
 from ..files.directory import Directory
@@ -167,8 +167,8 @@ def add_directory_support(run: Callable[[Operation, File], Optional[str]]):
                     offset,
                     weight,
                 )
-                # reuse the row_reference to ensure the progress bars are updated
-                _file.row_reference = file.row_reference
+                # report progress through the directory
+                _file.parent = file
 
                 # run the wrapped method, and do the usual exception and return value handling
                 try:
@@ -1,10 +1,7 @@
-class SkippedOperation(Exception):
-    pass
-
-
-class AlreadyRunning(Exception):
-    pass
-
-
-class NotYetRunning(Exception):
-    pass
+# kept for backwards compatibility: the exceptions are now part of the core
+from ..core.exceptions import (
+    SkippedOperation,
+    OperationCancelled,
+    AlreadyRunning,
+    NotYetRunning,
+)
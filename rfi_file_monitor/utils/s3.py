@@ -58,6 +58,8 @@ class S3ProgressPercentage(object):
         self._operation_index = operation_index
 
     def __call__(self, bytes_amount):
+        # aborts the transfer when the file was modified or deleted
+        self._file.cancellable.raise_if_cancelled()
         # To simplify, assume this is hooked up to a single filename
         self._seen_so_far += bytes_amount
         percentage = (self._seen_so_far / self._size) * 100
@@ -13,9 +13,41 @@ from rfi_file_monitor.operations.dropbox_uploader import (
 from rfi_file_monitor.files.regular_file import RegularFile
 from rfi_file_monitor.file import FileStatus
 from rfi_file_monitor.files.directory import Directory
+from rfi_file_monitor.files.s3_object import S3Object
+from rfi_file_monitor.core.archive import FileArchive
+from rfi_file_monitor.core.breaker import BreakerState, CircuitBreaker
+from rfi_file_monitor.core.completion import CompletionMode, CompletionRules
+from rfi_file_monitor.core.concurrency import AdaptiveConcurrency
+from rfi_file_monitor.core.debounce import EventDebouncer
+from rfi_file_monitor.core.events import QueueObserver
+from rfi_file_monitor.core.job import WorkerPool
+from rfi_file_monitor.core.journal import Journal, get_file_signature
+from rfi_file_monitor.core.poll import DirectoryPoller
+from rfi_file_monitor.core.processes import ProcessPool
+from rfi_file_monitor.core.queue import QueueCore, QueueSettings
+from rfi_file_monitor.core.retry import RetryPolicy
+from rfi_file_monitor.core.scan import DirectoryScanner
+from rfi_file_monitor.core.spill import SpillQueue
+from rfi_file_monitor.core.utils import PatternMatcher, match_path
+from rfi_file_monitor.queue_manager import QueueManager
+from rfi_file_monitor.core.scheduling import (
+    FIFOPolicy,
+    ShortestFirstPolicy,
+    OldestDeadlineFirstPolicy,
+    FairSharePolicy,
+    ReadyQueue,
+)
 from pathlib import Path, PurePath, PurePosixPath
 from datetime import datetime
 from typing import Dict
+from threading import Event, Semaphore, Thread, enumerate as enumerate_threads
+from time import monotonic, sleep
+import io
+import json
+import pickle
+import pstats
+import shutil
+import tempfile
 import os
 
 
@@ -288,3 +320,1266 @@ class TestPayloadGeneration(TestCase):
             raw_payload.sourceFolderHost,
             "https://cryo-em1-test-em-expt-14s3.s3.testinstitute.ac.uk",
         )
+
+
+class TestSchedulingPolicies(TestCase):
+    @staticmethod
+    def _s3_object(key: str, size: int) -> S3Object:
+        return S3Object(
+            filename=f"https://bucket.s3.amazonaws.com/{key}",
+            relative_filename=PurePosixPath(key),
+            created=0,
+            status=FileStatus.QUEUED,
+            bucket_name="bucket",
+            etag="",
+            size=size,
+        )
+
+    def test_fifo(self):
+        policy = FIFOPolicy()
+        files = [self._s3_object(f"file{i}", 0) for i in range(3)]
+        for file in files:
+            policy.push(file)
+        self.assertTrue(policy.remove(files[1]))
+        self.assertFalse(policy.remove(files[1]))
+        self.assertEqual(len(policy), 2)
+        self.assertIs(policy.pop(), files[0])
+        self.assertIs(policy.pop(), files[2])
+        self.assertRaises(IndexError, policy.pop)
+
+    def test_shortest_first(self):
+        policy = ShortestFirstPolicy()
+        large = self._s3_object("large", 50 * 1024**3)
+        small = self._s3_object("small", 1024)
+        policy.push(large)
+        policy.push(small)
+        self.assertIs(policy.pop(), small)
+        self.assertIs(policy.pop(), large)
+
+    def test_oldest_deadline_first(self):
+        policy = OldestDeadlineFirstPolicy(delay=5)
+        files = [self._s3_object(f"file{i}", 1024) for i in range(3)]
+        for file, saved in zip(files, (10, 20, 30)):
+            file.saved = saved
+        # its retry is due after the others were promoted
+        files[0].retry_at = 40
+        for file in files:
+            policy.push(file)
+        self.assertEqual(
+            [policy.pop() for _ in range(3)], files[1:] + files[:1]
+        )
+
+    def test_fair_share(self):
+        policy = FairSharePolicy()
+        busy = [self._s3_object(f"busy/file{i}", 1024) for i in range(10)]
+        quiet = self._s3_object("quiet/file", 1024)
+        for file in busy:
+            policy.push(file)
+        policy.push(quiet)
+        # the quiet folder should not have to wait for the busy one
+        popped = [policy.pop() for _ in range(2)]
+        self.assertIn(quiet, popped)
+
+    def test_ready_queue_sizes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = list()
+            for name, size in (("large", 4096), ("small", 16), ("gone", 8)):
+                path = os.path.join(tmpdir, name)
+                with open(path, "wb") as f:
+                    f.write(b"0" * size)
+                files.append(
+                    RegularFile(path, PurePath(name), 0, FileStatus.QUEUED)
+                )
+            large, small, gone = files
+            ready_queue = ReadyQueue(ShortestFirstPolicy())
+            for file in files:
+                ready_queue.put(file)
+            # the size is only checked by the workers
+            self.assertIsNone(small.size_hint)
+            self.assertTrue(ready_queue.remove(gone))
+            self.assertEqual(len(ready_queue), 2)
+            self.assertIs(ready_queue.get(timeout=1), small)
+            self.assertEqual(small.size_hint, 16)
+            self.assertIs(ready_queue.get(timeout=1), large)
+            self.assertIsNone(ready_queue.get(timeout=0.01))
+
+    def test_ready_queue_size_hints(self):
+        ready_queue = ReadyQueue(ShortestFirstPolicy())
+        ready_queue.STAT_CHUNK_SIZE = 1
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = list()
+            for name, size in (("first", 64), ("second", 32)):
+                path = os.path.join(tmpdir, name)
+                with open(path, "wb") as f:
+                    f.write(b"0" * size)
+                files.append(
+                    RegularFile(path, PurePath(name), 0, FileStatus.QUEUED)
+                )
+            # this one does not exist, so its size can only come from the hint
+            hinted = RegularFile(
+                os.path.join(tmpdir, "hinted"),
+                PurePath("hinted"),
+                0,
+                FileStatus.QUEUED,
+            )
+            hinted.size_hint = 16
+            files.append(hinted)
+            first, second = files[:2]
+            for file in files:
+                ready_queue.put(file)
+            # only one file gets checked before a file is handed out
+            self.assertIs(ready_queue.get(timeout=1), hinted)
+            self.assertEqual(first.size_hint, 64)
+            self.assertIsNone(second.size_hint)
+            self.assertIs(ready_queue.get(timeout=1), second)
+            self.assertIs(ready_queue.get(timeout=1), first)
+            self.assertIsNone(ready_queue.get(timeout=0.01))
+
+
+class TestFileArchive(TestCase):
+    def test_restore(self):
+        archive = FileArchive(max_files=10, max_bytes=1024 * 1024)
+        file = S3Object(
+            filename="https://bucket.s3.amazonaws.com/dir/file",
+            relative_filename=PurePosixPath("dir/file"),
+            created=1,
+            status=FileStatus.REMOVED_FROM_LIST,
+            bucket_name="bucket",
+            etag="abc",
+            size=1024,
+            region_name="eu-west-2",
+        )
+        archive.add(file)
+        self.assertIn(file.filename, archive)
+        restored = archive.pop(file.filename).restore(
+            file.filename, FileStatus.SAVED
+        )
+        self.assertNotIn(file.filename, archive)
+        self.assertEqual(archive.nbytes, 0)
+        self.assertIsInstance(restored, S3Object)
+        self.assertEqual(restored.relative_filename, file.relative_filename)
+        self.assertEqual(restored.key, file.key)
+        self.assertEqual(restored.size, file.size)
+        self.assertEqual(restored.region_name, file.region_name)
+        self.assertEqual(restored.status, FileStatus.SAVED)
+
+    def test_eviction(self):
+        archive = FileArchive(max_files=2, max_bytes=1024 * 1024)
+        files = [
+            RegularFile(
+                filename=os.path.join(TEST_DIR, f"file{i}"),
+                relative_filename=PurePath(f"file{i}"),
+                created=0,
+                status=FileStatus.REMOVED_FROM_LIST,
+            )
+            for i in range(3)
+        ]
+        for file in files:
+            archive.add(file)
+        self.assertEqual(len(archive), 2)
+        self.assertNotIn(files[0].filename, archive)
+        self.assertIn(files[2].filename, archive)
+
+
+class _TestOperation:
+    NAME = "Test Operation"
+
+    def run(self, file):
+        if file.filename.endswith("bad"):
+            return "bad file"
+        return None
+
+
+class _FinishedObserver(QueueObserver):
+    def __init__(self, nfiles: int):
+        self.statuses: Dict[str, FileStatus] = dict()
+        self.finished = Event()
+        self._nfiles = nfiles
+
+    def file_status_changed(self, file, old_status, new_status):
+        if new_status in (FileStatus.SUCCESS, FileStatus.FAILURE):
+            self.statuses[file.filename] = new_status
+            if len(self.statuses) == self._nfiles:
+                self.finished.set()
+
+
+def _admit_from_thread(core: QueueCore, files) -> bool:
+    # engines add their files from their own threads
+    results = list()
+    thread = Thread(target=lambda: results.append(core.admit(files)))
+    thread.start()
+    thread.join(10)
+    return results == [True]
+
+
+class TestQueueCore(TestCase):
+    def _process(self, settings: QueueSettings):
+        core = QueueCore([_TestOperation(), _TestOperation()], settings)
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}",
+                        PurePath(name),
+                        0,
+                        FileStatus.SAVED,
+                    )
+                    for name in ("good", "bad")
+                ]
+            )
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(observer.statuses["/tmp/good"], FileStatus.SUCCESS)
+        self.assertEqual(observer.statuses["/tmp/bad"], FileStatus.FAILURE)
+
+    def test_deadlines(self):
+        promoted = list()
+        all_promoted = Event()
+
+        class _PromotionObserver(QueueObserver):
+            def file_status_changed(self, file, old_status, new_status):
+                if new_status == FileStatus.SAVED:
+                    promoted.append(file.filename)
+                    if len(promoted) == 3:
+                        all_promoted.set()
+
+        core = QueueCore(
+            [_TestOperation()],
+            QueueSettings(
+                created_status_promotion_active=True,
+                created_status_promotion_delay=60,
+                saved_status_promotion_delay=3600,
+            ),
+        )
+        core.add_observer(_PromotionObserver())
+        core.start()
+        try:
+            # created long ago, so their deadlines have expired already
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}",
+                        PurePath(name),
+                        created,
+                        FileStatus.CREATED,
+                    )
+                    for name, created in (("c", 30), ("a", 10), ("b", 20))
+                ]
+            )
+            self.assertTrue(all_promoted.wait(10))
+            self.assertEqual(promoted, ["/tmp/a", "/tmp/b", "/tmp/c"])
+            self.assertEqual(core.get_status_counts()[FileStatus.SAVED], 3)
+
+            core.deleted("/tmp/a")
+            counts = core.get_status_counts()
+            self.assertEqual(counts[FileStatus.SAVED], 2)
+            self.assertEqual(counts[FileStatus.FAILURE], 1)
+
+            # requeued
+            core.saved("/tmp/a")
+            counts = core.get_status_counts()
+            self.assertEqual(counts[FileStatus.SAVED], 3)
+            self.assertEqual(counts[FileStatus.FAILURE], 0)
+            self.assertEqual(sum(counts.values()), len(core))
+        finally:
+            core.stop()
+
+    def test_admission(self):
+        gate = Event()
+
+        class _GatedOperation:
+            NAME = "Gated Operation"
+
+            def run(self, file):
+                gate.wait(10)
+
+        settings = QueueSettings(
+            saved_status_promotion_delay=0,
+            admission_high_water=2,
+            admission_low_water=0,
+        )
+        core = QueueCore([_GatedOperation()], settings)
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            self.assertTrue(
+                core.admit(
+                    RegularFile(
+                        f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                    )
+                    for name in ("file1", "file2")
+                )
+            )
+            self.assertEqual(core.backlog, 2)
+            self.assertTrue(core.throttled)
+            self.assertFalse(core.wait_for_admission(0.1))
+            gate.set()
+            self.assertTrue(observer.finished.wait(10))
+            self.assertTrue(core.wait_for_admission(10))
+            self.assertEqual(core.backlog, 0)
+        finally:
+            core.stop()
+
+    def test_admit_batches(self):
+        gate = Event()
+
+        class _GatedOperation:
+            NAME = "Gated Operation"
+
+            def run(self, file):
+                gate.wait(10)
+
+        core = QueueCore(
+            [_GatedOperation()],
+            QueueSettings(saved_status_promotion_delay=0),
+        )
+        core.ADMISSION_BATCH_INTERVAL = 0.1
+        observer = _FinishedObserver(5)
+        core.add_observer(observer)
+        backlogs = list()
+
+        def _files():
+            for index in range(5):
+                backlogs.append(core.backlog)
+                yield RegularFile(
+                    f"/tmp/file{index}",
+                    PurePath(f"file{index}"),
+                    0,
+                    FileStatus.SAVED,
+                )
+                if index == 2:
+                    sleep(0.2)
+
+        core.start()
+        try:
+            self.assertTrue(core.admit(_files(), batch_size=2))
+            gate.set()
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        # a full batch of two, then file2 on its own, as it waited too long
+        self.assertEqual(backlogs, [0, 0, 2, 2, 3])
+
+    def test_spill(self):
+        gate = Event()
+
+        class _GatedOperation:
+            NAME = "Gated Operation"
+
+            def run(self, file):
+                gate.wait(10)
+
+        tmpdir = tempfile.TemporaryDirectory()
+        settings = QueueSettings(
+            saved_status_promotion_delay=0,
+            admission_high_water=2,
+            admission_low_water=0,
+            spill_active=True,
+            # the spilled files are looked up from the spill thread
+            journal_path=os.path.join(tmpdir.name, "journal.sqlite"),
+        )
+        core = QueueCore([_GatedOperation()], settings)
+        observer = _FinishedObserver(5)
+        core.add_observer(observer)
+        core.start()
+        try:
+            # this must not block
+            self.assertTrue(
+                core.admit(
+                    (
+                        RegularFile(
+                            f"/tmp/file{i}",
+                            PurePath(f"file{i}"),
+                            0,
+                            FileStatus.SAVED,
+                        )
+                        for i in range(5)
+                    ),
+                    batch_size=1,
+                )
+            )
+            self.assertEqual(core.backlog, 2)
+            self.assertEqual(core.nspilled, 3)
+            gate.set()
+            self.assertTrue(observer.finished.wait(10))
+            self.assertEqual(core.nspilled, 0)
+        finally:
+            core.stop()
+            tmpdir.cleanup()
+
+    def test_admission_settings(self):
+        with self.assertRaises(ValueError):
+            QueueSettings(admission_high_water=100, admission_low_water=100)
+
+    def test_adaptive_concurrency_settings(self):
+        with self.assertRaises(ValueError):
+            QueueSettings(
+                adaptive_concurrency_active=True,
+                adaptive_concurrency_min=8,
+                adaptive_concurrency_max=4,
+            )
+
+    def test_retry(self):
+        attempts: Dict[str, int] = dict()
+
+        class _FlakyOperation:
+            NAME = "Flaky Operation"
+            RETRY_POLICY = RetryPolicy(max_attempts=3, initial_delay=0.05)
+
+            def run(self, file):
+                attempts[file.filename] = attempts.get(file.filename, 0) + 1
+                if (
+                    file.filename.endswith("broken")
+                    or attempts[file.filename] < 3
+                ):
+                    return "temporary error"
+                return None
+
+        core = QueueCore(
+            [_TestOperation(), _FlakyOperation()],
+            QueueSettings(saved_status_promotion_delay=0),
+        )
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                    )
+                    for name in ("good", "broken")
+                ]
+            )
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(observer.statuses["/tmp/good"], FileStatus.SUCCESS)
+        self.assertEqual(observer.statuses["/tmp/broken"], FileStatus.FAILURE)
+        self.assertEqual(attempts, {"/tmp/good": 3, "/tmp/broken": 3})
+
+    def test_cancel(self):
+        runs: Dict[str, int] = dict()
+        started = Semaphore(0)
+
+        class _SlowOperation:
+            NAME = "Slow Operation"
+
+            def run(self, file):
+                runs[file.filename] = runs.get(file.filename, 0) + 1
+                if runs[file.filename] > 1:
+                    return None
+                started.release()
+                while True:
+                    file.cancellable.raise_if_cancelled()
+                    sleep(0.01)
+
+        core = QueueCore(
+            [_SlowOperation()],
+            QueueSettings(saved_status_promotion_delay=0, max_threads=2),
+        )
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                    )
+                    for name in ("saved", "deleted")
+                ]
+            )
+            self.assertTrue(started.acquire(timeout=10))
+            self.assertTrue(started.acquire(timeout=10))
+            core.saved("/tmp/saved")
+            core.deleted("/tmp/deleted")
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(observer.statuses["/tmp/saved"], FileStatus.SUCCESS)
+        self.assertEqual(observer.statuses["/tmp/deleted"], FileStatus.FAILURE)
+        self.assertEqual(runs, {"/tmp/saved": 2, "/tmp/deleted": 1})
+
+    def test_completion(self):
+        core = QueueCore(
+            [_TestOperation()],
+            QueueSettings(
+                saved_status_promotion_delay=0,
+                completion_rules=CompletionRules.parse(
+                    "*.tif: close, *.h5: stable", stability_interval=3600
+                ),
+            ),
+        )
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                    )
+                    for name in ("image.tif", "data.h5", "notes.txt")
+                ]
+            )
+            core.completed(["/tmp/image.tif", "/tmp/data.h5"])
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(
+            observer.statuses,
+            {
+                "/tmp/image.tif": FileStatus.SUCCESS,
+                "/tmp/notes.txt": FileStatus.SUCCESS,
+            },
+        )
+
+    def test_stability_unchecked(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "data.h5")
+        core = QueueCore(
+            [_TestOperation()],
+            QueueSettings(
+                saved_status_promotion_delay=0,
+                completion_rules=CompletionRules.parse(
+                    "*.h5: stable", stability_interval=0.05
+                ),
+            ),
+        )
+        observer = _FinishedObserver(1)
+        core.add_observer(observer)
+        core.start()
+        try:
+            # files that cannot be checked are not stable
+            core.add(
+                RegularFile(path, PurePath("data.h5"), 0, FileStatus.SAVED)
+            )
+            sleep(0.3)
+            self.assertEqual(core.get_status_counts()[FileStatus.SAVED], 1)
+            with open(path, "wb") as f:
+                f.write(b"0" * 16)
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(observer.statuses, {path: FileStatus.SUCCESS})
+
+    def test_completion_rules(self):
+        rules = CompletionRules.parse("data/*.H5: close; *.h5: stable")
+        self.assertEqual(
+            rules.get_mode("/tmp/data/run.h5"), CompletionMode.CLOSE
+        )
+        self.assertEqual(rules.get_mode("/tmp/RUN.h5"), CompletionMode.STABLE)
+        self.assertEqual(rules.get_mode("/tmp/run.tif"), CompletionMode.DELAY)
+        self.assertRaises(ValueError, CompletionRules.parse, "*.h5")
+
+    def test_metrics(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "metrics.jsonl")
+            core = QueueCore(
+                [_TestOperation(), _TestOperation()],
+                QueueSettings(
+                    saved_status_promotion_delay=0, metrics_jsonl_path=path
+                ),
+            )
+            observer = _FinishedObserver(2)
+            core.add_observer(observer)
+            core.start()
+            try:
+                core.add(
+                    [
+                        RegularFile(
+                            f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                        )
+                        for name in ("good", "bad")
+                    ]
+                )
+                self.assertTrue(observer.finished.wait(10))
+                text = core.metrics.to_prometheus()
+            finally:
+                core.stop()
+            with open(path) as f:
+                snapshot = json.loads(f.readlines()[-1])
+        self.assertIn('rfi_file_monitor_files{status="success"} 1', text)
+        self.assertEqual(snapshot["succeeded"], 1)
+        self.assertEqual(snapshot["failed"], 1)
+        self.assertEqual(snapshot["latency"]["count"], 2)
+        # the second operation did not run on the bad file
+        self.assertEqual(
+            [operation["succeeded"] for operation in snapshot["operations"]],
+            [1, 1],
+        )
+        self.assertEqual(
+            [operation["failed"] for operation in snapshot["operations"]],
+            [1, 0],
+        )
+
+    def test_tracing(self):
+        core = QueueCore(
+            [_TestOperation(), _TestOperation()],
+            QueueSettings(saved_status_promotion_delay=0, tracing_active=True),
+        )
+        observer = _FinishedObserver(2)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                [
+                    RegularFile(
+                        f"/tmp/{name}", PurePath(name), 0, FileStatus.SAVED
+                    )
+                    for name in ("good", "bad")
+                ]
+            )
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        traces = {trace.filename: trace for trace in core.tracer.traces}
+        self.assertEqual(
+            [event for _, index, event in traces["/tmp/good"].events],
+            [
+                "discovered",
+                FileStatus.SAVED,
+                FileStatus.QUEUED,
+                FileStatus.RUNNING,
+                FileStatus.RUNNING,
+                FileStatus.SUCCESS,
+                FileStatus.RUNNING,
+                FileStatus.SUCCESS,
+                FileStatus.SUCCESS,
+            ],
+        )
+        operations = [
+            event
+            for event in core.tracer.to_chrome_trace()["traceEvents"]
+            if event.get("cat") == "operation"
+        ]
+        # the second operation did not run on the bad file
+        self.assertEqual(len(operations), 3)
+        f = io.StringIO()
+        core.tracer.write_csv(f)
+        self.assertEqual(
+            len(f.getvalue().splitlines()),
+            1 + sum(len(trace.events) for trace in traces.values()),
+        )
+
+    def test_profiling(self):
+        class _SlowOperation:
+            NAME = "Slow Operation"
+            profile = True
+
+            def run(self, file):
+                sleep(0.1)
+
+        core = QueueCore(
+            [_TestOperation(), _SlowOperation()],
+            QueueSettings(saved_status_promotion_delay=0),
+        )
+        observer = _FinishedObserver(1)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(
+                RegularFile("/tmp/good", PurePath("good"), 0, FileStatus.SAVED)
+            )
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        self.assertEqual(
+            [profile.name for profile in core.profiler.profiles],
+            ["Slow Operation"],
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filenames = core.profiler.dump(tmpdir)
+            self.assertEqual(
+                [os.path.basename(filename) for filename in filenames],
+                [
+                    "operation-2-slow-operation.pstats",
+                    "operation-2-slow-operation.collapsed",
+                ],
+            )
+            stats = pstats.Stats(filenames[0])
+            self.assertGreater(stats.total_calls, 0)
+            with open(filenames[1]) as f:
+                self.assertTrue(f.read().startswith("run ("))
+
+    def test_process(self):
+        self._process(QueueSettings(saved_status_promotion_delay=0))
+
+    def test_process_staged(self):
+        self._process(
+            QueueSettings(
+                saved_status_promotion_delay=0, staged_pipeline_active=True
+            )
+        )
+
+    def test_journal_admit_thread(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            core = QueueCore(
+                [_TestOperation()],
+                QueueSettings(
+                    saved_status_promotion_delay=0,
+                    journal_path=os.path.join(tmpdir, "journal.sqlite"),
+                    journal_fingerprint="pipeline",
+                ),
+            )
+            observer = _FinishedObserver(2)
+            core.add_observer(observer)
+            core.start()
+            try:
+                self.assertTrue(
+                    _admit_from_thread(
+                        core,
+                        [
+                            RegularFile(
+                                os.path.join(tmpdir, name),
+                                PurePath(name),
+                                0,
+                                FileStatus.SAVED,
+                            )
+                            for name in ("good", "bad")
+                        ],
+                    )
+                )
+                self.assertTrue(observer.finished.wait(10))
+            finally:
+                core.stop()
+
+    def test_journal_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal_path = os.path.join(tmpdir, "journal.sqlite")
+            paths = [os.path.join(tmpdir, name) for name in ("old", "new")]
+            settings = QueueSettings(
+                saved_status_promotion_delay=0,
+                journal_path=journal_path,
+                journal_fingerprint="pipeline",
+            )
+
+            def _files(names):
+                for name in names:
+                    path = os.path.join(tmpdir, name)
+                    yield RegularFile(path, PurePath(name), 0, FileStatus.SAVED)
+
+            with open(paths[0], "w") as f:
+                f.write("old")
+            core = QueueCore([_TestOperation()], settings)
+            observer = _FinishedObserver(1)
+            core.add_observer(observer)
+            core.start()
+            try:
+                self.assertTrue(_admit_from_thread(core, _files(["old"])))
+                self.assertTrue(observer.finished.wait(10))
+            finally:
+                core.stop()
+
+            # only the new file is added after a restart
+            with open(paths[1], "w") as f:
+                f.write("new")
+            core = QueueCore([_TestOperation()], settings)
+            observer = _FinishedObserver(1)
+            core.add_observer(observer)
+            core.start()
+            try:
+                # the files were looked up by the index already
+                core.journal.lookup = None
+                self.assertTrue(
+                    _admit_from_thread(core, _files(["old", "new"]))
+                )
+                self.assertEqual(core.narchived, 1)
+                self.assertTrue(observer.finished.wait(10))
+                self.assertEqual(len(core), 1)
+            finally:
+                core.stop()
+            self.assertEqual(list(observer.statuses), [paths[1]])
+
+            os.remove(paths[0])
+            self.assertEqual(Journal.compact(journal_path), 1)
+
+
+class _RecordingQueueManager(QueueManager):
+    # records the updates that would be applied to the table
+    def __init__(self):
+        super().__init__(None)
+        self.updates = list()
+
+    def _add_to_model(self, file):
+        self.updates.append(("add", file.filename))
+
+    def _remove_from_model(self, file):
+        self.updates.append(("remove", file.filename))
+
+    def _reset_model(self, file):
+        self.updates.append(("reset", file.filename))
+
+    def _update_model_status(self, file, status):
+        self.updates.append(("status", file.filename, status))
+
+    def _update_model_operation_status(self, file, index, status, message):
+        self.updates.append(("operation", file.filename, index, status))
+
+    def _update_model_progress(self, file, index, value):
+        self.updates.append(("progress", file.filename, index, value))
+
+
+class TestQueueManager(TestCase):
+    def test_coalesce_updates(self):
+        manager = _RecordingQueueManager()
+        file = RegularFile("/tmp/file", PurePath("file"), 0, FileStatus.SAVED)
+        manager.file_added(file)
+        for old_status, new_status in (
+            (FileStatus.SAVED, FileStatus.QUEUED),
+            (FileStatus.QUEUED, FileStatus.RUNNING),
+        ):
+            manager.file_status_changed(file, old_status, new_status)
+        for value in (10.0, 50.0, 90.0):
+            manager.operation_progress_changed(file, 0, value)
+        for status in (FileStatus.QUEUED, FileStatus.SUCCESS):
+            manager.operation_status_changed(file, 0, status)
+        manager._flush_updates_timeout_cb()
+        # one update per row, with the most recent values
+        self.assertEqual(
+            manager.updates,
+            [
+                ("add", "/tmp/file"),
+                ("status", "/tmp/file", FileStatus.RUNNING),
+                ("operation", "/tmp/file", 0, FileStatus.SUCCESS),
+                ("progress", "/tmp/file", 0, 90.0),
+            ],
+        )
+        # nothing left to flush
+        manager.updates.clear()
+        manager._flush_updates_timeout_cb()
+        self.assertEqual(manager.updates, [])
+
+
+class TestJournal(TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self._tmpdir.name, "journal.sqlite")
+        self.path = os.path.join(self._tmpdir.name, "data.txt")
+        with open(self.path, "w") as f:
+            f.write("data")
+        # operation index -> number of runs
+        self.runs: Dict[int, int] = dict()
+        # the index of the operation that fails, if any
+        self.failing = None
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def _file(self) -> RegularFile:
+        return RegularFile(self.path, PurePath("data.txt"), 0, FileStatus.SAVED)
+
+    def _process(self, fingerprint: str = "pipeline") -> FileStatus:
+        test = self
+
+        class _CountingOperation:
+            NAME = "Counting Operation"
+
+            def __init__(self, index: int):
+                self._index = index
+
+            def run(self, file):
+                test.runs[self._index] = test.runs.get(self._index, 0) + 1
+                if self._index == test.failing:
+                    return "failed"
+                return None
+
+        core = QueueCore(
+            [_CountingOperation(0), _CountingOperation(1)],
+            QueueSettings(
+                saved_status_promotion_delay=0,
+                journal_path=self.journal_path,
+                journal_fingerprint=fingerprint,
+            ),
+        )
+        observer = _FinishedObserver(1)
+        core.add_observer(observer)
+        core.start()
+        try:
+            core.add(self._file())
+            self.assertTrue(observer.finished.wait(10))
+        finally:
+            core.stop()
+        return observer.statuses[self.path]
+
+    def test_record_lookup(self):
+        journal = Journal(self.journal_path, "pipeline")
+        journal.open()
+        file = self._file()
+        journal.record_status(file)
+        journal.record_started(file, 0)
+        file.operation_metadata[0] = {"key": "value"}
+        journal.record_operation(file, 0, FileStatus.SUCCESS)
+        journal.record_finished(file, True)
+        journal.close()
+
+        journal = Journal(self.journal_path, "pipeline")
+        journal.open()
+        try:
+            entries = journal.lookup([self.path, "/missing"])
+        finally:
+            journal.close()
+        self.assertEqual(list(entries), [self.path])
+        entry = entries[self.path]
+        self.assertTrue(entry.succeeded)
+        self.assertEqual(entry.signature, get_file_signature(file))
+        self.assertEqual(
+            entry.operations, {0: (FileStatus.SUCCESS, {"key": "value"})}
+        )
+
+    def test_resume(self):
+        self.failing = 1
+        self.assertEqual(self._process(), FileStatus.FAILURE)
+        self.assertEqual(self.runs, {0: 1, 1: 1})
+
+        # resumes from the operation that failed
+        self.failing = None
+        self.assertEqual(self._process(), FileStatus.SUCCESS)
+        self.assertEqual(self.runs, {0: 1, 1: 2})
+
+        # not processed again
+        core = QueueCore(
+            [_TestOperation(), _TestOperation()],
+            QueueSettings(
+                journal_path=self.journal_path,
+                journal_fingerprint="pipeline",
+            ),
+        )
+        core.start()
+        try:
+            core.add(self._file())
+            self.assertEqual((len(core), core.narchived), (0, 1))
+        finally:
+            core.stop()
+
+    def test_changed_signature(self):
+        self.assertEqual(self._process(), FileStatus.SUCCESS)
+        with open(self.path, "a") as f:
+            f.write("more data")
+        self.assertEqual(self._process(), FileStatus.SUCCESS)
+        self.assertEqual(self.runs, {0: 2, 1: 2})
+
+    def test_fingerprint_mismatch(self):
+        self.assertEqual(self._process(), FileStatus.SUCCESS)
+        journal = Journal(self.journal_path, "other pipeline")
+        journal.open()
+        try:
+            self.assertEqual(journal.lookup([self.path]), dict())
+        finally:
+            journal.close()
+        self.assertEqual(self._process("other pipeline"), FileStatus.SUCCESS)
+        self.assertEqual(self.runs, {0: 2, 1: 2})
+
+
+class TestCircuitBreaker(TestCase):
+    def test_states(self):
+        breaker = CircuitBreaker("Test Operation", threshold=2, timeout=10)
+        files = [
+            RegularFile(
+                f"/tmp/file{i}", PurePath(f"file{i}"), 0, FileStatus.QUEUED
+            )
+            for i in range(3)
+        ]
+        breaker.record(files[0], unavailable=True, now=0)
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
+        breaker.record(files[1], unavailable=True, now=0)
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+        self.assertFalse(breaker.allow(files[2], now=5))
+        breaker.hold(files[2])
+        self.assertEqual(len(breaker.release(now=5)), 0)
+
+        # a single probe is let through after the timeout
+        self.assertTrue(breaker.allow(files[0], now=10))
+        self.assertEqual(breaker.state, BreakerState.HALF_OPEN)
+        self.assertFalse(breaker.allow(files[1], now=10))
+        breaker.record(files[0], unavailable=True, now=10)
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+        self.assertEqual(breaker.probe_at, 20)
+
+        self.assertTrue(breaker.allow(files[1], now=20))
+        breaker.record(files[1], unavailable=False)
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
+        self.assertEqual(list(breaker.release()), [files[2]])
+
+
+class TestWorkerPool(TestCase):
+    @staticmethod
+    def _wait_for(condition) -> bool:
+        deadline = monotonic() + 10
+        while not condition():
+            if monotonic() > deadline:
+                return False
+            sleep(0.01)
+        return True
+
+    def test_resize(self):
+        threads = set(enumerate_threads())
+
+        def _workers():
+            return [
+                thread
+                for thread in enumerate_threads()
+                if thread not in threads
+            ]
+
+        pool = WorkerPool(None, ReadyQueue(), 2)
+        pool.RETIRE_INTERVAL = 0.05
+        pool.start()
+        self.assertEqual(len(_workers()), 2)
+        pool.resize(4)
+        self.assertEqual(pool.nworkers, 4)
+        self.assertEqual(len(_workers()), 4)
+        # surplus workers exit once they are idle
+        pool.resize(1)
+        self.assertTrue(self._wait_for(lambda: len(_workers()) == 1))
+        self.assertRaises(ValueError, pool.resize, 0)
+        pool.stop()
+        pool.join(10)
+        self.assertEqual(_workers(), [])
+
+    def test_restart(self):
+        threads = set(enumerate_threads())
+        core = QueueCore(
+            [_TestOperation()],
+            QueueSettings(saved_status_promotion_delay=0, max_threads=2),
+        )
+        for _ in range(2):
+            observer = _FinishedObserver(1)
+            core.add_observer(observer)
+            core.start()
+            try:
+                core.add(
+                    RegularFile(
+                        "/tmp/good", PurePath("good"), 0, FileStatus.SAVED
+                    )
+                )
+                self.assertTrue(observer.finished.wait(10))
+            finally:
+                core.stop()
+            core.remove_observer(observer)
+        # the workers exit on their own after the queue was stopped
+        self.assertTrue(
+            self._wait_for(lambda: set(enumerate_threads()) <= threads)
+        )
+
+
+class TestAdaptiveConcurrency(TestCase):
+    def test_aimd(self):
+        ready_queue = ReadyQueue()
+        pool = WorkerPool(None, ready_queue, 2)
+        controller = AdaptiveConcurrency(pool, 1, 4)
+        file = RegularFile("/tmp/file", PurePath("file"), 0, FileStatus.QUEUED)
+
+        # nothing waiting
+        self.assertEqual(controller.update().size, 2)
+
+        # additive increase while files are waiting, up to the ceiling
+        ready_queue.put(file)
+        self.assertEqual(controller.update().size, 3)
+        self.assertEqual(controller.update().size, 4)
+        self.assertEqual(controller.update().size, 4)
+        self.assertEqual(pool.size, 4)
+
+        # multiplicative decrease when the latency goes up
+        for delay in (0, 0.1):
+            controller.operation_status_changed(file, 0, FileStatus.RUNNING)
+            sleep(delay)
+            controller.operation_status_changed(file, 0, FileStatus.SUCCESS)
+            decision = controller.update()
+        self.assertEqual(decision.size, 3)
+        self.assertEqual(pool.size, 3)
+
+
+class TestEventDebouncer(TestCase):
+    def test_coalesce(self):
+        reported = list()
+        debouncer = EventDebouncer(reported.append, window=0.05)
+        debouncer.start()
+        try:
+            for _ in range(100):
+                debouncer.add("/tmp/a")
+                debouncer.add("/tmp/b")
+            debouncer.add("/tmp/c")
+            debouncer.discard("/tmp/c")
+            sleep(0.2)
+        finally:
+            debouncer.stop()
+        self.assertEqual(reported, [["/tmp/a", "/tmp/b"]])
+        self.assertEqual(debouncer.received, 201)
+        self.assertEqual(debouncer.dropped, 198)
+
+
+class TestPatternMatcher(TestCase):
+    def test_match(self):
+        patterns = (
+            ["*.txt", "data/*.h5", "/abs/[a-c]?.log"],
+            ["*temp*", "*.swp"],
+        )
+        matcher = PatternMatcher(*patterns)
+        for path, expected in (
+            ("notes.txt", True),
+            ("/x/notes.txt", True),
+            ("/x/data/scan.h5", True),
+            ("/x/other/scan.h5", False),
+            ("/x/temp/notes.txt", True),
+            ("/x/notes_temp.txt", False),
+            ("/x/notes.swp", False),
+            ("/abs/b1.log", True),
+            ("/x/abs/b1.log", False),
+            ("/abs/d1.log", False),
+        ):
+            self.assertEqual(matcher.match(path), expected, path)
+            self.assertEqual(
+                match_path(PurePosixPath(path), *patterns), expected, path
+            )
+        # pickled without the cache
+        matcher = pickle.loads(pickle.dumps(matcher))
+        self.assertTrue(matcher.match("/x/data/scan.h5"))
+        with self.assertRaises(ValueError):
+            PatternMatcher(["*.TXT"], ["*.txt"], case_sensitive=False)
+
+
+class TestDirectoryScanner(TestCase):
+    def test_scan(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ("a.txt", "b.log", "sub/c.txt", "sub/deeper/d.txt"):
+                path = os.path.join(tmpdir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(name)
+            os.makedirs(os.path.join(tmpdir, "empty"))
+            os.symlink(
+                os.path.join(tmpdir, "a.txt"), os.path.join(tmpdir, "link.txt")
+            )
+
+            scanner = DirectoryScanner(
+                PatternMatcher(["*.txt"], []), max_workers=2
+            )
+            entries = {
+                os.path.relpath(entry.path, tmpdir): entry.size
+                for entry in scanner.scan(tmpdir)
+            }
+            self.assertEqual(
+                entries,
+                {"a.txt": 5, "sub/c.txt": 9, "sub/deeper/d.txt": 16},
+            )
+            scanner = DirectoryScanner(
+                PatternMatcher(["*"], ["*deeper*"]), recursive=False
+            )
+            self.assertEqual(
+                sorted(entry.path for entry in scanner.scan(tmpdir)),
+                [os.path.join(tmpdir, name) for name in ("a.txt", "b.log")],
+            )
+            scanner = DirectoryScanner(
+                PatternMatcher(["*"], ["*deeper*"]), filter_directories=True
+            )
+            self.assertEqual(len(list(scanner.scan(tmpdir))), 3)
+            self.assertTrue(scanner.contains_files(tmpdir))
+            self.assertFalse(
+                scanner.contains_files(os.path.join(tmpdir, "empty"))
+            )
+            with self.assertRaises(FileNotFoundError):
+                list(scanner.scan(os.path.join(tmpdir, "missing")))
+
+
+class TestDirectoryPoller(TestCase):
+    def test_poll(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+
+            def _write(name: str, contents: str, mode: str = "w"):
+                path = os.path.join(tmpdir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, mode) as f:
+                    f.write(contents)
+
+            for name in ("a.txt", "b.log", "sub/c.txt", "sub/deeper/d.txt"):
+                _write(name, name)
+
+            poller = DirectoryPoller(
+                tmpdir, PatternMatcher(["*.txt"], []), max_workers=2
+            )
+            self.assertEqual(len(list(poller.scan())), 3)
+            self.assertEqual(poller.ndirectories, 3)
+            self.assertFalse(poller.poll())
+
+            # recently modified files are checked on every poll
+            _write("sub/deeper/d.txt", "more", "a")
+            _write("sub/e.txt", "e")
+            os.remove(os.path.join(tmpdir, "a.txt"))
+            changes = poller.poll()
+            self.assertEqual(
+                [entry.path for entry in changes.created],
+                [os.path.join(tmpdir, "sub/e.txt")],
+            )
+            self.assertEqual([entry.size for entry in changes.modified], [20])
+            self.assertEqual(changes.deleted, [os.path.join(tmpdir, "a.txt")])
+
+            shutil.rmtree(os.path.join(tmpdir, "sub"))
+            changes = poller.poll()
+            self.assertEqual(len(changes.deleted), 3)
+            self.assertEqual((len(poller), poller.ndirectories), (0, 1))
+
+            shutil.rmtree(tmpdir)
+            with self.assertRaises(FileNotFoundError):
+                poller.poll()
+            os.makedirs(tmpdir)
+
+
+class TestSpillQueue(TestCase):
+    def test_order(self):
+        spill = SpillQueue()
+        spill.open()
+        try:
+            spill.push(
+                [
+                    RegularFile(
+                        f"/tmp/file{i}",
+                        PurePath(f"file{i}"),
+                        i,
+                        FileStatus.CREATED,
+                    )
+                    for i in range(3)
+                ]
+            )
+            self.assertEqual(len(spill), 3)
+            # files are only removed when discarded
+            self.assertEqual(len(spill.peek(2)), 2)
+            self.assertEqual(len(spill), 3)
+            files = spill.pop(2) + spill.pop(2)
+            self.assertEqual(len(spill), 0)
+        finally:
+            spill.close()
+        self.assertEqual(
+            [file.filename for file in files],
+            [f"/tmp/file{i}" for i in range(3)],
+        )
+        self.assertEqual(files[2].relative_filename, PurePath("file2"))
+        self.assertEqual(files[2].created, 2)
+        self.assertEqual(files[2].status, FileStatus.CREATED)
+
+
+class TestProcessPool(TestCase):
+    def test_pickle_file(self):
+        file = RegularFile("/tmp/file", PurePath("file"), 0, FileStatus.QUEUED)
+        file.observer = QueueObserver()
+        file.operation_metadata[0] = dict(key="value")
+        _file = pickle.loads(pickle.dumps(file))
+        self.assertEqual(_file.filename, file.filename)
+        self.assertIsNone(_file.observer)
+        self.assertEqual(_file.operation_metadata, file.operation_metadata)
+        self.assertFalse(_file.cancellable.is_cancelled())
+
+    def test_call(self):
+        pool = ProcessPool(1)
+        pool.start()
+        try:
+            self.assertEqual(pool.call(pow, 2, 10), 1024)
+        finally:
+            pool.stop()